@@ -0,0 +1,45 @@
+"""Add apikey table
+
+Revision ID: 4f7d2c9a1b3e
+Revises: 1a31ce608336
+Create Date: 2026-10-19 10:12:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4f7d2c9a1b3e'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'apikey',
+        sa.Column('label', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('requests_per_minute', sa.Integer(), nullable=True),
+        sa.Column('bytes_per_day', sa.BigInteger(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('scopes', sa.JSON(), nullable=False),
+        sa.Column('prefix', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('key_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('request_count', sa.BigInteger(), nullable=False),
+        sa.Column('byte_count', sa.BigInteger(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_apikey_key_hash'), 'apikey', ['key_hash'], unique=True)
+    op.create_index(op.f('ix_apikey_updated_at'), 'apikey', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_apikey_updated_at'), table_name='apikey')
+    op.drop_index(op.f('ix_apikey_key_hash'), table_name='apikey')
+    op.drop_table('apikey')
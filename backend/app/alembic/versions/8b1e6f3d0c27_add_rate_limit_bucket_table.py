@@ -0,0 +1,34 @@
+"""Add rate_limit_bucket table
+
+Revision ID: 8b1e6f3d0c27
+Revises: 4f7d2c9a1b3e
+Create Date: 2026-10-19 13:47:09.204716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e6f3d0c27'
+down_revision = '4f7d2c9a1b3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rate_limit_bucket',
+        sa.Column('key', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('allowed', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    # Buckets are rebuilt from scratch if lost; skip WAL for this write-heavy table
+    op.execute('ALTER TABLE rate_limit_bucket SET UNLOGGED')
+
+
+def downgrade():
+    op.drop_table('rate_limit_bucket')
@@ -0,0 +1,33 @@
+"""Add item (owner_id, id) index for keyset pagination
+
+Revision ID: c5d2e8a41f90
+Revises: 8b1e6f3d0c27
+Create Date: 2026-10-19 16:05:41.518203
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8a41f90'
+down_revision = '8b1e6f3d0c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY doesn't block writes to item, but can't run in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_owner_id_id',
+            'item',
+            ['owner_id', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_item_owner_id_id', table_name='item', postgresql_concurrently=True
+        )
@@ -0,0 +1,112 @@
+"""Add item_count table maintained by triggers on item
+
+Revision ID: d41b7a9e2f63
+Revises: c5d2e8a41f90
+Create Date: 2026-10-19 17:21:08.640517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7a9e2f63'
+down_revision = 'c5d2e8a41f90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No foreign key to user: deleting a user cascades to item, whose trigger
+    # then updates this table within the same statement
+    op.create_table(
+        'item_count',
+        sa.Column('owner_id', sa.Uuid(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('owner_id'),
+    )
+    # Keep writes to item out until the triggers and the backfill commit
+    op.execute("LOCK TABLE item IN SHARE MODE")
+    # Statement triggers with transition tables: a bulk insert or delete
+    # updates each owner's row once, not once per item. Rows are locked in
+    # owner_id order so concurrent statements can't deadlock on them.
+    op.execute(
+        """
+        CREATE FUNCTION item_count_add() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO item_count AS c (owner_id, count)
+            SELECT owner_id, count(*) FROM new_rows GROUP BY owner_id ORDER BY owner_id
+            ON CONFLICT (owner_id) DO UPDATE SET count = c.count + excluded.count;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION item_count_remove() RETURNS trigger AS $$
+        BEGIN
+            UPDATE item_count AS c SET count = c.count - removed.n
+            FROM (
+                SELECT owner_id, count(*) AS n FROM old_rows
+                GROUP BY owner_id ORDER BY owner_id
+            ) AS removed
+            WHERE c.owner_id = removed.owner_id;
+            DELETE FROM item_count
+            WHERE count <= 0 AND owner_id IN (SELECT owner_id FROM old_rows);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION item_count_move() RETURNS trigger AS $$
+        BEGIN
+            WITH moves AS (
+                SELECT o.owner_id AS old_owner_id, n.owner_id AS new_owner_id
+                FROM old_rows o JOIN new_rows n USING (id)
+                WHERE o.owner_id <> n.owner_id
+            )
+            INSERT INTO item_count AS c (owner_id, count)
+            SELECT owner_id, sum(delta) FROM (
+                SELECT old_owner_id AS owner_id, -1 AS delta FROM moves
+                UNION ALL
+                SELECT new_owner_id, 1 FROM moves
+            ) AS deltas
+            GROUP BY owner_id ORDER BY owner_id
+            ON CONFLICT (owner_id) DO UPDATE SET count = c.count + excluded.count;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER item_count_insert AFTER INSERT ON item "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION item_count_add()"
+    )
+    op.execute(
+        "CREATE TRIGGER item_count_delete AFTER DELETE ON item "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION item_count_remove()"
+    )
+    op.execute(
+        "CREATE TRIGGER item_count_update AFTER UPDATE ON item "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION item_count_move()"
+    )
+    op.execute(
+        "INSERT INTO item_count (owner_id, count) "
+        "SELECT owner_id, count(*) FROM item GROUP BY owner_id"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER item_count_update ON item")
+    op.execute("DROP TRIGGER item_count_delete ON item")
+    op.execute("DROP TRIGGER item_count_insert ON item")
+    op.execute("DROP FUNCTION item_count_move()")
+    op.execute("DROP FUNCTION item_count_remove()")
+    op.execute("DROP FUNCTION item_count_add()")
+    op.drop_table('item_count')
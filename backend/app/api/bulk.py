@@ -0,0 +1,187 @@
+"""
+Request bodies and writes of the bulk endpoints (e.g. POST /items/bulk).
+
+A body is either a JSON array of rows or, with Content-Type
+application/x-ndjson, one JSON row per line. NDJSON is read as it arrives,
+so each batch of rows is validated and written while the rest is still being
+sent. Every batch is written in its own transaction; a row that is invalid or
+that the database rejects is reported with its index (its position in the
+body, from 0) and the rest of the batch is still written.
+"""
+
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, TypeVar
+
+import psycopg
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import BulkRowError
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl")
+
+RowT = TypeVar("RowT", bound=BaseModel)
+ResultT = TypeVar("ResultT")
+
+# Writes a batch of (index, row), returning what was written and the rows
+# that were not, e.g. because they matched nothing
+BatchWriter = Callable[
+    [list[tuple[int, RowT]]], Awaitable[tuple[list[ResultT], list[BulkRowError]]]
+]
+
+
+def request_body(model: type[BaseModel]) -> dict[str, Any]:
+    """OpenAPI `requestBody` of a bulk endpoint taking rows of `model`."""
+    row_schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": row_schema}},
+                NDJSON_TYPES[0]: {"schema": row_schema},
+            },
+        }
+    }
+
+
+async def _lines(request: Request) -> AsyncIterator[bytes]:
+    rest = b""
+    async for chunk in request.stream():
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    yield rest
+
+
+async def _raw_rows(request: Request, max_rows: int) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Yield (index, parsed JSON) for each row of the body, with a BulkRowError
+    instead of the JSON for an NDJSON line that isn't valid JSON.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_TYPES:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        if len(rows) > max_rows:
+            raise HTTPException(
+                status_code=413, detail=f"Too many rows, at most {max_rows}"
+            )
+        for index, row in enumerate(rows):
+            yield index, row
+        return
+
+    index = 0
+    async for line in _lines(request):
+        if not line.strip():
+            continue
+        if index == max_rows:
+            # Earlier batches may be written already, so this is reported like
+            # any other row instead of failing the request
+            yield (
+                index,
+                BulkRowError(index=index, detail=f"Too many rows, at most {max_rows}"),
+            )
+            return
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = BulkRowError(index=index, detail="Invalid JSON")
+        yield index, row
+        index += 1
+
+
+async def read_batches(
+    request: Request, model: type[RowT], batch_size: int, max_rows: int
+) -> AsyncIterator[tuple[list[tuple[int, RowT]], list[BulkRowError]]]:
+    """
+    Yield the rows of the body in batches of up to `batch_size` valid rows,
+    each as ([(index, row), ...], errors of the invalid rows read with them).
+    """
+    batch: list[tuple[int, RowT]] = []
+    errors: list[BulkRowError] = []
+    async for index, raw in _raw_rows(request, max_rows):
+        if isinstance(raw, BulkRowError):
+            errors.append(raw)
+            continue
+        try:
+            batch.append((index, model.model_validate(raw)))
+        except ValidationError as e:
+            errors.append(
+                BulkRowError(
+                    index=index,
+                    detail=e.errors(include_url=False, include_context=False),
+                )
+            )
+        if len(batch) == batch_size:
+            yield batch, errors
+            batch, errors = [], []
+    if batch or errors:
+        yield batch, errors
+
+
+async def write_batch(
+    session: AsyncSession,
+    batch: list[tuple[int, RowT]],
+    write: BatchWriter[RowT, ResultT],
+) -> tuple[list[ResultT], list[BulkRowError]]:
+    """
+    Write the batch with `write` and commit. If the database rejects it, write
+    the rows one by one, each in a savepoint, to find and report the failing
+    ones, then commit the others.
+
+    psycopg errors are caught as well as SQLAlchemy's, as COPY is run on the
+    driver's connection.
+    """
+    if not batch:
+        return [], []
+    try:
+        written, errors = await write(batch)
+        await session.commit()
+        return written, errors
+    except (DBAPIError, psycopg.Error):
+        await session.rollback()
+
+    written, errors = [], []
+    for index, row in batch:
+        try:
+            async with session.begin_nested():
+                row_written, row_errors = await write([(index, row)])
+        except (DBAPIError, psycopg.Error) as e:
+            error = e.orig if isinstance(e, DBAPIError) else e
+            errors.append(BulkRowError(index=index, detail=str(error).splitlines()[0]))
+            continue
+        written += row_written
+        errors += row_errors
+    await session.commit()
+    return written, errors
+
+
+async def apply(
+    request: Request,
+    session: AsyncSession,
+    model: type[RowT],
+    write: BatchWriter[RowT, ResultT],
+    *,
+    batch_size: int,
+    max_rows: int,
+) -> tuple[list[ResultT], list[BulkRowError]]:
+    """
+    Read the body in batches of `model` rows and write each one with
+    write_batch(). Returns everything written and the errors, by index.
+    """
+    written: list[ResultT] = []
+    errors: list[BulkRowError] = []
+    async for batch, batch_errors in read_batches(request, model, batch_size, max_rows):
+        errors += batch_errors
+        batch_written, write_errors = await write_batch(session, batch, write)
+        written += batch_written
+        errors += write_errors
+    errors.sort(key=lambda error: error.index)
+    return written, errors
@@ -1,16 +1,28 @@
-from collections.abc import Generator
+import hmac
+import math
+from collections.abc import AsyncGenerator, Callable, Generator
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, Header, status
+from fastapi import Depends, HTTPException, Header, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
+from app.core.api_keys import (
+    LEGACY_API_KEY,
+    LOCAL_API_KEY,
+    ApiKeyRecord,
+    api_key_store,
+)
+from app.core.auth_cache import Principal, principal_cache, token_cache
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_engine, engine
+from app.core.replicas import RoutingSession, replica_router
 from app.models import TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -23,11 +35,36 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # Loaded attributes stay usable after commit instead of being lazily
+    # reloaded, which an AsyncSession can't do outside an await
+    async with AsyncSession(
+        async_engine, expire_on_commit=False, sync_session_class=RoutingSession
+    ) as session:
+        session.info["read_only"] = request.method in ("GET", "HEAD")
+        try:
+            yield session
+        except OperationalError:
+            replica = session.info.get("replica")
+            if replica is not None:
+                replica_router.mark_down(replica)
+            raise
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
+    """
+    Verify the access token, reusing the result of an earlier verification of
+    the same token from the token cache until the token expires.
+    """
+    digest = token_cache.digest(token)
+    cached = token_cache.get(digest)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -38,7 +75,16 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    # Tokens without an `exp` never expire and are not worth pinning in memory
+    if isinstance(payload.get("exp"), int | float):
+        token_cache.put(digest, token_data, float(payload["exp"]))
+    return token_data
+
+
+async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    session.info["user_id"] = str(token_data.sub)
+    user = await session.get(User, token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -49,7 +95,42 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+async def get_current_principal(
+    session: AsyncSessionDep, token: TokenDep
+) -> Principal:
+    """
+    Like get_current_user, but only loads the fields needed for authorization
+    and serves them from the principal cache when possible.
+    """
+    token_data = decode_token(token)
+    sub = str(token_data.sub)
+    session.info["user_id"] = sub
+    principal = principal_cache.get(sub)
+    if principal is None:
+        generation = principal_cache.generation()
+        # From the primary: a lagging replica could undo an invalidation for
+        # the whole TTL of the cached entry
+        statement = select(User).where(User.id == token_data.sub)
+        user = (
+            await session.exec(
+                statement, bind_arguments={"bind": async_engine.sync_engine}
+            )
+        ).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = Principal(
+            id=user.id, is_active=user.is_active, is_superuser=user.is_superuser
+        )
+        principal_cache.put(sub, principal, generation)
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
+CurrentPrincipal = Annotated[Principal, Depends(get_current_principal)]
+
+
+def get_current_active_superuser(current_user: CurrentPrincipal) -> Principal:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
@@ -59,21 +140,51 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
 
 
 # APIキー認証用の関数
-def get_api_key(x_api_key: str = Header(None)):
+def get_api_key(x_api_key: str = Header(None)) -> ApiKeyRecord:
     
     # 開発中はAPIキーチェックをスキップ
     ENVIRONMENT = settings.ENVIRONMENT
     if ENVIRONMENT=="local":
-        return "localhost_access_granted"
+        return LOCAL_API_KEY
     
+    # 登録済みのAPIキーをメモリ上の索引から探す（DBには問い合わせない）
+    record = api_key_store.lookup(x_api_key) if x_api_key else None
     
-    # 環境変数から取得した正しいAPIキー
-    SECRET_KEY = settings.SECRET_KEY
+    # 移行期間中は環境変数のSECRET_KEYも受け付ける（比較は定数時間で行う）
+    if (
+        record is None
+        and x_api_key
+        and settings.API_KEY_ALLOW_SECRET_KEY
+        and hmac.compare_digest(x_api_key.encode(), settings.SECRET_KEY.encode())
+    ):
+        record = LEGACY_API_KEY
     
     # APIキーが提供されていない、または正しくない場合はエラー
-    if not x_api_key or x_api_key != SECRET_KEY:
+    if record is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid API key",
         )
-    return x_api_key
\ No newline at end of file
+    return record
+
+
+# エンドポイントのグループ（スコープ）ごとにAPIキーの権限と上限を確認する依存関係を作る
+def require_api_key_scope(scope: str) -> Callable[..., ApiKeyRecord]:
+    def check_scope(api_key: ApiKeyRecord = Depends(get_api_key)) -> ApiKeyRecord:
+        if not api_key.allows(scope):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"This API key is not allowed to use '{scope}'",
+            )
+        
+        # キーごとのリクエスト数・転送量の上限を超えていれば429を返す
+        retry_after = api_key_store.admit(api_key)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="API key quota exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        return api_key
+    
+    return check_scope
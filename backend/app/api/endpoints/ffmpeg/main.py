@@ -1,17 +1,22 @@
 from fastapi import APIRouter, Response, Depends
 import subprocess
 import os
-from app.api.deps import get_api_key
+from app.api.deps import require_api_key_scope
+from app.core.api_keys import ApiKeyRecord, api_key_store
 
 router = APIRouter()
 
+# APIキーのscopesに"ffmpeg"（または"*"）が必要
+require_api_key = require_api_key_scope("ffmpeg")
+
 @router.get("/capture_stream_screenshot", response_model=None)
-async def capture_stream_screenshot(url: str, output_file: str, api_key: str = Depends(get_api_key)):
+async def capture_stream_screenshot(url: str, output_file: str, api_key: ApiKeyRecord = Depends(require_api_key)):
     result = run_ffmpeg(url, output_file)
     if os.path.exists(output_file):
         with open(output_file, "rb") as f:
             image_data = f.read()
         os.remove(output_file)
+        api_key_store.add_bytes(api_key, len(image_data))
         
         # キャッシュを防ぐためのヘッダーを追加
         response = Response(content=image_data, media_type="image/jpeg")
@@ -1,18 +1,22 @@
 from fastapi import APIRouter, Depends
 
 # deps.pyから認証関連の依存関係をインポート
-from app.api.deps import get_api_key
+from app.api.deps import require_api_key_scope
+from app.core.api_keys import ApiKeyRecord
 
 router = APIRouter()
 
+# APIキーのscopesに"hello"（または"*"）が必要
+require_api_key = require_api_key_scope("hello")
+
 # APIキー認証を使用したエンドポイント
 @router.get("/")
-def hello_world(api_key: str = Depends(get_api_key)):
+def hello_world(api_key: ApiKeyRecord = Depends(require_api_key)):
     return {"message": "Hello World"}
 
 # APIキー認証を使用したエンドポイント（パスパラメータあり）
 @router.get("/{name}")
-def hello_name(name: str, api_key: str = Depends(get_api_key)):
+def hello_name(name: str, api_key: ApiKeyRecord = Depends(require_api_key)):
     return {"message": f"こんにちは {name}さん"}
 
 
@@ -1 +1,3 @@
-from .main import router
\ No newline at end of file
+from .main import router
+
+__all__ = ["router"]
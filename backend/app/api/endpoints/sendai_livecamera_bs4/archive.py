@@ -0,0 +1,282 @@
+import bisect
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, NamedTuple
+
+# インデックスの1レコード: 撮影時刻(UNIXマイクロ秒), セグメント内オフセット, 長さ, SHA-256の先頭16バイト
+INDEX_RECORD = struct.Struct("<qQI16s")
+DIGEST_BYTES = 16
+
+
+class FrameRecord(NamedTuple):
+    """アーカイブされた1フレーム"""
+
+    day: str
+    timestamp_us: int
+    offset: int
+    length: int
+    digest: bytes
+
+    @property
+    def timestamp(self) -> float:
+        return self.timestamp_us / 1_000_000
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "captured_at": datetime.fromtimestamp(
+                self.timestamp, timezone.utc
+            ).isoformat(),
+            "length": self.length,
+            "hash": self.digest.hex(),
+        }
+
+
+class _DayIndex:
+    """
+    1日分のインデックスファイルをmmapしたもの
+
+    レコードは時刻順に追記されるので、時刻で二分探索できる。
+    """
+
+    def __init__(self, path: Path, day: str) -> None:
+        self.day = day
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # 書き込み途中のレコードは無視する
+        self._count = size // INDEX_RECORD.size
+        self._map = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._count
+            else None
+        )
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "_DayIndex":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> int:
+        # bisect用: i番目の時刻だけを読む
+        assert self._map is not None
+        timestamp: int = struct.unpack_from("<q", self._map, i * INDEX_RECORD.size)[0]
+        return timestamp
+
+    def record(self, i: int) -> FrameRecord:
+        assert self._map is not None
+        return FrameRecord(
+            self.day, *INDEX_RECORD.unpack_from(self._map, i * INDEX_RECORD.size)
+        )
+
+
+class ImageArchive:
+    """
+    カメラ画像の時系列アーカイブ
+
+    カメラごと・日ごと(UTC)に、画像を連結したセグメントファイル(.seg)と
+    固定長レコードのインデックス(.idx)を持つ。追記は1プロセス（ポーリング担当）だけが行い、
+    検索はどのワーカーからでもインデックスをmmapして二分探索する。
+    """
+
+    def __init__(self, directory: Path, retention_days: float, max_bytes: int) -> None:
+        self.directory = directory
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self._last_digest: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def setup(self) -> None:
+        """ディレクトリを作成する（読み込み時ではなく、起動時にlifespanから呼ぶ）"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _day_of(timestamp_us: int) -> str:
+        return datetime.fromtimestamp(timestamp_us / 1_000_000, timezone.utc).strftime(
+            "%Y%m%d"
+        )
+
+    def _camera_dir(self, camera_id: str) -> Path:
+        if camera_id in ("", ".", "..") or "/" in camera_id or os.sep in camera_id:
+            raise ValueError(f"不正なカメラIDです: {camera_id}")
+        return self.directory / camera_id
+
+    def _days(self, camera_id: str) -> list[str]:
+        camera_dir = self._camera_dir(camera_id)
+        if not camera_dir.is_dir():
+            return []
+        return sorted(
+            name[:-4] for name in os.listdir(camera_dir) if name.endswith(".idx")
+        )
+
+    def _open_day(self, camera_id: str, day: str) -> _DayIndex:
+        return _DayIndex(self._camera_dir(camera_id) / f"{day}.idx", day)
+
+    def _last_record(self, camera_id: str) -> FrameRecord | None:
+        days = self._days(camera_id)
+        for day in reversed(days):
+            with self._open_day(camera_id, day) as index:
+                if len(index):
+                    return index.record(len(index) - 1)
+        return None
+
+    # ---- 追記 ----
+
+    def append(
+        self, camera_id: str, image: bytes, timestamp: float | None = None
+    ) -> FrameRecord | None:
+        """
+        画像を追記する。直前のフレームと同じ内容の場合は追記せずNoneを返す
+        """
+        timestamp_us = int(
+            (timestamp if timestamp is not None else time.time()) * 1_000_000
+        )
+        digest = hashlib.sha256(image).digest()[:DIGEST_BYTES]
+        with self._lock:
+            if camera_id not in self._last_digest:
+                last = self._last_record(camera_id)
+                self._last_digest[camera_id] = last.digest if last else b""
+            if self._last_digest[camera_id] == digest:
+                return None
+
+            day = self._day_of(timestamp_us)
+            camera_dir = self._camera_dir(camera_id)
+            camera_dir.mkdir(parents=True, exist_ok=True)
+            # セグメントを先に書き、インデックスのレコードが見えた時点で画像が揃っているようにする
+            with open(camera_dir / f"{day}.seg", "ab") as segment:
+                offset = segment.tell()
+                segment.write(image)
+            record = FrameRecord(day, timestamp_us, offset, len(image), digest)
+            with open(camera_dir / f"{day}.idx", "ab") as index:
+                index.write(INDEX_RECORD.pack(timestamp_us, offset, len(image), digest))
+            self._last_digest[camera_id] = digest
+        return record
+
+    # ---- 検索 ----
+
+    def nearest(self, camera_id: str, timestamp: float) -> FrameRecord | None:
+        """指定時刻に最も近いフレームを返す"""
+        target = int(timestamp * 1_000_000)
+        days = self._days(camera_id)
+        if not days:
+            return None
+        # 対象日と、その前後で存在する日だけを調べる
+        pos = bisect.bisect_left(days, self._day_of(target))
+        best: FrameRecord | None = None
+        for day in days[max(pos - 1, 0) : pos + 2]:
+            with self._open_day(camera_id, day) as index:
+                i = bisect.bisect_left(index, target)
+                for j in (i - 1, i):
+                    if 0 <= j < len(index):
+                        record = index.record(j)
+                        if best is None or abs(record.timestamp_us - target) < abs(
+                            best.timestamp_us - target
+                        ):
+                            best = record
+        return best
+
+    def between(
+        self, camera_id: str, start: float, end: float, limit: int = 1000
+    ) -> list[FrameRecord]:
+        """start〜endの間のフレームを時刻順に返す（最大limit件）"""
+        start_us = int(start * 1_000_000)
+        end_us = int(end * 1_000_000)
+        first_day, last_day = self._day_of(start_us), self._day_of(end_us)
+        records: list[FrameRecord] = []
+        for day in self._days(camera_id):
+            if day < first_day or day > last_day:
+                continue
+            with self._open_day(camera_id, day) as index:
+                lo = bisect.bisect_left(index, start_us)
+                hi = bisect.bisect_right(index, end_us)
+                for i in range(lo, min(hi, lo + limit - len(records))):
+                    records.append(index.record(i))
+            if len(records) >= limit:
+                break
+        return records
+
+    def read(self, camera_id: str, record: FrameRecord) -> bytes:
+        """フレームの画像データを読み出す"""
+        with open(self._camera_dir(camera_id) / f"{record.day}.seg", "rb") as segment:
+            segment.seek(record.offset)
+            return segment.read(record.length)
+
+    # ---- 保持期間 ----
+
+    def apply_retention(self, now: float | None = None) -> int:
+        """
+        保持期間を過ぎた日のファイルを削除し、合計サイズが上限を超えていれば
+        古い日から削除する。削除した日ファイル数を返す
+        """
+        now = now if now is not None else time.time()
+        cutoff = (
+            datetime.fromtimestamp(now, timezone.utc)
+            - timedelta(days=self.retention_days)
+        ).strftime("%Y%m%d")
+        day_files = []
+        total = 0
+        for camera_dir in self.directory.iterdir():
+            if not camera_dir.is_dir():
+                continue
+            for day in self._days(camera_dir.name):
+                size = sum(
+                    (camera_dir / f"{day}{suffix}").stat().st_size
+                    for suffix in (".seg", ".idx")
+                    if (camera_dir / f"{day}{suffix}").exists()
+                )
+                day_files.append((day, camera_dir, size))
+                total += size
+
+        removed = 0
+        for day, camera_dir, size in sorted(day_files, key=lambda item: item[0]):
+            if day >= cutoff and total <= self.max_bytes:
+                break
+            for suffix in (".idx", ".seg"):
+                (camera_dir / f"{day}{suffix}").unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        for camera_dir in self.directory.iterdir():
+            if camera_dir.is_dir() and not any(camera_dir.iterdir()):
+                shutil.rmtree(camera_dir, ignore_errors=True)
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        cameras = {}
+        for camera_dir in self.directory.iterdir():
+            if not camera_dir.is_dir():
+                continue
+            days = self._days(camera_dir.name)
+            frames = 0
+            size = 0
+            for day in days:
+                idx_path = camera_dir / f"{day}.idx"
+                frames += idx_path.stat().st_size // INDEX_RECORD.size
+                size += (
+                    idx_path.stat().st_size + (camera_dir / f"{day}.seg").stat().st_size
+                )
+            cameras[camera_dir.name] = {
+                "days": len(days),
+                "frames": frames,
+                "bytes": size,
+            }
+        return {
+            "retention_days": self.retention_days,
+            "max_bytes": self.max_bytes,
+            "total_bytes": sum(camera["bytes"] for camera in cameras.values()),
+            "cameras": cameras,
+        }
@@ -0,0 +1,53 @@
+import asyncio
+import json
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+from urllib.parse import urlsplit
+
+from starlette.concurrency import run_in_threadpool
+
+
+async def scrape_many(
+    urls: list[str],
+    scrape: Callable[[str], dict[str, Any]],
+    concurrency: int,
+    per_host_concurrency: int,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    複数のURLを並行してスクレイプし、終わったものから順に結果を返す
+
+    全体の同時実行数と、同一ホストへの同時実行数の両方を制限する。
+    1件の失敗が他の結果に影響しないよう、各結果に成否を含める。
+    """
+    global_limit = asyncio.Semaphore(concurrency)
+    host_limits: dict[str, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(per_host_concurrency)
+    )
+
+    async def run(index: int, url: str) -> dict[str, Any]:
+        try:
+            async with host_limits[urlsplit(url).netloc], global_limit:
+                result = await run_in_threadpool(scrape, url)
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e),
+                "message": "スクレイピング中にエラーが発生しました",
+            }
+        return {"index": index, "url": url, **result}
+
+    tasks = [asyncio.create_task(run(index, url)) for index, url in enumerate(urls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # クライアントが切断した場合などは残りを取り消す
+        for task in tasks:
+            task.cancel()
+
+
+async def to_ndjson(items: AsyncIterator[dict[str, Any]]) -> AsyncIterator[bytes]:
+    """結果を1行1JSON（NDJSON）に変換する"""
+    async for item in items:
+        yield (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
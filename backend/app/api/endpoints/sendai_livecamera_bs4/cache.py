@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any
+
+import requests
+
+from app.core.config import settings
+
+from .governor import governor
+from .scraper import build_bridge_result
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScrapeCacheEntry:
+    """URLごとのスクレイプ結果と、再検証に使うバリデータ"""
+
+    result: dict[str, Any]
+    etag: str | None
+    last_modified: str | None
+    html_hash: str
+    fetched_at: float
+
+
+class ScrapeCache:
+    """
+    カメラページのスクレイプ結果をURLごとに保持するTTLキャッシュ
+
+    - TTL以内: キャッシュをそのまま返す
+    - TTL超過〜TTL+stale以内: 古い結果を即座に返し、裏で再検証する（stale-while-revalidate）
+    - それ以降: 同期的に再取得する
+    エントリ数はmax_entriesまでのLRUで、TTL+staleを過ぎたエントリは定期的に捨てる。
+    再取得はIf-None-Match / If-Modified-Sinceで条件付きGETを行い、
+    304またはHTMLのハッシュが前回と同じ場合はBeautifulSoupでのパースを省略する。
+    同じURLへの同時ミスは1回の取得を共有する（single-flight）。
+    """
+
+    def __init__(
+        self, ttl_seconds: float, stale_seconds: float, max_entries: int = 1000
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, ScrapeCacheEntry] = OrderedDict()
+        self._next_purge = 0.0
+        self._inflight: dict[str, Future[dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "not_modified": 0,
+            "unchanged": 0,
+            "parses": 0,
+            "errors": 0,
+            "stale_on_error": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, url: str) -> dict[str, Any]:
+        """キャッシュを考慮してスクレイプ結果を返す"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                age = now - entry.fetched_at
+                if age < self.ttl_seconds:
+                    self._stats["hits"] += 1
+                    return entry.result
+                if age < self.ttl_seconds + self.stale_seconds:
+                    self._stats["stale_hits"] += 1
+                    # 古い結果を返しつつ、裏で再検証する
+                    if url not in self._inflight:
+                        revalidation = self._start_flight(url)
+                        threading.Thread(
+                            target=self._run_flight,
+                            args=(url, entry, revalidation),
+                            daemon=True,
+                        ).start()
+                    return entry.result
+            self._stats["misses"] += 1
+            future = self._inflight.get(url)
+            leader = future is None
+            if future is None:
+                future = self._start_flight(url)
+
+        if leader:
+            self._run_flight(url, entry, future)
+        return future.result()
+
+    def _start_flight(self, url: str) -> Future[dict[str, Any]]:
+        # self._lock を保持した状態で呼ぶこと
+        future: Future[dict[str, Any]] = Future()
+        self._inflight[url] = future
+        return future
+
+    def _run_flight(
+        self,
+        url: str,
+        entry: ScrapeCacheEntry | None,
+        future: Future[dict[str, Any]],
+    ) -> None:
+        try:
+            result = self._refresh(url, entry)
+            future.set_result(result)
+        except Exception as e:
+            logger.error(f"スクレイプ結果の再取得中にエラー: {url}, エラー: {e}")
+            self._count("errors")
+            if entry is not None:
+                # 上流が落ちている間は古い結果で応答する
+                self._count("stale_on_error")
+                future.set_result(entry.result)
+                return
+            future.set_result(
+                {
+                    "success": False,
+                    "error": str(e),
+                    "message": "スクレイピング中にエラーが発生しました",
+                }
+            )
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+
+    def _refresh(self, url: str, entry: ScrapeCacheEntry | None) -> dict[str, Any]:
+        headers = {}
+        if entry is not None:
+            self._count("revalidations")
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        with governor.request(url):
+            response = requests.get(
+                url, headers=headers, timeout=settings.LIVECAMERA_SCRAPE_TIMEOUT_SECONDS
+            )
+            if response.status_code != 304:
+                response.raise_for_status()
+
+        if entry is not None and response.status_code == 304:
+            self._count("not_modified")
+            self._store(
+                url, entry.result, entry.etag, entry.last_modified, entry.html_hash
+            )
+            return entry.result
+
+        html_hash = hashlib.sha256(response.content).hexdigest()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        # HTMLが前回と同じならパースを省略
+        if entry is not None and entry.html_hash == html_hash:
+            self._count("unchanged")
+            self._store(url, entry.result, etag, last_modified, html_hash)
+            return entry.result
+
+        self._count("parses")
+        result = build_bridge_result(response.content, url)
+        # 失敗結果はキャッシュしない
+        if result["success"]:
+            self._store(url, result, etag, last_modified, html_hash)
+        return result
+
+    def _store(
+        self,
+        url: str,
+        result: dict[str, Any],
+        etag: str | None,
+        last_modified: str | None,
+        html_hash: str,
+    ) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge_expired(now)
+            self._entries.pop(url, None)
+            self._entries[url] = ScrapeCacheEntry(
+                result=result,
+                etag=etag,
+                last_modified=last_modified,
+                html_hash=html_hash,
+                fetched_at=now,
+            )
+            # 上限を超えた分を最近使われていない順に捨てる
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _purge_expired(self, now: float) -> None:
+        # self._lock を保持した状態で呼ぶこと
+        max_age = self.ttl_seconds + self.stale_seconds
+        expired = [
+            url
+            for url, entry in self._entries.items()
+            if now - entry.fetched_at >= max_age
+        ]
+        for url in expired:
+            del self._entries[url]
+        self._stats["expired"] += len(expired)
+        self._next_purge = now + max_age
+
+    def stats(self) -> dict[str, Any]:
+        """ヒット・ミス・再検証のカウンタを返す"""
+        with self._lock:
+            stats: dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["inflight"] = len(self._inflight)
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["stale_seconds"] = self.stale_seconds
+        return stats
@@ -0,0 +1,29 @@
+import httpx
+
+from app.core.config import settings
+
+# 画像プロキシ用の共有クライアント（接続をプールして使い回す）
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """共有のhttpx.AsyncClientを返す（初回呼び出し時に作成）"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.LIVECAMERA_IMAGE_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.LIVECAMERA_IMAGE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LIVECAMERA_IMAGE_MAX_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """共有クライアントを閉じる（アプリ終了時）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
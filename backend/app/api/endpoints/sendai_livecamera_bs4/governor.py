@@ -0,0 +1,247 @@
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+from app.core.config import settings
+
+
+class OutboundRejectedError(Exception):
+    """上流へのリクエストを送らずに拒否した場合の例外"""
+
+
+class CircuitOpenError(OutboundRejectedError):
+    """サーキットブレーカーが開いているホストへのリクエスト"""
+
+
+@dataclass
+class HostState:
+    tokens: float
+    updated_at: float
+    inflight: int = 0
+    consecutive_failures: int = 0
+    # closed: 通常 / open: 即時拒否 / half_open: 試行リクエストを1件だけ通す
+    circuit: str = "closed"
+    opened_at: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    rejected_rate: int = 0
+    rejected_circuit: int = 0
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """上流の不調とみなす例外か（接続エラー・タイムアウト・5xx）。4xxは含めない"""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(
+        exc, requests.ConnectionError | requests.Timeout | httpx.TransportError
+    )
+
+
+def failure_of(exc: BaseException) -> bool | None:
+    """
+    例外からrelease()に渡す結果を決める
+
+    上流の不調ならTrue、上流が応答した（4xx）ならFalse、キャンセルや上流と
+    関係のないエラーで結果が分からなければNone
+    """
+    if is_upstream_failure(exc):
+        return True
+    if (
+        isinstance(exc, requests.HTTPError | httpx.HTTPStatusError)
+        and exc.response is not None
+    ):
+        return False
+    return None
+
+
+class OutboundGovernor:
+    """
+    スクレイパーと画像プロキシが共有する、ホストごとの外向きリクエスト制御
+
+    - トークンバケットによるリクエストレート制限
+    - 同時実行数（in-flight）の上限
+    - 連続失敗でオープンし、一定時間後に1件だけ試行するサーキットブレーカー
+    待っても枠が空かない場合・ブレーカーが開いている場合は OutboundRejectedError を送出する。
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        max_inflight: int,
+        failure_threshold: int,
+        reset_seconds: float,
+        acquire_timeout: float,
+    ) -> None:
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.acquire_timeout = acquire_timeout
+        self._hosts: dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def _try_acquire(self, host: str) -> tuple[bool, float]:
+        """枠を取れれば (True, 0)、取れなければ (False, 次に試すまでの秒数)"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = HostState(
+                    tokens=float(self.burst), updated_at=now
+                )
+
+            if state.circuit == "open":
+                if now - state.opened_at < self.reset_seconds:
+                    state.rejected_circuit += 1
+                    raise CircuitOpenError(
+                        f"{host} へのリクエストは一時停止中です（サーキットブレーカー）"
+                    )
+                state.circuit = "half_open"
+            elif state.circuit == "half_open" and state.inflight > 0:
+                # 試行中のリクエストの結果が出るまでは通さない
+                state.rejected_circuit += 1
+                raise CircuitOpenError(
+                    f"{host} へのリクエストは一時停止中です（サーキットブレーカー）"
+                )
+
+            state.tokens = min(
+                float(self.burst),
+                state.tokens + (now - state.updated_at) * self.rate_per_second,
+            )
+            state.updated_at = now
+            if state.inflight >= self.max_inflight:
+                return False, 0.01
+            if state.tokens < 1:
+                return False, (1 - state.tokens) / self.rate_per_second
+
+            state.tokens -= 1
+            state.inflight += 1
+            state.requests += 1
+            return True, 0.0
+
+    def _reject(self, host: str) -> OutboundRejectedError:
+        with self._lock:
+            self._hosts[host].rejected_rate += 1
+        return OutboundRejectedError(f"{host} へのリクエストが混み合っています")
+
+    def acquire(self, url: str) -> str:
+        """リクエスト枠を取得する（同期版）。戻り値のホスト名をrelease()に渡すこと"""
+        host = self.host_of(url)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            ok, wait = self._try_acquire(host)
+            if ok:
+                return host
+            if time.monotonic() + wait > deadline:
+                raise self._reject(host)
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> str:
+        """リクエスト枠を取得する（非同期版）"""
+        host = self.host_of(url)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            ok, wait = self._try_acquire(host)
+            if ok:
+                return host
+            if time.monotonic() + wait > deadline:
+                raise self._reject(host)
+            await asyncio.sleep(wait)
+
+    def release(self, host: str, failed: bool | None) -> None:
+        """
+        リクエスト枠を返し、結果をサーキットブレーカーに記録する
+
+        failedは上流の不調ならTrue、応答を受け取れたならFalse、結果が分からなければNone。
+        Noneのときはブレーカーを閉じない（試行中だった場合は、次のリクエストを改めて試行にする）。
+        """
+        with self._lock:
+            state = self._hosts[host]
+            state.inflight -= 1
+            if failed is None:
+                if state.circuit == "half_open":
+                    # opened_atはそのままなので、次のacquireですぐに試行し直す
+                    state.circuit = "open"
+            elif failed:
+                state.failures += 1
+                state.consecutive_failures += 1
+                if (
+                    state.circuit == "half_open"
+                    or state.consecutive_failures >= self.failure_threshold
+                ):
+                    state.circuit = "open"
+                    state.opened_at = time.monotonic()
+            else:
+                state.consecutive_failures = 0
+                state.circuit = "closed"
+
+    @contextmanager
+    def request(self, url: str) -> Iterator[None]:
+        host = self.acquire(url)
+        failed: bool | None = None
+        try:
+            yield
+            failed = False
+        except BaseException as e:
+            failed = failure_of(e)
+            raise
+        finally:
+            self.release(host, failed)
+
+    @asynccontextmanager
+    async def request_async(self, url: str) -> AsyncIterator[None]:
+        host = await self.acquire_async(url)
+        failed: bool | None = None
+        try:
+            yield
+            failed = False
+        except BaseException as e:
+            failed = failure_of(e)
+            raise
+        finally:
+            self.release(host, failed)
+
+    def stats(self, host: str | None = None) -> dict[str, Any]:
+        """ホストごとのブレーカー状態・拒否回数を返す"""
+        with self._lock:
+            return {
+                name: {
+                    "circuit": state.circuit,
+                    "inflight": state.inflight,
+                    "tokens": round(state.tokens, 2),
+                    "consecutive_failures": state.consecutive_failures,
+                    "requests": state.requests,
+                    "failures": state.failures,
+                    "rejected_rate": state.rejected_rate,
+                    "rejected_circuit": state.rejected_circuit,
+                }
+                for name, state in self._hosts.items()
+                if host is None or name == host
+            }
+
+
+# スクレイパーと画像プロキシで共有する（ワーカープロセスごと）
+governor = OutboundGovernor(
+    rate_per_second=settings.LIVECAMERA_OUTBOUND_RATE_PER_SECOND,
+    burst=settings.LIVECAMERA_OUTBOUND_BURST,
+    max_inflight=settings.LIVECAMERA_OUTBOUND_MAX_INFLIGHT,
+    failure_threshold=settings.LIVECAMERA_OUTBOUND_FAILURE_THRESHOLD,
+    reset_seconds=settings.LIVECAMERA_OUTBOUND_RESET_SECONDS,
+    acquire_timeout=settings.LIVECAMERA_OUTBOUND_ACQUIRE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from .governor import governor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedImage:
+    """キャッシュされた画像と上流のバリデータ"""
+
+    content: bytes
+    content_type: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+class ImageCache:
+    """
+    カメラ画像の2段キャッシュ（URLをキーにする）
+
+    - メモリ: 合計バイト数で上限を決めたLRU。追い出したエントリはディスクに退避する
+    - ディスク: 全ワーカーで共有する。ディレクトリ全体の合計バイト数を超えたら古いものから削除する
+    鮮度期間(fresh_seconds)内はそのまま返し、過ぎたら上流のETagで再検証する。
+    同じURLへの同時ミスは1回の上流取得を共有する（single-flight）。
+    max_entry_bytesを超えた画像のURLはuncacheable_seconds秒のあいだ覚えておき、
+    上流から取得せずにNoneを返す（呼び出し側が1回のGETでストリーミングできるように）。
+    """
+
+    # ディスクの合計バイト数をディレクトリから数え直す間隔（他のワーカーの書き込みを反映する）
+    DISK_SCAN_INTERVAL_SECONDS = 1.0
+    # 覚えておくキャッシュ不可URLの最大件数
+    MAX_UNCACHEABLE_URLS = 10_000
+
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        disk_dir: Path | None,
+        max_disk_bytes: int,
+        fresh_seconds: float,
+        max_entry_bytes: int,
+        uncacheable_seconds: float = 300,
+    ) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.fresh_seconds = fresh_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.uncacheable_seconds = uncacheable_seconds
+        self.disk_dir = disk_dir
+        self._memory: OrderedDict[str, CachedImage] = OrderedDict()
+        self._memory_bytes = 0
+        # ディスク上のエントリ（キー -> サイズ）。古い順
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_scanned_at = 0.0
+        self._disk_lock = threading.Lock()
+        # キャッシュできない大きさだったURL -> 覚えておく期限（古い順）
+        self._uncacheable: OrderedDict[str, float] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[CachedImage | None]] = {}
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "not_modified": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "uncacheable": 0,
+            "uncacheable_skips": 0,
+            "stale_on_error": 0,
+        }
+
+    def setup(self) -> None:
+        """ディスク層のディレクトリを作成し、既存のエントリを数える（起動時にlifespanから呼ぶ）"""
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._scan_disk(self.disk_dir)
+
+    # ---- ディスク層（disk_dirがNoneでないことを確かめてから呼ぶ） ----
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _scan_disk(self, disk_dir: Path) -> None:
+        """ディスク上のエントリを古い順に数え直す（他のワーカーが書いたものも含む）"""
+        entries = []
+        for path in disk_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                # 他のワーカーが削除した場合
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        entries.sort()
+        with self._disk_lock:
+            self._disk = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_bytes = sum(size for _, _, size in entries)
+            self._disk_scanned_at = time.monotonic()
+
+    def _write_disk(self, disk_dir: Path, url: str, entry: CachedImage) -> None:
+        key = self._key(url)
+        meta = asdict(entry)
+        meta.pop("content")
+        meta["url"] = url
+        # 他のワーカーが読んでも壊れないように一時ファイルからリネームする
+        for suffix, data in (
+            (".json", json.dumps(meta).encode("utf-8")),
+            (".bin", entry.content),
+        ):
+            tmp_path = disk_dir / f"{key}{suffix}.{os.getpid()}.tmp"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, disk_dir / f"{key}{suffix}")
+
+        if time.monotonic() - self._disk_scanned_at >= self.DISK_SCAN_INTERVAL_SECONDS:
+            self._scan_disk(disk_dir)
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self._disk[key] = entry.size
+            self._disk_bytes += entry.size
+
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                self._stats["disk_evictions"] += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            for suffix in (".bin", ".json"):
+                (disk_dir / f"{old_key}{suffix}").unlink(missing_ok=True)
+
+    def _read_disk(self, disk_dir: Path, url: str) -> CachedImage | None:
+        # 他のワーカーが書いたエントリはインデックスにないので、ファイルを直接見る
+        key = self._key(url)
+        try:
+            meta = json.loads((disk_dir / f"{key}.json").read_bytes())
+            content = (disk_dir / f"{key}.bin").read_bytes()
+        except (OSError, ValueError):
+            # 他のワーカーが削除した場合など
+            with self._disk_lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        if meta.pop("url", None) != url:
+            return None
+        with self._disk_lock:
+            if key not in self._disk:
+                self._disk[key] = len(content)
+                self._disk_bytes += len(content)
+        return CachedImage(content=content, **meta)
+
+    # ---- メモリ層 ----
+
+    async def _put(self, url: str, entry: CachedImage) -> None:
+        old = self._memory.pop(url, None)
+        if old is not None:
+            self._memory_bytes -= old.size
+        self._memory[url] = entry
+        self._memory_bytes += entry.size
+
+        # 上限を超えた分をLRU順に追い出してディスクに退避
+        evicted = []
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            old_url, old_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= old_entry.size
+            self._stats["memory_evictions"] += 1
+            evicted.append((old_url, old_entry))
+        if self.disk_dir is not None:
+            for old_url, old_entry in evicted:
+                await run_in_threadpool(
+                    self._write_disk, self.disk_dir, old_url, old_entry
+                )
+
+    async def _lookup(self, url: str) -> tuple[CachedImage | None, str]:
+        """(エントリ, 見つかった層) を返す"""
+        entry = self._memory.get(url)
+        if entry is not None:
+            self._memory.move_to_end(url)
+            return entry, "memory"
+        if self.disk_dir is None:
+            return None, ""
+        entry = await run_in_threadpool(self._read_disk, self.disk_dir, url)
+        if entry is not None:
+            await self._put(url, entry)
+        return entry, "disk"
+
+    # ---- 取得 ----
+
+    async def get(self, url: str, client: httpx.AsyncClient) -> CachedImage | None:
+        """
+        キャッシュ（必要なら上流から取得・再検証）した画像を返す
+
+        max_entry_bytesを超える画像はキャッシュせずNoneを返すので、
+        呼び出し側でストリーミング転送に切り替えること。
+        """
+        if self._is_uncacheable(url):
+            self._stats["uncacheable_skips"] += 1
+            return None
+
+        entry, tier = await self._lookup(url)
+        if entry is not None and time.time() - entry.fetched_at < self.fresh_seconds:
+            self._stats[f"{tier}_hits"] += 1
+            return entry
+
+        future = self._inflight.get(url)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        if entry is None:
+            self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            try:
+                result = await self._fetch(url, entry, client)
+            except Exception:
+                if entry is None:
+                    raise
+                # 上流が落ちている間は古い画像で応答する
+                self._stats["stale_on_error"] += 1
+                result = entry
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 待っている呼び出しがない場合に警告が出ないようにする
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(url, None)
+
+    def _is_uncacheable(self, url: str) -> bool:
+        expires_at = self._uncacheable.get(url)
+        if expires_at is None:
+            return False
+        if time.monotonic() < expires_at:
+            return True
+        del self._uncacheable[url]
+        return False
+
+    def _mark_uncacheable(self, url: str) -> None:
+        self._stats["uncacheable"] += 1
+        self._uncacheable.pop(url, None)
+        self._uncacheable[url] = time.monotonic() + self.uncacheable_seconds
+        # 期限切れのものと、上限を超えた分を古い順に捨てる
+        now = time.monotonic()
+        while self._uncacheable:
+            oldest_url, oldest_expires_at = next(iter(self._uncacheable.items()))
+            if (
+                oldest_expires_at > now
+                and len(self._uncacheable) <= self.MAX_UNCACHEABLE_URLS
+            ):
+                break
+            del self._uncacheable[oldest_url]
+
+    async def _fetch(
+        self, url: str, entry: CachedImage | None, client: httpx.AsyncClient
+    ) -> CachedImage | None:
+        headers = {}
+        if entry is not None:
+            self._stats["revalidations"] += 1
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        async with (
+            governor.request_async(url),
+            client.stream("GET", url, headers=headers) as response,
+        ):
+            if entry is not None and response.status_code == 304:
+                self._stats["not_modified"] += 1
+                refreshed = CachedImage(
+                    content=entry.content,
+                    content_type=entry.content_type,
+                    etag=response.headers.get("ETag", entry.etag),
+                    last_modified=response.headers.get(
+                        "Last-Modified", entry.last_modified
+                    ),
+                    fetched_at=time.time(),
+                )
+                await self._put(url, refreshed)
+                return refreshed
+
+            response.raise_for_status()
+
+            content_length = response.headers.get("Content-Length")
+            if (
+                content_length
+                and content_length.isdigit()
+                and int(content_length) > self.max_entry_bytes
+            ):
+                self._mark_uncacheable(url)
+                return None
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_entry_bytes:
+                    self._mark_uncacheable(url)
+                    return None
+                chunks.append(chunk)
+
+            new_entry = CachedImage(
+                content=b"".join(chunks),
+                content_type=response.headers.get("Content-Type", "image/jpeg"),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                fetched_at=time.time(),
+            )
+        await self._put(url, new_entry)
+        return new_entry
+
+    def stats(self) -> dict[str, Any]:
+        """キャッシュサイズ・ヒット率・追い出し回数を返す"""
+        stats: dict[str, Any] = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        requests = hits + stats["misses"]
+        stats["hit_ratio"] = hits / requests if requests else 0.0
+        stats["memory_entries"] = len(self._memory)
+        stats["memory_bytes"] = self._memory_bytes
+        stats["max_memory_bytes"] = self.max_memory_bytes
+        stats["disk_entries"] = len(self._disk)
+        stats["disk_bytes"] = self._disk_bytes
+        stats["max_disk_bytes"] = self.max_disk_bytes
+        stats["uncacheable_urls"] = len(self._uncacheable)
+        stats["inflight"] = len(self._inflight)
+        return stats
@@ -0,0 +1,175 @@
+import os
+import struct
+from typing import Any
+
+import requests
+import urllib3
+
+from app.core.config import settings
+
+from .governor import governor
+
+# JPEGのサイズ解析のために先頭から読み込むバイト数
+# SOFマーカーは通常、先頭数KB以内にある（見つからない場合は寸法なしで返す）
+PROBE_RANGE_BYTES = 16 * 1024
+
+# SOFn（寸法を持つフレームヘッダ）のマーカー。DHT(C4), JPG(C8), DAC(CC)は除く
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def parse_jpeg_dimensions(data: bytes) -> tuple[int, int] | None:
+    """
+    JPEGの先頭バイト列から (幅, 高さ) を取り出す関数
+
+    画像全体は不要で、SOFマーカーまでのバイトがあれば解析できる。
+    解析できない場合は None を返す。
+    """
+    if len(data) < 4 or data[0:2] != b"\xff\xd8":
+        return None
+
+    pos = 2
+    length = len(data)
+    while pos + 4 <= length:
+        # マーカーの前のフィルバイト(0xFF)を読み飛ばす
+        if data[pos] != 0xFF:
+            return None
+        while pos < length and data[pos] == 0xFF:
+            pos += 1
+        if pos >= length:
+            return None
+        marker = data[pos]
+        pos += 1
+
+        # 長さフィールドを持たないマーカー
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        # EOI / SOS 以降にはフレームヘッダは出てこない
+        if marker in (0xD9, 0xDA):
+            return None
+
+        if pos + 2 > length:
+            return None
+        segment_length = struct.unpack(">H", data[pos : pos + 2])[0]
+        if segment_length < 2:
+            return None
+
+        if marker in _SOF_MARKERS:
+            if pos + 7 > length:
+                return None
+            height, width = struct.unpack(">HH", data[pos + 3 : pos + 7])
+            return width, height
+
+        pos += segment_length
+
+    return None
+
+
+def _metadata_from_headers(url: str, headers: Any) -> dict[str, Any]:
+    """レスポンスヘッダから画像のメタデータを組み立てる"""
+    return {
+        "url": url,
+        "filename": os.path.basename(url),
+        "content_type": headers.get("Content-Type", "image/jpeg"),
+        "size": None,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "width": None,
+        "height": None,
+    }
+
+
+def _total_size_from_content_range(value: str | None) -> int | None:
+    """Content-Range: bytes 0-65535/123456 から全体サイズを取り出す"""
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def probe_image(url: str, session: requests.Session | None = None) -> dict[str, Any]:
+    """
+    画像本体をダウンロードせずにメタデータだけを取得する関数
+
+    1. HEADでContent-Length / Content-Type / ETag / Last-Modifiedを取得
+    2. Range: bytes=0-N のGETで先頭だけを取得してJPEGの寸法を解析
+       （HEADが使えないサーバーの場合もこのGETでヘッダを補う）
+    Range GETが失敗してもHEADで取得できていれば、寸法なしでHEADのメタデータを返す。
+    """
+    http = session or requests
+    metadata: dict[str, Any] | None = None
+
+    # HEADでヘッダ情報を取得（405/501などHEAD非対応の場合はRange GETに任せる）
+    try:
+        with governor.request(url):
+            head = http.head(
+                url,
+                allow_redirects=True,
+                timeout=settings.LIVECAMERA_SCRAPE_TIMEOUT_SECONDS,
+            )
+        if head.ok:
+            metadata = _metadata_from_headers(url, head.headers)
+            content_length = head.headers.get("Content-Length")
+            if content_length and content_length.isdigit():
+                metadata["size"] = int(content_length)
+    except requests.RequestException:
+        metadata = None
+
+    # 先頭数KBだけを取得して寸法を解析
+    try:
+        with governor.request(url):
+            response = http.get(
+                url,
+                headers={"Range": f"bytes=0-{PROBE_RANGE_BYTES - 1}"},
+                stream=True,
+                timeout=settings.LIVECAMERA_SCRAPE_TIMEOUT_SECONDS,
+            )
+            try:
+                response.raise_for_status()
+                range_metadata = metadata or _metadata_from_headers(
+                    url, response.headers
+                )
+
+                # Range非対応のサーバーは200で全体を返してくるが、先頭だけ読んで接続を切る
+                head_bytes = response.raw.read(PROBE_RANGE_BYTES, decode_content=True)
+                if range_metadata["size"] is None:
+                    if response.status_code == 206:
+                        range_metadata["size"] = _total_size_from_content_range(
+                            response.headers.get("Content-Range")
+                        )
+                    else:
+                        content_length = response.headers.get("Content-Length")
+                        if content_length and content_length.isdigit():
+                            range_metadata["size"] = int(content_length)
+            finally:
+                response.close()
+    except (requests.RequestException, urllib3.exceptions.HTTPError):
+        if metadata is None:
+            raise
+        # HEADで取得できた分だけを返す
+        return metadata
+    metadata = range_metadata
+
+    dimensions = parse_jpeg_dimensions(head_bytes)
+    if dimensions:
+        metadata["width"], metadata["height"] = dimensions
+
+    return metadata
+
+
+def download_image(url: str, session: requests.Session | None = None) -> dict[str, Any]:
+    """
+    画像を全体ダウンロードしてメタデータと画像データを返す関数
+    （画像バイト列が必要な呼び出し元のみが使う）
+    """
+    http = session or requests
+    with governor.request(url):
+        response = http.get(url, timeout=settings.LIVECAMERA_SCRAPE_TIMEOUT_SECONDS)
+        response.raise_for_status()
+
+    metadata = _metadata_from_headers(url, response.headers)
+    metadata["size"] = len(response.content)
+    dimensions = parse_jpeg_dimensions(response.content[:PROBE_RANGE_BYTES])
+    if dimensions:
+        metadata["width"], metadata["height"] = dimensions
+    metadata["content"] = response.content
+    return metadata
@@ -1,145 +1,591 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import math
 import os
-from urllib.parse import urljoin
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
-import re
-from typing import Dict, Any, List
+from pathlib import Path
+from typing import Literal
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 
 # deps.pyから認証関連の依存関係をインポート
-from app.api.deps import get_api_key
+from app.api.deps import require_api_key_scope
+from app.core.api_keys import ApiKeyRecord, api_key_store
+from app.core.config import settings
 
-router = APIRouter()
+from .archive import ImageArchive
+from .bulk import scrape_many, to_ndjson
+from .cache import ScrapeCache
+from .client import close_http_client, get_http_client
+from .governor import OutboundRejectedError, failure_of, governor
+from .imagecache import ImageCache
+from .mosaic import MosaicRenderer, MosaicSpec, source_tag
+from .poller import CAMERA_ID_PATTERN, MIN_INTERVAL_SECONDS, CameraPoller
+from .scraper import scrape_bridge_data  # noqa: F401  (互換性のため再エクスポート)
+
+# 取得した画像の時系列アーカイブ（ディスク上で全ワーカーが共有する）
+image_archive = (
+    ImageArchive(
+        Path(settings.LIVECAMERA_ARCHIVE_DIR),
+        retention_days=settings.LIVECAMERA_ARCHIVE_RETENTION_DAYS,
+        max_bytes=settings.LIVECAMERA_ARCHIVE_MAX_BYTES,
+    )
+    if settings.LIVECAMERA_ARCHIVE_DIR
+    else None
+)
+
+# 登録カメラの定期取得（lifespanで開始・停止する）
+camera_poller = CameraPoller(
+    Path(settings.LIVECAMERA_POLLER_DIR),
+    default_interval_seconds=settings.LIVECAMERA_POLLER_INTERVAL_SECONDS,
+    jitter=settings.LIVECAMERA_POLLER_JITTER,
+    archive=image_archive,
+    retention_interval_seconds=settings.LIVECAMERA_ARCHIVE_RETENTION_INTERVAL_SECONDS,
+    near_duplicate_distance=settings.LIVECAMERA_ARCHIVE_NEAR_DUPLICATE_DISTANCE,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:  # noqa: ARG001
+    # ディレクトリはimport時ではなく起動時に作る
+    if image_archive is not None:
+        image_archive.setup()
+    camera_poller.setup()
+    image_cache.setup()
+    if settings.LIVECAMERA_POLLER_ENABLED:
+        await camera_poller.start(settings.LIVECAMERA_POLLER_URLS)
+    yield
+    await camera_poller.stop()
+    mosaic_renderer.shutdown()
+    await close_http_client()
+
+
+router = APIRouter(lifespan=lifespan)
+
+# APIキーのscopesに"sendai_livecamera_bs4"（または"*"）が必要
+require_api_key = require_api_key_scope("sendai_livecamera_bs4")
+
+# スクレイプ結果のキャッシュ（ワーカープロセスごと）
+scrape_cache = ScrapeCache(
+    ttl_seconds=settings.LIVECAMERA_SCRAPE_CACHE_TTL_SECONDS,
+    stale_seconds=settings.LIVECAMERA_SCRAPE_CACHE_STALE_SECONDS,
+    max_entries=settings.LIVECAMERA_SCRAPE_CACHE_MAX_ENTRIES,
+)
+
+# 画像プロキシのキャッシュ（ワーカープロセスごと。ディスク層はワーカー間で共有）
+image_cache = ImageCache(
+    max_memory_bytes=settings.LIVECAMERA_IMAGE_CACHE_MEMORY_BYTES,
+    disk_dir=Path(settings.LIVECAMERA_IMAGE_CACHE_DISK_DIR)
+    if settings.LIVECAMERA_IMAGE_CACHE_DISK_DIR
+    else None,
+    max_disk_bytes=settings.LIVECAMERA_IMAGE_CACHE_DISK_BYTES,
+    fresh_seconds=settings.LIVECAMERA_IMAGE_CACHE_FRESH_SECONDS,
+    max_entry_bytes=settings.LIVECAMERA_IMAGE_CACHE_MAX_ENTRY_BYTES,
+    uncacheable_seconds=settings.LIVECAMERA_IMAGE_CACHE_UNCACHEABLE_SECONDS,
+)
+
+# 複数カメラのモザイク画像（ワーカープロセスごと）
+mosaic_renderer = MosaicRenderer(
+    max_workers=settings.LIVECAMERA_MOSAIC_WORKERS,
+    max_cached=settings.LIVECAMERA_MOSAIC_CACHE_ENTRIES,
+)
 
-def scrape_bridge_data(url: str) -> Dict[str, Any]:
-    """
-    指定されたURLから橋の情報と画像をスクレイプする関数
-    """
-    try:
-        # ページのHTMLを取得（エンコーディングを明示的に指定）
-        response = requests.get(url)
-        response.encoding = 'shift_jis'  # ページのエンコーディングをShift-JISに設定
-        
-        # HTMLをパース
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # タイトル（橋の名前）を取得
-        bridge_name = soup.find('td', class_='style1')
-        bridge_name = bridge_name.text.strip() if bridge_name else "不明"
-        
-        # 撮影日時を取得
-        date_info = soup.find('td', class_='style2')
-        capture_date = "不明"
-        if date_info:
-            date_text = date_info.text.strip()
-            date_match = re.search(r'撮影日時：(\d+/\d+ \d+:\d+)', date_text)
-            if date_match:
-                capture_date = date_match.group(1)
-        
-        # 位置情報を取得
-        location_info = soup.find('div', class_='style3')
-        location = location_info.text.strip() if location_info else "不明"
-        
-        # 画像タグを見つける
-        img_tags = soup.find_all('img')
-        
-        # 画像URLをフィルタリング (拡張子がjpgとjpegのみ)
-        image_data = []
-        for img in img_tags:
-            if img.get('src') and any(img['src'].lower().endswith(ext) for ext in ['.jpg', '.jpeg']):
-                # sp.gifなどの小さな画像を除外
-                if 'sp.gif' not in img['src'].lower():
-                    # 相対URLを絶対URLに変換
-                    img_url = urljoin(url, img['src'])
-                    
-                    # 画像データを取得
-                    try:
-                        img_response = requests.get(img_url)
-                        img_response.raise_for_status()
-                        
-                        # 画像情報を追加
-                        image_data.append({
-                            "url": img_url,
-                            "filename": os.path.basename(img_url),
-                            "content_type": img_response.headers.get('Content-Type', 'image/jpeg'),
-                            "size": len(img_response.content)
-                        })
-                    except Exception as e:
-                        print(f"画像の取得中にエラーが発生しました: {img_url}, エラー: {e}")
-        
-        # 画像がない場合
-        if not image_data:
-            return {
-                "success": False,
-                "error": "画像が見つかりませんでした",
-                "message": "URLを確認してください"
-            }
-        
-        # 結果をまとめる
-        result = {
-            "success": True,
-            "bridge_info": {
-                "name": bridge_name,
-                "capture_date": capture_date,
-                "location": location,
-                "source_url": url,
-                "scrape_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            },
-            "images": image_data
-        }
-        
-        return result
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "message": "スクレイピング中にエラーが発生しました"
-        }
 
 # APIキー認証を使用したエンドポイント
 @router.get("/bridge")
-def get_bridge_data(url: str, api_key: str = Depends(get_api_key)):
+def get_bridge_data(url: str, api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
     """
     指定したURLから橋の情報と画像URLを取得するエンドポイント
-    
+
     - **url**: スクレイピングするウェブページのURL
     """
     if not url:
         raise HTTPException(status_code=400, detail="URLパラメータが必要です")
-    
-    result = scrape_bridge_data(url)
-    
+
+    result = scrape_cache.get(url)
+
     if not result["success"]:
         raise HTTPException(status_code=500, detail=result["message"])
-    
+
     return result
 
+
+class BridgeBulkRequest(BaseModel):
+    urls: list[str]
+
+
+# 複数のURLをまとめてスクレイプするエンドポイント
+@router.post("/bridge/bulk")
+async def get_bridge_data_bulk(
+    body: BridgeBulkRequest,
+    api_key: ApiKeyRecord = Depends(require_api_key),  # noqa: ARG001
+):
+    """
+    複数のURLから橋の情報を並行して取得し、終わったものから順にNDJSONで返す
+
+    - **urls**: スクレイピングするウェブページのURLのリスト
+
+    **戻り値** (1行ごと):
+    - index: リクエスト中のURLの位置
+    - url: スクレイピングしたURL
+    - success: 成否（失敗時は error / message を含む）
+    """
+    if not body.urls:
+        raise HTTPException(status_code=400, detail="URLが指定されていません")
+    if len(body.urls) > settings.LIVECAMERA_BULK_MAX_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"URLは最大{settings.LIVECAMERA_BULK_MAX_URLS}件までです",
+        )
+
+    results = scrape_many(
+        body.urls,
+        scrape_cache.get,
+        concurrency=settings.LIVECAMERA_BULK_CONCURRENCY,
+        per_host_concurrency=settings.LIVECAMERA_BULK_PER_HOST_CONCURRENCY,
+    )
+    return StreamingResponse(to_ndjson(results), media_type="application/x-ndjson")
+
+
+# スクレイプ結果キャッシュの統計情報を取得するエンドポイント
+@router.get("/bridge/cache/stats")
+def get_bridge_cache_stats(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    スクレイプ結果キャッシュのヒット・ミス・再検証回数を返す
+    """
+    return scrape_cache.stats()
+
+
+# 上流からそのまま転送するレスポンスヘッダ
+PASSTHROUGH_HEADERS = (
+    "Content-Length",
+    "Content-Encoding",
+    "ETag",
+    "Last-Modified",
+    "Cache-Control",
+)
+
+
+def _passthrough_headers(upstream: httpx.Response, image_url: str) -> dict[str, str]:
+    headers = {
+        name: upstream.headers[name]
+        for name in PASSTHROUGH_HEADERS
+        if name in upstream.headers
+    }
+    headers["Content-Disposition"] = f"inline; filename={os.path.basename(image_url)}"
+    return headers
+
+
+async def _stream_upstream(
+    upstream: httpx.Response, host: str, max_bytes: int, api_key: ApiKeyRecord
+) -> AsyncIterator[bytes]:
+    """
+    上流のチャンクを届いた順に転送する（サイズ上限を超えたら打ち切る）
+
+    転送が途中で失敗・切断されるとStreamingResponseのbackgroundは実行されないため、
+    上流のレスポンスを閉じて外向きリクエストの枠を返すのはここで必ず行う。
+    """
+    failed: bool | None = None
+    try:
+        received = 0
+        async for chunk in upstream.aiter_raw(settings.LIVECAMERA_IMAGE_CHUNK_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                raise RuntimeError(f"画像サイズが上限({max_bytes} bytes)を超えました")
+            api_key_store.add_bytes(api_key, len(chunk))
+            yield chunk
+        failed = False
+    except BaseException as e:
+        # クライアントの切断などで最後まで読めなかった場合は結果不明（None）のまま
+        failed = failure_of(e)
+        raise
+    finally:
+        try:
+            await upstream.aclose()
+        finally:
+            governor.release(host, failed)
+
+
 # 特定の画像を取得するエンドポイント
 @router.get("/image")
-async def get_image(image_url: str, api_key: str = Depends(get_api_key)):
+async def get_image(
+    image_url: str, request: Request, api_key: ApiKeyRecord = Depends(require_api_key)
+):
     """
     指定された画像URLから画像データを取得して返す
-    
+    （キャッシュにあればキャッシュから、大きすぎる画像は上流からストリーミングで転送）
+
     - **image_url**: 画像のURL
     """
     if not image_url:
         raise HTTPException(status_code=400, detail="画像URLが指定されていません")
-    
+
+    client = get_http_client()
     try:
-        response = requests.get(image_url)
-        response.raise_for_status()
-        
-        # Content-Typeを検出
-        content_type = response.headers.get('Content-Type', 'image/jpeg')
-        
-        # 画像データを直接返す
+        cached = await image_cache.get(image_url, client)
+    except OutboundRejectedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"画像の取得中にエラーが発生しました: {str(e)}"
+        )
+
+    if cached is not None:
+        headers = {
+            "Content-Disposition": f"inline; filename={os.path.basename(image_url)}"
+        }
+        if cached.etag:
+            headers["ETag"] = cached.etag
+        if cached.last_modified:
+            headers["Last-Modified"] = cached.last_modified
+        # クライアントが同じETagを持っていれば本体を返さない
+        if cached.etag and request.headers.get("If-None-Match") == cached.etag:
+            return Response(status_code=304, headers=headers)
+        api_key_store.add_bytes(api_key, len(cached.content))
         return Response(
-            content=response.content,
-            media_type=content_type,
-            headers={"Content-Disposition": f"inline; filename={os.path.basename(image_url)}"}
+            content=cached.content, media_type=cached.content_type, headers=headers
+        )
+
+    # クライアントのIf-None-Matchを上流に転送
+    upstream_headers = {}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        upstream_headers["If-None-Match"] = if_none_match
+
+    try:
+        host = await governor.acquire_async(image_url)
+    except OutboundRejectedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        upstream = await client.send(
+            client.build_request("GET", image_url, headers=upstream_headers),
+            stream=True,
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"画像の取得中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+        governor.release(host, failed=failure_of(e))
+        raise HTTPException(
+            status_code=500, detail=f"画像の取得中にエラーが発生しました: {str(e)}"
+        )
+
+    async def close_upstream() -> None:
+        await upstream.aclose()
+        governor.release(host, failed=upstream.status_code >= 500)
+
+    # 上流が304ならそのまま304を返す
+    if upstream.status_code == 304:
+        await close_upstream()
+        return Response(
+            status_code=304, headers=_passthrough_headers(upstream, image_url)
+        )
+
+    if upstream.status_code >= 400:
+        await close_upstream()
+        raise HTTPException(
+            status_code=500,
+            detail=f"画像の取得中にエラーが発生しました: 上流のステータス {upstream.status_code}",
+        )
+
+    # Content-Lengthで分かる場合は転送前にサイズ上限をチェック
+    max_bytes = settings.LIVECAMERA_IMAGE_MAX_BYTES
+    content_length = upstream.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        await close_upstream()
+        raise HTTPException(
+            status_code=502,
+            detail=f"画像サイズが上限({max_bytes} bytes)を超えています",
+        )
+
+    # Content-Typeを検出
+    content_type = upstream.headers.get("Content-Type", "image/jpeg")
+
+    return StreamingResponse(
+        _stream_upstream(upstream, host, max_bytes, api_key),
+        media_type=content_type,
+        headers=_passthrough_headers(upstream, image_url),
+    )
+
+
+# 外向きリクエストの制御状態を取得するエンドポイント
+@router.get("/outbound/stats")
+def get_outbound_stats(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    ホストごとのサーキットブレーカー状態・同時実行数・拒否回数を返す
+    """
+    return governor.stats()
+
+
+# 画像キャッシュの統計情報を取得するエンドポイント
+@router.get("/image/cache/stats")
+def get_image_cache_stats(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    画像キャッシュのサイズ・ヒット率・追い出し回数を返す
+    """
+    return image_cache.stats()
+
+
+class CameraRegister(BaseModel):
+    url: str
+    interval_seconds: float | None = Field(default=None, ge=MIN_INTERVAL_SECONDS)
+    id: str | None = Field(default=None, pattern=CAMERA_ID_PATTERN)
+
+
+# ポーリング対象のカメラ一覧を取得するエンドポイント
+@router.get("/cameras")
+def list_cameras(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    ポーリング対象として登録されているカメラの一覧を返す
+    """
+    return list(camera_poller.registry.load().values())
+
+
+# ポーリング対象のカメラを登録するエンドポイント
+@router.post("/cameras")
+def register_camera(
+    camera_in: CameraRegister,
+    api_key: ApiKeyRecord = Depends(require_api_key),  # noqa: ARG001
+):
+    """
+    カメラページをポーリング対象に登録する
+
+    - **url**: カメラページのURL
+    - **interval_seconds**: 取得間隔（秒、10秒以上）。省略時は設定値
+    - **id**: カメラID（英数字・"_"・"-"の64文字以内）。省略時はURLから生成
+    """
+    try:
+        return camera_poller.registry.register(
+            camera_in.url,
+            camera_in.interval_seconds or settings.LIVECAMERA_POLLER_INTERVAL_SECONDS,
+            camera_in.id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ポーリング状態を取得するエンドポイント
+@router.get("/cameras/poller/status")
+def get_poller_status(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    このワーカーのポーリング状態（リーダーかどうか、取得回数など）を返す
+    """
+    return camera_poller.status()
+
+
+# ポーリング対象のカメラを登録解除するエンドポイント
+@router.delete("/cameras/{camera_id}")
+def unregister_camera(camera_id: str, api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    カメラをポーリング対象から外す
+    """
+    if not camera_poller.registry.unregister(camera_id):
+        raise HTTPException(
+            status_code=404, detail=f"カメラ '{camera_id}' が見つかりません"
+        )
+    return {"message": "カメラの登録を解除しました", "id": camera_id}
+
+
+# カメラの最新情報を取得するエンドポイント（メモリから即座に返す）
+@router.get("/cameras/{camera_id}/latest")
+def get_camera_latest(camera_id: str, api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    ポーリングで取得済みのカメラの最新情報を返す
+    """
+    snapshot = camera_poller.store.get(camera_id)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"カメラ '{camera_id}' のスナップショットがありません",
+        )
+    return {
+        "camera_id": snapshot.camera_id,
+        "bridge_info": snapshot.bridge_info,
+        "images": snapshot.images,
+        "updated_at": snapshot.updated_at,
+    }
+
+
+# カメラの最新画像を取得するエンドポイント（メモリから即座に返す）
+@router.get("/cameras/{camera_id}/latest/image")
+def get_camera_latest_image(
+    camera_id: str, api_key: ApiKeyRecord = Depends(require_api_key)
+):
+    """
+    ポーリングで取得済みのカメラの最新画像を返す
+    """
+    snapshot = camera_poller.store.get(camera_id)
+    if snapshot is None or snapshot.image is None:
+        raise HTTPException(
+            status_code=404, detail=f"カメラ '{camera_id}' の画像がありません"
+        )
+    api_key_store.add_bytes(api_key, len(snapshot.image))
+    return Response(content=snapshot.image, media_type=snapshot.content_type)
+
+
+def _get_archive() -> ImageArchive:
+    if image_archive is None:
+        raise HTTPException(status_code=404, detail="アーカイブは無効です")
+    return image_archive
+
+
+# アーカイブの保存状況を取得するエンドポイント
+@router.get("/archive/stats")
+def get_archive_stats(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    カメラごとの保存日数・フレーム数・サイズを返す
+    """
+    return _get_archive().stats()
+
+
+# 指定期間のフレーム一覧を取得するエンドポイント
+@router.get("/archive/{camera_id}/frames")
+def get_archive_frames(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    limit: int = 1000,
+    api_key: ApiKeyRecord = Depends(require_api_key),  # noqa: ARG001
+):
+    """
+    start〜endの間にアーカイブされたフレームのメタデータを時刻順に返す
+
+    - **start**, **end**: ISO 8601形式の日時（タイムゾーンなしはサーバーのローカル時刻）
+    - **limit**: 最大件数
+    """
+    if end < start:
+        raise HTTPException(
+            status_code=400, detail="endはstart以降の日時を指定してください"
+        )
+    try:
+        records = _get_archive().between(
+            camera_id, start.timestamp(), end.timestamp(), limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "camera_id": camera_id,
+        "count": len(records),
+        "frames": [r.to_dict() for r in records],
+    }
+
+
+# 指定時刻に最も近いフレームの画像を取得するエンドポイント
+@router.get("/archive/{camera_id}/image")
+def get_archive_image(
+    camera_id: str, at: datetime, api_key: ApiKeyRecord = Depends(require_api_key)
+):
+    """
+    指定時刻に最も近いフレームの画像を返す
+
+    - **at**: ISO 8601形式の日時
+    """
+    archive = _get_archive()
+    try:
+        record = archive.nearest(camera_id, at.timestamp())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if record is None:
+        raise HTTPException(
+            status_code=404, detail=f"カメラ '{camera_id}' のアーカイブがありません"
+        )
+    image = archive.read(camera_id, record)
+    api_key_store.add_bytes(api_key, len(image))
+    return Response(
+        content=image,
+        media_type="image/jpeg",
+        headers={
+            "X-Captured-At": record.to_dict()["captured_at"],
+            "ETag": f'"{record.digest.hex()}"',
+        },
+    )
+
+
+async def _load_mosaic_source(source: str) -> tuple[bytes | None, str]:
+    """カメラIDまたは画像URLから (画像データ, タグ) を返す。取得できなければ画像データはNone"""
+    if source.startswith(("http://", "https://")):
+        try:
+            cached = await image_cache.get(source, get_http_client())
+        except Exception as e:
+            print(f"モザイクの画像取得中にエラー: {source}, エラー: {str(e)}")
+            return None, source_tag(None)
+        if cached is None:
+            return None, source_tag(None)
+        return cached.content, source_tag(cached.content, cached.etag)
+    snapshot = camera_poller.store.get(source)
+    image = snapshot.image if snapshot is not None else None
+    return image, source_tag(image)
+
+
+# 複数カメラの画像を1枚に並べたモザイク画像を取得するエンドポイント
+@router.get("/mosaic")
+async def get_mosaic(
+    request: Request,
+    sources: list[str] = Query(...),
+    columns: int | None = None,
+    tile_width: int = 320,
+    tile_height: int = 180,
+    format: Literal["jpeg", "webp"] = "jpeg",
+    quality: int = 80,
+    api_key: ApiKeyRecord = Depends(require_api_key),
+):
+    """
+    複数のカメラ・画像を格子状に並べた1枚の画像を返す
+    （どのソースも変わっていなければキャッシュから返す）
+
+    - **sources**: 登録済みカメラのID、または画像URL（複数指定、並べる順）
+    - **columns**: 列数（省略時は正方形に近くなるように決める）
+    - **tile_width**, **tile_height**: 1タイルの大きさ（ピクセル）
+    - **format**: 出力形式（jpeg / webp）
+    - **quality**: 出力画質（1〜100）
+    """
+    if len(sources) > settings.LIVECAMERA_MOSAIC_MAX_TILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ソースは最大{settings.LIVECAMERA_MOSAIC_MAX_TILES}件までです",
+        )
+    if not (16 <= tile_width <= 1920 and 16 <= tile_height <= 1080):
+        raise HTTPException(status_code=400, detail="タイルの大きさが範囲外です")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="qualityは1〜100で指定してください")
+    if columns is None:
+        columns = math.ceil(math.sqrt(len(sources)))
+    if not 1 <= columns <= len(sources):
+        raise HTTPException(status_code=400, detail="columnsが範囲外です")
+    spec = MosaicSpec(columns, tile_width, tile_height, format, quality)
+    if spec.pixels(len(sources)) > settings.LIVECAMERA_MOSAIC_MAX_PIXELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"モザイクは最大{settings.LIVECAMERA_MOSAIC_MAX_PIXELS}ピクセルまでです",
+        )
+
+    loaded = await asyncio.gather(*(_load_mosaic_source(source) for source in sources))
+    etag = f'"{mosaic_renderer.cache_key([tag for _, tag in loaded], spec)}"'
+    # クライアントが同じモザイクを持っていれば合成しない
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        mosaic = await mosaic_renderer.render(loaded, spec)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"モザイク画像の作成中にエラーが発生しました: {str(e)}",
+        )
+    headers = {"ETag": mosaic.etag, "Cache-Control": "no-cache"}
+    if mosaic.missing:
+        headers["X-Mosaic-Missing"] = ",".join(sources[i] for i in mosaic.missing)
+    api_key_store.add_bytes(api_key, len(mosaic.content))
+    return Response(
+        content=mosaic.content, media_type=mosaic.media_type, headers=headers
+    )
+
+
+# モザイク画像のキャッシュ状況を取得するエンドポイント
+@router.get("/mosaic/stats")
+def get_mosaic_stats(api_key: ApiKeyRecord = Depends(require_api_key)):  # noqa: ARG001
+    """
+    モザイク画像のキャッシュヒット数・合成回数を返す
+    """
+    return mosaic_renderer.stats()
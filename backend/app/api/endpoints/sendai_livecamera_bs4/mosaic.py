@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+# 取得できなかったタイルの色
+MISSING_TILE_COLOR = (48, 48, 48)
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+@dataclass(frozen=True)
+class MosaicSpec:
+    """モザイクのグリッド指定"""
+
+    columns: int
+    tile_width: int
+    tile_height: int
+    format: str = "jpeg"
+    quality: int = 80
+
+    def rows(self, count: int) -> int:
+        return max(1, math.ceil(count / self.columns))
+
+    def pixels(self, count: int) -> int:
+        """タイルcount枚のモザイクの総ピクセル数"""
+        return self.rows(count) * self.columns * self.tile_width * self.tile_height
+
+
+@dataclass
+class Mosaic:
+    content: bytes
+    media_type: str
+    etag: str
+    missing: list[int]
+
+
+def decode_tile(data: bytes, width: int, height: int) -> np.ndarray | None:
+    """
+    画像をデコードしてタイルの大きさに合わせる（プロセスプールで実行する）
+
+    JPEGはdraftで縮小デコードしてから、中央を切り出してリサイズする。
+    デコードできない場合はNoneを返す。
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (width, height))
+            tile = ImageOps.fit(
+                image.convert("RGB"), (width, height), Image.Resampling.BILINEAR
+            )
+            return np.asarray(tile, dtype=np.uint8)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def compose(tiles: Sequence[np.ndarray | None], spec: MosaicSpec) -> np.ndarray:
+    """
+    タイルを1枚のキャンバスに並べる
+
+    (行, 列, 高さ, 幅, 3) の配列に積んでから軸を入れ替えることで、
+    タイルごとのループを使わずに1回のコピーで並べる。
+    """
+    rows = spec.rows(len(tiles))
+    grid = np.empty(
+        (rows * spec.columns, spec.tile_height, spec.tile_width, 3), dtype=np.uint8
+    )
+    grid[:] = MISSING_TILE_COLOR
+    present = [(i, tile) for i, tile in enumerate(tiles) if tile is not None]
+    if present:
+        grid[[i for i, _ in present]] = np.stack([tile for _, tile in present])
+    return (
+        grid.reshape(rows, spec.columns, spec.tile_height, spec.tile_width, 3)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(rows * spec.tile_height, spec.columns * spec.tile_width, 3)
+    )
+
+
+def encode(canvas: np.ndarray, spec: MosaicSpec) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(canvas).save(buffer, spec.format.upper(), quality=spec.quality)
+    return buffer.getvalue()
+
+
+def compose_and_encode(tiles: Sequence[np.ndarray | None], spec: MosaicSpec) -> bytes:
+    """合成してエンコードする（スレッドプールで実行する）"""
+    return encode(compose(tiles, spec), spec)
+
+
+def source_tag(data: bytes | None, etag: str | None = None) -> str:
+    """キャッシュキー用の、ソース画像を識別する文字列（上流のETagがあればそれを使う）"""
+    if data is None:
+        return "-"
+    if etag:
+        return etag
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class MosaicRenderer:
+    """
+    複数カメラの画像を1枚に合成する
+
+    タイルのデコードとリサイズはプロセスプールで並列に行い、NumPyでの合成と
+    エンコードはイベントループを止めないようスレッドプールで行う。出力はソースのETagとグリッド指定をキーに
+    LRUでキャッシュするので、どのソースも変わっていなければ合成しない。
+    """
+
+    def __init__(self, max_workers: int, max_cached: int) -> None:
+        self.max_workers = max_workers
+        self.max_cached = max_cached
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self._cache: OrderedDict[str, Mosaic] = OrderedDict()
+        self._stats = {"hits": 0, "renders": 0, "tiles_decoded": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    @staticmethod
+    def cache_key(tags: Sequence[str], spec: MosaicSpec) -> str:
+        key = "\n".join([repr(spec), *tags])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def cached(self, key: str) -> Mosaic | None:
+        mosaic = self._cache.get(key)
+        if mosaic is not None:
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+        return mosaic
+
+    async def render(
+        self, sources: Sequence[tuple[bytes | None, str]], spec: MosaicSpec
+    ) -> Mosaic:
+        """
+        sources: (画像データ, source_tag()) のリスト。画像データがNoneのタイルは塗りつぶす
+        """
+        key = self.cache_key([tag for _, tag in sources], spec)
+        mosaic = self.cached(key)
+        if mosaic is not None:
+            return mosaic
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        futures = [
+            loop.run_in_executor(
+                pool, decode_tile, data, spec.tile_width, spec.tile_height
+            )
+            if data is not None
+            else None
+            for data, _ in sources
+        ]
+        tiles: list[np.ndarray | None] = [
+            await future if future is not None else None for future in futures
+        ]
+        self._stats["tiles_decoded"] += sum(future is not None for future in futures)
+
+        content = await run_in_threadpool(compose_and_encode, tiles, spec)
+        self._stats["renders"] += 1
+        mosaic = Mosaic(
+            content=content,
+            media_type=MEDIA_TYPES[spec.format],
+            etag=f'"{key}"',
+            missing=[i for i, tile in enumerate(tiles) if tile is None],
+        )
+        self._cache[key] = mosaic
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return mosaic
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._stats,
+            "cached": len(self._cache),
+            "cached_bytes": sum(len(m.content) for m in self._cache.values()),
+        }
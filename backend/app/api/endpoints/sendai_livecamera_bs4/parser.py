@@ -0,0 +1,149 @@
+import re
+from collections.abc import Callable
+from typing import Any
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# ページのエンコーディング
+PAGE_ENCODING = "shift_jis"
+
+# 取得対象の要素以外はツリーに入れない（html.parser用）
+_STRAINER = SoupStrainer(["td", "div", "img"])
+
+_CAPTURE_DATE_RE = re.compile(r"撮影日時：(\d+/\d+ \d+:\d+)")
+
+# オプションの高速パーサー（インストールされている場合のみ使う）
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:  # pragma: no cover
+    _SelectolaxParser = None
+
+try:
+    from lxml import html as _lxml_html
+except ImportError:  # pragma: no cover
+    _lxml_html = None
+
+
+def _class_xpath(tag: str, class_name: str) -> str:
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+def _is_camera_image(src: str | None) -> bool:
+    """拡張子がjpg/jpegの画像のみを対象にし、sp.gifなどの小さな画像を除外する"""
+    if not src:
+        return False
+    lowered = src.lower()
+    return lowered.endswith((".jpg", ".jpeg")) and "sp.gif" not in lowered
+
+
+def _build_page_info(
+    url: str,
+    bridge_name: str | None,
+    date_text: str | None,
+    location: str | None,
+    srcs: list[str],
+) -> dict[str, Any]:
+    capture_date = "不明"
+    if date_text:
+        date_match = _CAPTURE_DATE_RE.search(date_text)
+        if date_match:
+            capture_date = date_match.group(1)
+    return {
+        "name": bridge_name or "不明",
+        "capture_date": capture_date,
+        "location": location or "不明",
+        # 相対URLを絶対URLに変換
+        "image_urls": [urljoin(url, src) for src in srcs if _is_camera_image(src)],
+    }
+
+
+def _parse_with_selectolax(content: bytes, url: str) -> dict[str, Any]:
+    # バイト列のままC側でデコードさせる（metaタグのcharsetを使う）
+    try:
+        tree = _SelectolaxParser(content, encoding=True)
+    except TypeError:  # pragma: no cover
+        # encoding引数のない古いselectolaxはバイト列をUTF-8として扱うため、先にデコードする
+        tree = _SelectolaxParser(content.decode(PAGE_ENCODING, errors="replace"))
+
+    def first_text(selector: str) -> str | None:
+        node = tree.css_first(selector)
+        return node.text(deep=True).strip() if node is not None else None
+
+    return _build_page_info(
+        url,
+        first_text("td.style1"),
+        first_text("td.style2"),
+        first_text("div.style3"),
+        [node.attributes.get("src") or "" for node in tree.css("img")],
+    )
+
+
+def _parse_with_lxml(content: bytes, url: str) -> dict[str, Any]:
+    # libxml2にShift-JISのバイト列を直接デコードさせる
+    parser = _lxml_html.HTMLParser(encoding=PAGE_ENCODING)
+    tree = _lxml_html.document_fromstring(content, parser=parser)
+
+    def first_text(tag: str, class_name: str) -> str | None:
+        nodes = tree.xpath(_class_xpath(tag, class_name))
+        return nodes[0].text_content().strip() if nodes else None
+
+    return _build_page_info(
+        url,
+        first_text("td", "style1"),
+        first_text("td", "style2"),
+        first_text("div", "style3"),
+        [str(src) for src in tree.xpath("//img/@src")],
+    )
+
+
+def _parse_with_bs4(content: bytes, url: str) -> dict[str, Any]:
+    # 必要な要素(td/div/img)だけをツリーに入れる
+    soup = BeautifulSoup(
+        content, "html.parser", parse_only=_STRAINER, from_encoding=PAGE_ENCODING
+    )
+
+    def first_text(tag: str, class_name: str) -> str | None:
+        node = soup.find(tag, class_=class_name)
+        return node.text.strip() if node else None
+
+    return _build_page_info(
+        url,
+        first_text("td", "style1"),
+        first_text("td", "style2"),
+        first_text("div", "style3"),
+        [img.get("src") or "" for img in soup.find_all("img")],
+    )
+
+
+PARSERS: dict[str, Callable[[bytes, str], dict[str, Any]]] = {"bs4": _parse_with_bs4}
+if _lxml_html is not None:
+    PARSERS["lxml"] = _parse_with_lxml
+if _SelectolaxParser is not None:
+    PARSERS["selectolax"] = _parse_with_selectolax
+
+
+def resolve_engine(engine: str = "auto") -> str:
+    """利用するパーサー名を決める（autoの場合は selectolax > lxml > bs4 の順）"""
+    if engine == "auto":
+        for name in ("selectolax", "lxml", "bs4"):
+            if name in PARSERS:
+                return name
+    if engine not in PARSERS:
+        raise ValueError(
+            f"パーサー '{engine}' は利用できません（利用可能: {', '.join(PARSERS)}）"
+        )
+    return engine
+
+
+def parse_bridge_page(content: bytes, url: str, engine: str = "auto") -> dict[str, Any]:
+    """
+    カメラページのHTML（Shift-JISのバイト列）から必要な情報だけを取り出す関数
+
+    **戻り値**:
+    - name: 橋の名前（td.style1）
+    - capture_date: 撮影日時（td.style2）
+    - location: 位置情報（div.style3）
+    - image_urls: カメラ画像の絶対URLのリスト
+    """
+    return PARSERS[resolve_engine(engine)](content, url)
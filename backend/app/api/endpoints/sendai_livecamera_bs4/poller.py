@@ -0,0 +1,382 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.imagehash import compute_hashes, hamming_distance
+
+from .archive import ImageArchive
+from .scraper import scrape_bridge_data
+
+logger = logging.getLogger(__name__)
+
+# カメラIDはファイル名（{id}.json / {id}.img）に使うため、この形式に限る
+CAMERA_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+_CAMERA_ID_RE = re.compile(CAMERA_ID_PATTERN)
+
+# 取得間隔の下限（秒）。0や負の値で上流に連続してリクエストしないようにする
+MIN_INTERVAL_SECONDS = 10
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """他のワーカーが途中の状態を読まないよう、一時ファイルからリネームして書き込む"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class Camera:
+    """ポーリング対象のカメラページ"""
+
+    id: str
+    url: str
+    interval_seconds: float
+
+
+@dataclass
+class CameraSnapshot:
+    """カメラの最新の取得結果"""
+
+    camera_id: str
+    bridge_info: dict[str, Any]
+    images: list[dict[str, Any]]
+    updated_at: float
+    image: bytes | None = field(default=None, repr=False)
+    content_type: str = "image/jpeg"
+
+
+class CameraRegistry:
+    """
+    ポーリング対象のカメラ一覧（JSONファイルに保存し、全ワーカーで共有する）
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock_path = path.with_name(f"{path.name}.lock")
+        self._cameras: dict[str, Camera] = {}
+        self._mtime_ns = -1
+
+    def load(self) -> dict[str, Camera]:
+        """ファイルが更新されていれば読み直してカメラ一覧を返す"""
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._cameras, self._mtime_ns = {}, -1
+            return self._cameras
+        if mtime_ns != self._mtime_ns:
+            data = json.loads(self.path.read_bytes())
+            self._cameras = {item["id"]: Camera(**item) for item in data}
+            self._mtime_ns = mtime_ns
+        return self._cameras
+
+    def _update(self, cameras: dict[str, Camera]) -> None:
+        data = json.dumps(
+            [asdict(camera) for camera in cameras.values()], ensure_ascii=False
+        )
+        _write_atomic(self.path, data.encode("utf-8"))
+
+    def register(
+        self, url: str, interval_seconds: float, camera_id: str | None = None
+    ) -> Camera:
+        if camera_id is not None and not _CAMERA_ID_RE.fullmatch(camera_id):
+            raise ValueError(f"不正なカメラIDです: {camera_id}")
+        if not interval_seconds >= MIN_INTERVAL_SECONDS:
+            raise ValueError(
+                f"取得間隔は{MIN_INTERVAL_SECONDS}秒以上にしてください: {interval_seconds}"
+            )
+        camera = Camera(
+            id=camera_id or hashlib.sha1(url.encode("utf-8")).hexdigest()[:12],
+            url=url,
+            interval_seconds=interval_seconds,
+        )
+        # 同時に別ワーカーが更新しても取りこぼさないようにロックする
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            cameras = dict(self.load())
+            cameras[camera.id] = camera
+            self._update(cameras)
+        return camera
+
+    def unregister(self, camera_id: str) -> bool:
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            cameras = dict(self.load())
+            if camera_id not in cameras:
+                return False
+            del cameras[camera_id]
+            self._update(cameras)
+        return True
+
+
+class SnapshotStore:
+    """
+    カメラごとの最新スナップショット
+
+    読み出しは常にメモリから行う。ポーリングを担当するワーカーがディスクに書き出し、
+    他のワーカーはsync_from_disk()で定期的にメモリへ取り込む。
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._snapshots: dict[str, CameraSnapshot] = {}
+        self._mtime_ns: dict[str, int] = {}
+
+    def get(self, camera_id: str) -> CameraSnapshot | None:
+        return self._snapshots.get(camera_id)
+
+    def save(self, snapshot: CameraSnapshot) -> None:
+        if snapshot.image is not None:
+            _write_atomic(self.directory / f"{snapshot.camera_id}.img", snapshot.image)
+        meta = asdict(snapshot)
+        meta.pop("image")
+        meta["has_image"] = snapshot.image is not None
+        # JSONを最後に書くことで、JSONが見えた時点で画像も揃っているようにする
+        _write_atomic(
+            self.directory / f"{snapshot.camera_id}.json",
+            json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        )
+        self._snapshots[snapshot.camera_id] = snapshot
+
+    def delete(self, camera_id: str) -> None:
+        self._snapshots.pop(camera_id, None)
+        self._mtime_ns.pop(camera_id, None)
+        for suffix in (".json", ".img"):
+            (self.directory / f"{camera_id}{suffix}").unlink(missing_ok=True)
+
+    def sync_from_disk(self) -> None:
+        """ディスク上のスナップショットのうち、更新されたものだけをメモリに読み込む"""
+        seen = set()
+        for meta_path in self.directory.glob("*.json"):
+            camera_id = meta_path.stem
+            seen.add(camera_id)
+            try:
+                mtime_ns = meta_path.stat().st_mtime_ns
+                if self._mtime_ns.get(camera_id) == mtime_ns:
+                    continue
+                meta = json.loads(meta_path.read_bytes())
+                image = None
+                if meta.pop("has_image", False):
+                    image = (self.directory / f"{camera_id}.img").read_bytes()
+            except (OSError, ValueError):
+                # 書き込み中・削除済みの場合は次回に回す
+                continue
+            self._snapshots[camera_id] = CameraSnapshot(image=image, **meta)
+            self._mtime_ns[camera_id] = mtime_ns
+        for camera_id in set(self._snapshots) - seen:
+            self._snapshots.pop(camera_id, None)
+            self._mtime_ns.pop(camera_id, None)
+
+
+class CameraPoller:
+    """
+    登録されたカメラページを定期的にスクレイプし、最新のスナップショットを保持する
+
+    複数ワーカーで起動しても、ロックファイルを取得できた1ワーカーだけがポーリングする。
+    残りのワーカーはディスクのスナップショットを読み込むだけで、リーダーが落ちた場合は
+    ロックを取り直して引き継ぐ。
+    archiveを渡すと、取得した画像が前回と変わっていればアーカイブに追記する。
+    near_duplicate_distanceを指定すると、前回アーカイブした画像とのpHash距離がそれ以下の
+    画像（再エンコードや時刻表示の違いのみ）も追記しない。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        default_interval_seconds: float = 300,
+        jitter: float = 0.1,
+        sync_interval_seconds: float = 1.0,
+        archive: ImageArchive | None = None,
+        retention_interval_seconds: float = 3600,
+        near_duplicate_distance: int | None = None,
+    ) -> None:
+        self.directory = directory
+        self.default_interval_seconds = default_interval_seconds
+        self.jitter = jitter
+        self.sync_interval_seconds = sync_interval_seconds
+        self.archive = archive
+        self.retention_interval_seconds = retention_interval_seconds
+        self._next_retention = 0.0
+        self.near_duplicate_distance = near_duplicate_distance
+        self._archived_phash: dict[str, int] = {}
+        self.registry = CameraRegistry(directory / "cameras.json")
+        self.store = SnapshotStore(directory / "snapshots")
+        self._lock_file: Any | None = None
+        self._next_due: dict[str, float] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._stats: dict[str, Any] = {
+            "polls": 0,
+            "errors": 0,
+            "archived": 0,
+            "near_duplicates": 0,
+            "last_poll_at": None,
+        }
+
+    def setup(self) -> None:
+        """ディレクトリを作成する（読み込み時ではなく、起動時にlifespanから呼ぶ）"""
+        self.store.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def try_acquire_leadership(self) -> bool:
+        """ロックファイルを取得できればこのワーカーがポーリングを担当する"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.directory / "poller.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"カメラのポーリングを開始します (pid={os.getpid()})")
+        return True
+
+    def release_leadership(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _schedule(self, camera: Camera, now: float) -> None:
+        # 全カメラが同時に取得しに行かないよう、間隔にゆらぎを加える
+        # 手で編集されたcameras.jsonの値も下限で抑える
+        interval = max(camera.interval_seconds, MIN_INTERVAL_SECONDS)
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self._next_due[camera.id] = now + interval
+
+    async def poll_camera(self, camera: Camera) -> CameraSnapshot | None:
+        """1台のカメラをスクレイプしてスナップショットを保存する"""
+        self._stats["polls"] += 1
+        self._stats["last_poll_at"] = time.time()
+        # スナップショットに使うのは最初の画像だけなので、1枚取得できたら残りはダウンロードしない
+        result = await run_in_threadpool(scrape_bridge_data, camera.url, True, 1)
+        if not result["success"]:
+            self._stats["errors"] += 1
+            logger.warning(
+                f"カメラの取得に失敗しました: {camera.url}, エラー: {result['error']}"
+            )
+            return None
+
+        images = [
+            {k: v for k, v in image.items() if k != "content"}
+            for image in result["images"]
+        ]
+        first = result["images"][0]
+        snapshot = CameraSnapshot(
+            camera_id=camera.id,
+            bridge_info=result["bridge_info"],
+            images=images,
+            updated_at=time.time(),
+            image=first.get("content"),
+            content_type=first.get("content_type", "image/jpeg"),
+        )
+        await run_in_threadpool(self.store.save, snapshot)
+        if self.archive is not None and snapshot.image is not None:
+            await run_in_threadpool(
+                self._archive,
+                self.archive,
+                camera.id,
+                snapshot.image,
+                snapshot.updated_at,
+            )
+        return snapshot
+
+    def _archive(
+        self, archive: ImageArchive, camera_id: str, image: bytes, timestamp: float
+    ) -> None:
+        if self.near_duplicate_distance is not None:
+            hashes = compute_hashes(image)
+            if hashes is not None:
+                previous = self._archived_phash.get(camera_id)
+                if (
+                    previous is not None
+                    and hamming_distance(previous, hashes.phash)
+                    <= self.near_duplicate_distance
+                ):
+                    self._stats["near_duplicates"] += 1
+                    return
+                self._archived_phash[camera_id] = hashes.phash
+        if archive.append(camera_id, image, timestamp) is not None:
+            self._stats["archived"] += 1
+
+    async def poll_due(self) -> None:
+        """期限が来たカメラをまとめてポーリングする（リーダーのみ）"""
+        now = time.monotonic()
+        cameras = self.registry.load()
+        for camera_id in set(self._next_due) - set(cameras):
+            # 登録解除されたカメラ
+            del self._next_due[camera_id]
+            self.store.delete(camera_id)
+
+        due = []
+        for camera in cameras.values():
+            if camera.id not in self._next_due or self._next_due[camera.id] <= now:
+                self._schedule(camera, now)
+                due.append(camera)
+        results = await asyncio.gather(
+            *(self.poll_camera(camera) for camera in due), return_exceptions=True
+        )
+        for camera, result in zip(due, results, strict=True):
+            if isinstance(result, Exception):
+                self._stats["errors"] += 1
+                logger.error(
+                    f"カメラのポーリング中にエラー: {camera.url}, エラー: {result}"
+                )
+
+        if self.archive is not None and now >= self._next_retention:
+            self._next_retention = now + self.retention_interval_seconds
+            removed = await run_in_threadpool(self.archive.apply_retention)
+            if removed:
+                logger.info(f"アーカイブから{removed}日分のファイルを削除しました")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.try_acquire_leadership():
+                    await self.poll_due()
+                else:
+                    await run_in_threadpool(self.store.sync_from_disk)
+            except Exception as e:
+                logger.error(f"カメラのポーリング中にエラー: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.sync_interval_seconds)
+
+    async def start(self, seed_urls: Sequence[str] = ()) -> None:
+        # 設定で指定されたカメラを登録（未登録のもののみ）
+        for url in seed_urls:
+            camera_id = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+            if camera_id not in self.registry.load():
+                self.registry.register(url, self.default_interval_seconds, camera_id)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.release_leadership()
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "cameras": len(self.registry.load()),
+            **self._stats,
+        }
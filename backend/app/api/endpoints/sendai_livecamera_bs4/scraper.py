@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Any
+
+import requests
+
+from app.core.config import settings
+
+from .governor import governor
+from .imageprobe import download_image, probe_image
+from .parser import parse_bridge_page
+
+
+def build_bridge_result(
+    content: bytes,
+    url: str,
+    download_images: bool = False,
+    max_images: int | None = None,
+) -> dict[str, Any]:
+    """
+    取得済みのHTML（バイト列）から橋の情報と画像情報を組み立てる関数
+
+    - **max_images**: 指定した場合、その枚数の画像を取得できた時点で残りの画像は取得しない
+    """
+    # 必要な要素だけをパース
+    page = parse_bridge_page(content, url, engine=settings.LIVECAMERA_HTML_PARSER)
+
+    image_data: list[dict[str, Any]] = []
+    for img_url in page["image_urls"]:
+        if max_images is not None and len(image_data) >= max_images:
+            break
+        # 画像情報を取得（既定ではHEAD/Range GETでメタデータのみ）
+        try:
+            if download_images:
+                image_data.append(download_image(img_url))
+            else:
+                image_data.append(probe_image(img_url))
+        except Exception as e:
+            print(f"画像の取得中にエラーが発生しました: {img_url}, エラー: {e}")
+
+    # 画像がない場合
+    if not image_data:
+        return {
+            "success": False,
+            "error": "画像が見つかりませんでした",
+            "message": "URLを確認してください",
+        }
+
+    # 結果をまとめる
+    return {
+        "success": True,
+        "bridge_info": {
+            "name": page["name"],
+            "capture_date": page["capture_date"],
+            "location": page["location"],
+            "source_url": url,
+            "scrape_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "images": image_data,
+    }
+
+
+def scrape_bridge_data(
+    url: str, download_images: bool = False, max_images: int | None = None
+) -> dict[str, Any]:
+    """
+    指定されたURLから橋の情報と画像をスクレイプする関数
+
+    - **download_images**: Trueの場合のみ画像本体をダウンロードし、各画像に "content" (bytes) を含める。
+      Falseの場合はHEAD/Range GETでメタデータ（サイズ・ETag・寸法など）だけを取得する
+    - **max_images**: 取得する画像の最大枚数（省略時はページ内のすべて）
+    """
+    try:
+        # ページのHTMLを取得
+        with governor.request(url):
+            response = requests.get(
+                url, timeout=settings.LIVECAMERA_SCRAPE_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+        return build_bridge_result(response.content, url, download_images, max_images)
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "スクレイピング中にエラーが発生しました",
+        }
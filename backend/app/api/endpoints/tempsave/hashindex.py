@@ -0,0 +1,195 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+from app.core.imagehash import HammingIndex, ImageHashes, compute_hashes
+
+logger = logging.getLogger(__name__)
+
+HASH_KINDS = ("phash", "dhash")
+
+# ログの行数がこれ以上で、かつ登録件数のCOMPACT_RATIO倍を超えたら書き直す
+COMPACT_MIN_LINES = 1000
+COMPACT_RATIO = 2
+
+
+def _add_line(filename: str, hashes: ImageHashes) -> str:
+    return json.dumps({"op": "+", "name": filename, **hashes.to_dict()})
+
+
+def _remove_line(filename: str) -> str:
+    return json.dumps({"op": "-", "name": filename})
+
+
+class StoredImageIndex:
+    """
+    保存済み画像の知覚ハッシュ（dHash / pHash）の索引
+
+    追加・削除は追記専用のログファイルに1行ずつ書き、各ワーカーは
+    sync()でログの未読部分だけを取り込む。これにより、どのワーカーで
+    アップロードされた画像も全ワーカーの検索対象になる。
+
+    ログの形式（1行1件のJSON。ファイル名にタブや改行が含まれていてもよい）:
+        {"op": "+", "name": <ファイル名>, "dhash": <16進>, "phash": <16進>}   追加（同名は上書き）
+        {"op": "-", "name": <ファイル名>}                                     削除
+    以前の形式（+<ファイル名>\\t<dhash>\\t<phash> / -<ファイル名>）の行も読める。
+
+    削除・上書きで行数が登録件数より十分多くなったら、現在の登録内容だけのログを
+    一時ファイルに書いてリネームで置き換える。追記は共有ロック、書き直しは排他ロックの
+    もとで行うので、書き直しの間の追記は失われない。他のワーカーはファイルが
+    置き換わったこと（inodeの変化）を見て、索引を最初から読み直す。
+    読んでいるログは開いたままにしておくので、置き換えの前後でinodeが再利用されることはない。
+    """
+
+    def __init__(self, log_path: Path, files_dir: Path) -> None:
+        self.log_path = log_path
+        self.files_dir = files_dir
+        self._lock_path = log_path.with_name(f"{log_path.name}.lock")
+        self.indexes: dict[str, HammingIndex] = {
+            kind: HammingIndex() for kind in HASH_KINDS
+        }
+        self._log: BinaryIO | None = None
+        self._offset = 0
+        self._inode: int | None = None
+        # 現在のログファイルから取り込んだ行数
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _log_lock(self, operation: int) -> Iterator[None]:
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    def _append(self, line: str) -> None:
+        # O_APPENDの1回のwriteなので、複数ワーカーから書いても行が混ざらない
+        with self._log_lock(fcntl.LOCK_SH):
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (line + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+
+    def _backfill(self) -> None:
+        """ログがまだない場合、既存のファイルをハッシュしてログを作る"""
+        count = 0
+        for file_path in sorted(self.files_dir.iterdir()):
+            if not file_path.is_file():
+                continue
+            hashes = compute_hashes(file_path.read_bytes())
+            if hashes is not None:
+                self._append(_add_line(file_path.name, hashes))
+                count += 1
+        logger.info(f"既存の画像{count}件のハッシュを作成しました")
+
+    def sync(self) -> None:
+        """ログの未読部分を索引に取り込む"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        # self._lock を保持した状態で呼ぶこと
+        if self._offset == 0 and not self.log_path.exists():
+            self._backfill()
+        try:
+            if self._log is None or os.stat(self.log_path).st_ino != self._inode:
+                # 書き直されたログは最初から読み直す
+                self._open_log()
+                self.indexes = {kind: HammingIndex() for kind in HASH_KINDS}
+                self._offset = 0
+                self._lines = 0
+        except FileNotFoundError:
+            return
+        assert self._log is not None
+        self._log.seek(self._offset)
+        data = self._log.read()
+        # 書きかけの最終行は次回に回す
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].split(b"\n")[:-1]:
+            self._apply(line.decode("utf-8"))
+            self._lines += 1
+
+    def _open_log(self) -> None:
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, "rb")
+        self._inode = os.fstat(self._log.fileno()).st_ino
+
+    def _apply(self, line: str) -> None:
+        if line.startswith("{"):
+            entry = json.loads(line)
+            op, filename = entry["op"], entry["name"]
+            if op == "+":
+                self.indexes["dhash"].add(filename, int(entry["dhash"], 16))
+                self.indexes["phash"].add(filename, int(entry["phash"], 16))
+            elif op == "-":
+                for index in self.indexes.values():
+                    index.remove(filename)
+        elif line.startswith("+"):
+            filename, dhash, phash = line[1:].split("\t")
+            self.indexes["dhash"].add(filename, int(dhash, 16))
+            self.indexes["phash"].add(filename, int(phash, 16))
+        elif line.startswith("-"):
+            for index in self.indexes.values():
+                index.remove(line[1:])
+
+    def _needs_compaction(self) -> bool:
+        live = len(self.indexes["phash"])
+        return self._lines >= COMPACT_MIN_LINES and self._lines > COMPACT_RATIO * live
+
+    def compact(self) -> None:
+        """現在の登録内容だけのログに書き直す"""
+        with self._log_lock(fcntl.LOCK_EX), self._lock:
+            if not self.log_path.exists():
+                return
+            # 排他ロック中は追記されないので、ここで読んだ内容がログのすべて
+            self._sync()
+            phashes = dict(self.indexes["phash"].items())
+            lines = [
+                _add_line(filename, ImageHashes(dhash=dhash, phash=phashes[filename]))
+                for filename, dhash in self.indexes["dhash"].items()
+            ]
+            data = "".join(line + "\n" for line in lines).encode("utf-8")
+            tmp_path = self.log_path.with_name(
+                f"{self.log_path.name}.{os.getpid()}.tmp"
+            )
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self.log_path)
+            self._open_log()
+            self._offset = len(data)
+            self._lines = len(lines)
+        logger.info(f"ハッシュのログを{len(lines)}件に書き直しました")
+
+    def _write(self, line: str) -> None:
+        self._append(line)
+        self.sync()
+        if self._needs_compaction():
+            self.compact()
+
+    def add(self, filename: str, hashes: ImageHashes) -> None:
+        self._write(_add_line(filename, hashes))
+
+    def remove(self, filename: str) -> None:
+        self._write(_remove_line(filename))
+
+    def get(self, filename: str) -> ImageHashes | None:
+        self.sync()
+        dhash = self.indexes["dhash"].get(filename)
+        phash = self.indexes["phash"].get(filename)
+        if dhash is None or phash is None:
+            return None
+        return ImageHashes(dhash=dhash, phash=phash)
+
+    def find(
+        self, hashes: ImageHashes, distance: int, kind: str = "phash"
+    ) -> list[tuple[str, int]]:
+        """距離distance以内の画像を (ファイル名, 距離) の近い順で返す"""
+        self.sync()
+        return self.indexes[kind].query(getattr(hashes, kind), distance)
@@ -1,13 +1,18 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request, BackgroundTasks, Depends
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 import os
 import mimetypes
+import uuid
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import List, Literal
 import logging
 
-from app.api.deps import get_api_key
+from app.api.deps import require_api_key_scope
+from app.core.api_keys import ApiKeyRecord, api_key_store
+from app.core.imagehash import compute_hashes
+from .hashindex import StoredImageIndex
 
 
 # ロガーの設定
@@ -16,6 +21,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# APIキーのscopesに"tempsave"（または"*"）が必要
+require_api_key = require_api_key_scope("tempsave")
+
 # 一時ファイルを保存するディレクトリ
 TEMP_DIR = Path("./temp_uploads")
 # ディレクトリが存在しない場合は作成
@@ -24,16 +32,37 @@ TEMP_DIR.mkdir(exist_ok=True)
 # 最大ファイルサイズ（5MB）
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB in bytes
 
+# 受信中のファイルを置くディレクトリ（保存先と同じファイルシステムに置き、完了後にリネームする）
+UPLOAD_TMP_DIR = TEMP_DIR / ".partial"
+
+# 画像の知覚ハッシュの索引（ログはTEMP_DIRの隣に置き、ファイル一覧に出ないようにする）
+HASH_LOG_PATH = TEMP_DIR.parent / f"{TEMP_DIR.name}_hashes.log"
+image_index = StoredImageIndex(HASH_LOG_PATH, TEMP_DIR)
+
+# これ以下のpHash距離の画像を「ほぼ同じ画像」とみなす（64ビット中）
+NEAR_DUPLICATE_DISTANCE = 6
+MAX_SEARCH_DISTANCE = 16
+
 # MIMEタイプ初期化
 mimetypes.init()
 
 @router.post("/upload", response_model=dict, name="upload_file")
-async def upload_file(file: UploadFile = File(...), request: Request = None, api_key: str = Depends(get_api_key)):
+async def upload_file(
+    file: UploadFile = File(...),
+    request: Request = None,
+    dedupe: Literal["off", "reject", "alias"] = "off",
+    api_key: ApiKeyRecord = Depends(require_api_key),
+):
     """
     ファイルをアップロードし、サーバー側の一時領域に保存するエンドポイント
     
     - **file**: アップロードするファイル（必須）
     - **最大サイズ**: 5MB
+    - **dedupe**: 既存の画像とほぼ同じ画像（再エンコードや時刻表示の違いのみ）の扱い
+        - off: そのまま保存（デフォルト）
+        - reject: 保存せずに409を返す
+        - alias: 既存ファイルへのハードリンクとして保存し、容量を使わない
+          （保存は常に一時ファイルのリネームで行うので、リンク先の内容が上書きされることはない）
     
     **戻り値**:
     - filename: アップロードされたファイル名
@@ -41,6 +70,8 @@ async def upload_file(file: UploadFile = File(...), request: Request = None, api
     - file_size: ファイルサイズ（バイト）
     - content_type: ファイルのMIMEタイプ
     - file_url: ファイルへの直接アクセスURL
+    - hashes: 画像の場合はdHash / pHash（16進数）
+    - alias_of: aliasで保存した場合の既存ファイル名
     """
     try:
         # ファイルが空でないか確認
@@ -57,23 +88,56 @@ async def upload_file(file: UploadFile = File(...), request: Request = None, api
         # 保存先ファイルパスを設定
         file_path = TEMP_DIR / file.filename
         
-        # ファイルを保存（チャンクで読み込みながらサイズチェック）
-        file_size = 0
-        with open(file_path, "wb") as buffer:
-            while chunk := await file.read(1024 * 1024):  # 1MBずつ読み込む
-                file_size += len(chunk)
-                
-                # サイズ制限チェック
-                if file_size > MAX_FILE_SIZE:
-                    buffer.close()
-                    # 不完全なファイルを削除
-                    os.remove(file_path)
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"ファイルサイズが大きすぎます。最大サイズは5MBです。"
-                    )
-                
-                buffer.write(chunk)
+        # 一時ファイルに受信し、重複の判定が済んでからリネームで保存先に置く
+        # （既存のファイルやそのハードリンクに直接書き込まない）
+        UPLOAD_TMP_DIR.mkdir(exist_ok=True)
+        tmp_path = UPLOAD_TMP_DIR / f"{uuid.uuid4().hex}.upload"
+        try:
+            # ファイルを保存（チャンクで読み込みながらサイズチェック）
+            file_size = 0
+            with open(tmp_path, "wb") as buffer:
+                while chunk := await file.read(1024 * 1024):  # 1MBずつ読み込む
+                    file_size += len(chunk)
+                    
+                    # サイズ制限チェック（不完全なファイルはfinallyで削除）
+                    if file_size > MAX_FILE_SIZE:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"ファイルサイズが大きすぎます。最大サイズは5MBです。"
+                        )
+                    
+                    buffer.write(chunk)
+            
+            # 画像であれば知覚ハッシュを計算し、ほぼ同じ画像を探す
+            hashes = await run_in_threadpool(compute_hashes, tmp_path.read_bytes())
+            alias_of = None
+            if hashes is not None and dedupe != "off":
+                candidates = await run_in_threadpool(image_index.find, hashes, NEAR_DUPLICATE_DISTANCE)
+                matches = [
+                    (name, distance)
+                    for name, distance in candidates
+                    if name != file.filename and (TEMP_DIR / name).is_file()
+                ]
+                if matches:
+                    alias_of = matches[0][0]
+                    if dedupe == "reject":
+                        # 一時ファイルを捨てるだけで、同名の既存ファイルには触れない
+                        raise HTTPException(
+                            status_code=409,
+                            detail=f"ほぼ同じ画像 '{alias_of}' が既に保存されています"
+                        )
+                    os.remove(tmp_path)
+                    os.link(TEMP_DIR / alias_of, tmp_path)
+                    file_size = tmp_path.stat().st_size
+            os.replace(tmp_path, file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        
+        if hashes is not None:
+            await run_in_threadpool(image_index.add, file.filename, hashes)
+        
+        # アップロード量をAPIキーの転送量に加算
+        api_key_store.add_bytes(api_key, file_size)
         
         # ファイルの情報を取得
         absolute_path = str(file_path.absolute())
@@ -89,7 +153,9 @@ async def upload_file(file: UploadFile = File(...), request: Request = None, api
             "file_size": file_size,
             "content_type": file.content_type or guess_content_type(file.filename),
             "saved_successfully": True,
-            "file_url": str(file_url)  # URLオブジェクトを文字列に変換
+            "file_url": str(file_url),  # URLオブジェクトを文字列に変換
+            "hashes": hashes.to_dict() if hashes else None,
+            "alias_of": alias_of
         }
             
     except HTTPException:
@@ -100,7 +166,7 @@ async def upload_file(file: UploadFile = File(...), request: Request = None, api
         raise HTTPException(status_code=500, detail=f"ファイル保存中にエラー: {str(e)}")
 
 @router.get("/files", response_model=List[dict], name="list_files")
-async def list_files(request: Request = None, api_key: str = Depends(get_api_key)):
+async def list_files(request: Request = None, api_key: ApiKeyRecord = Depends(require_api_key)):
     """
     一時領域に保存されているファイル一覧を取得するエンドポイント
     
@@ -142,7 +208,7 @@ async def list_files(request: Request = None, api_key: str = Depends(get_api_key
         raise HTTPException(status_code=500, detail=f"ファイル一覧取得中にエラー: {str(e)}")
 
 @router.get("/file-info/{filename}", response_model=dict, name="get_file_info")
-async def get_file_info(filename: str, request: Request = None, api_key: str = Depends(get_api_key)):
+async def get_file_info(filename: str, request: Request = None, api_key: ApiKeyRecord = Depends(require_api_key)):
     """
     指定したファイル名のファイル情報を取得するエンドポイント
     
@@ -272,6 +338,7 @@ async def delete_file(filename: str):
         
         # ファイルを削除
         os.remove(file_path)
+        await run_in_threadpool(image_index.remove, filename)
         
         logger.info(f"ファイル削除: {filename}")
         
@@ -286,8 +353,54 @@ async def delete_file(filename: str):
         logger.error(f"ファイル削除中にエラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"ファイル削除中にエラー: {str(e)}")
 
+@router.get("/near-duplicates/{filename}", response_model=dict, name="find_near_duplicates")
+async def find_near_duplicates(
+    filename: str,
+    distance: int = NEAR_DUPLICATE_DISTANCE,
+    kind: Literal["phash", "dhash"] = "phash",
+    api_key: ApiKeyRecord = Depends(require_api_key),
+):
+    """
+    指定した画像とほぼ同じ画像を探すエンドポイント
+    
+    - **filename**: 基準にする画像のファイル名
+    - **distance**: ハミング距離の上限（0〜16、64ビット中）
+    - **kind**: 比較に使うハッシュ（phash / dhash）
+    
+    **戻り値**:
+    - filename: 基準にした画像のファイル名
+    - matches: 距離の近い順の画像リスト（filename, distance）
+    """
+    if not 0 <= distance <= MAX_SEARCH_DISTANCE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"distanceは0〜{MAX_SEARCH_DISTANCE}の範囲で指定してください"
+        )
+    try:
+        hashes = await run_in_threadpool(image_index.get, filename)
+        if hashes is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"画像 '{filename}' のハッシュが見つかりません"
+            )
+        matches = await run_in_threadpool(image_index.find, hashes, distance, kind)
+        return {
+            "filename": filename,
+            "hashes": hashes.to_dict(),
+            "matches": [
+                {"filename": name, "distance": d}
+                for name, d in matches
+                if name != filename
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"類似画像の検索中にエラー: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"類似画像の検索中にエラー: {str(e)}")
+
 @router.post("/cleanup", response_model=dict, name="cleanup_files")
-async def cleanup_files(background_tasks: BackgroundTasks, api_key: str = Depends(get_api_key)):
+async def cleanup_files(background_tasks: BackgroundTasks, api_key: ApiKeyRecord = Depends(require_api_key)):
     """
     一時ファイル領域をクリーンアップするエンドポイント（古いファイルを削除）
     
@@ -321,6 +434,7 @@ async def perform_cleanup():
                 # 24時間以上経過したファイルを削除
                 if (now - modified_time).total_seconds() > 24 * 3600:
                     os.remove(file_path)
+                    await run_in_threadpool(image_index.remove, file_path.name)
                     file_count += 1
         
         logger.info(f"クリーンアップ完了: {file_count}個のファイルを削除しました")
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, private, users, utils
+from app.api.routes import api_keys, items, login, private, users, utils
 from app.core.config import settings
 from app.api.endpoints.main import api_router as endpoints_router
 
@@ -10,6 +10,7 @@ api_router.include_router(login.router)
 api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(items.router)
+api_router.include_router(api_keys.router)
 api_router.include_router(endpoints_router)
  
 if settings.ENVIRONMENT == "local":
@@ -0,0 +1,65 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor holds the sort key of the last row of a page, ending with its id.
+The next page is the rows after that key in the same ORDER BY, which an index
+on the sort columns finds directly, however deep the page is and whatever was
+inserted meanwhile.
+"""
+
+import base64
+import json
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import TextClause, text
+
+
+def encode_cursor(kind: str, key: Sequence[Any]) -> str:
+    payload = json.dumps([kind, *(str(value) for value in key)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, kind: str, parsers: Sequence[Callable[[str], Any]]
+) -> list[Any]:
+    """
+    Decode a cursor made by encode_cursor() with the same `kind`, parsing each
+    value of the key with the matching parser. Raises a 400 if it is invalid.
+    """
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        if (
+            not isinstance(payload, list)
+            or payload[:1] != [kind]
+            or len(payload) != len(parsers) + 1
+        ):
+            raise ValueError(payload)
+        return [parse(value) for parse, value in zip(parsers, payload[1:], strict=True)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def check_pagination(skip: int, cursor: str | None) -> None:
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor")
+
+
+def estimated_row_count_statement(table: str) -> TextClause:
+    """
+    The planner's estimate of the number of rows in `table`, kept current by
+    autovacuum. Pass its result to usable_estimate().
+    """
+    return text(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(quote_ident(:table))"
+    ).bindparams(table=table)
+
+
+def usable_estimate(estimate: int | None) -> int | None:
+    """The estimate, or None if the table was never analyzed."""
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
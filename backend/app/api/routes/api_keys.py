@@ -0,0 +1,93 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import col, func, select
+
+from app import crud
+from app.api.deps import SessionDep, get_current_active_superuser
+from app.core.api_keys import api_key_store
+from app.models import (
+    ApiKey,
+    ApiKeyCreate,
+    ApiKeyCreated,
+    ApiKeyPublic,
+    ApiKeysPublic,
+    ApiKeyUpdate,
+    Message,
+)
+
+router = APIRouter(
+    prefix="/api-keys",
+    tags=["api-keys"],
+    dependencies=[Depends(get_current_active_superuser)],
+)
+
+
+@router.get("/", response_model=ApiKeysPublic)
+def read_api_keys(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+    """
+    Retrieve API keys.
+    """
+    count_statement = select(func.count()).select_from(ApiKey)
+    count = session.exec(count_statement).one()
+    statement = (
+        select(ApiKey).order_by(col(ApiKey.created_at).desc()).offset(skip).limit(limit)
+    )
+    api_keys = session.exec(statement).all()
+    data = [ApiKeyPublic.model_validate(api_key) for api_key in api_keys]
+    return ApiKeysPublic(data=data, count=count)
+
+
+@router.post("/", response_model=ApiKeyCreated)
+def create_api_key(*, session: SessionDep, api_key_in: ApiKeyCreate) -> Any:
+    """
+    Create new API key. The key is only returned in this response.
+    """
+    api_key, key = crud.create_api_key(session=session, api_key_in=api_key_in)
+    # Other workers pick it up on their next refresh
+    api_key_store.refresh(session)
+    return ApiKeyCreated.model_validate(api_key, update={"key": key})
+
+
+@router.get("/{id}", response_model=ApiKeyPublic)
+def read_api_key(session: SessionDep, id: uuid.UUID) -> Any:
+    """
+    Get API key by ID.
+    """
+    api_key = session.get(ApiKey, id)
+    if not api_key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    return api_key
+
+
+@router.patch("/{id}", response_model=ApiKeyPublic)
+def update_api_key(
+    *, session: SessionDep, id: uuid.UUID, api_key_in: ApiKeyUpdate
+) -> Any:
+    """
+    Update an API key's label, scopes or quotas.
+    """
+    api_key = session.get(ApiKey, id)
+    if not api_key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    api_key = crud.update_api_key(
+        session=session, db_api_key=api_key, api_key_in=api_key_in
+    )
+    api_key_store.refresh(session)
+    return api_key
+
+
+@router.delete("/{id}")
+def revoke_api_key(session: SessionDep, id: uuid.UUID) -> Message:
+    """
+    Revoke an API key. The row is kept so its usage stays visible.
+    """
+    api_key = session.get(ApiKey, id)
+    if not api_key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    crud.update_api_key(
+        session=session, db_api_key=api_key, api_key_in=ApiKeyUpdate(is_active=False)
+    )
+    api_key_store.refresh(session)
+    return Message(message="API key revoked successfully")
@@ -1,52 +1,132 @@
 import uuid
-from typing import Any
+from typing import Any, NoReturn
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import BigInteger, ClauseElement, cast
+from sqlmodel import col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app import crud
+from app.api import bulk
+from app.api.deps import AsyncSessionDep, CurrentPrincipal
+from app.api.pagination import (
+    check_pagination,
+    decode_cursor,
+    encode_cursor,
+    estimated_row_count_statement,
+    usable_estimate,
+)
+from app.core.config import settings
+from app.core.pipeline import run_pipelined
+from app.models import (
+    BulkRowError,
+    CountStrategy,
+    Item,
+    ItemBulkDelete,
+    ItemBulkUpdate,
+    ItemCount,
+    ItemCreate,
+    ItemPublic,
+    ItemsBulkPublic,
+    ItemsPublic,
+    ItemUpdate,
+    Message,
+)
 
 router = APIRouter(prefix="/items", tags=["items"])
 
 
+def count_items_statement(
+    owner_id: uuid.UUID | None, strategy: CountStrategy
+) -> tuple[ClauseElement | None, CountStrategy]:
+    """
+    Statement counting the items of `owner_id`, or all items if None, and the
+    strategy it uses, which differs from `strategy` when that one doesn't
+    apply.
+    """
+    if strategy == "none":
+        return None, "none"
+    if strategy == "estimate" and owner_id is None:
+        return estimated_row_count_statement("item"), "estimate"
+    if strategy in ("counter", "estimate"):
+        # A single owner's counter is as cheap as an estimate, and exact.
+        # sum() of a bigint is a numeric.
+        counter_statement = select(
+            cast(func.coalesce(func.sum(ItemCount.count), 0), BigInteger)
+        )
+        if owner_id is not None:
+            counter_statement = counter_statement.where(ItemCount.owner_id == owner_id)
+        return counter_statement, "counter"
+    count_statement = select(func.count()).select_from(Item)
+    if owner_id is not None:
+        count_statement = count_statement.where(Item.owner_id == owner_id)
+    return count_statement, "exact"
+
+
 @router.get("/", response_model=ItemsPublic)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: CurrentPrincipal,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_strategy: CountStrategy = "exact",
 ) -> Any:
     """
-    Retrieve items.
+    Retrieve items, ordered by id.
+
+    For the next page pass the `next_cursor` of this one as `cursor`; unlike
+    `skip`, its cost doesn't grow with the page number and concurrent inserts
+    don't shift the pages.
+
+    `count_strategy` picks how `count` is computed; large listings should
+    prefer "counter" or, for superusers, "estimate". The response's
+    `count_strategy` says which one was used.
     """
+    check_pagination(skip, cursor)
+    owner_id = None if current_user.is_superuser else current_user.id
+    conditions = []
+    if owner_id is not None:
+        conditions.append(Item.owner_id == owner_id)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, "item", (uuid.UUID,))
+        conditions.append(col(Item.id) > last_id)
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
+    page_statement = (
+        select(Item).where(*conditions).order_by(col(Item.id)).offset(skip).limit(limit)
+    )
+    count_statement, count_strategy = count_items_statement(owner_id, count_strategy)
+    statements: list[ClauseElement] = [page_statement]
+    if count_statement is not None:
+        statements.append(count_statement)
+    # The page and its count are independent: one round trip for both
+    page, *counted = await run_pipelined(session, statements)
+    items = page.models(ItemPublic)
+    count = counted[0].scalar() if counted else None
+    if count_strategy == "estimate":
+        count = usable_estimate(count)
+        if count is None:
+            count_statement, count_strategy = count_items_statement(owner_id, "counter")
+            assert count_statement is not None
+            (counted_result,) = await run_pipelined(session, [count_statement])
+            count = counted_result.scalar()
 
-    return ItemsPublic(data=items, count=count)
+    next_cursor = None
+    if items and len(items) == limit:
+        next_cursor = encode_cursor("item", (items[-1].id,))
+    return ItemsPublic(
+        data=items, count=count, count_strategy=count_strategy, next_cursor=next_cursor
+    )
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_item(
+    session: AsyncSessionDep, current_user: CurrentPrincipal, id: uuid.UUID
+) -> Any:
     """
     Get item by ID.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
@@ -55,55 +135,245 @@ def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) ->
 
 
 @router.post("/", response_model=ItemPublic)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: AsyncSessionDep, current_user: CurrentPrincipal, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
-    return item
+    return await crud.create_item_async(
+        session=session, item_in=item_in, owner_id=current_user.id
+    )
+
+
+async def raise_not_writable(session: AsyncSession, id: uuid.UUID) -> NoReturn:
+    """
+    After a write restricted to the user's items matched nothing: a 404 if the
+    item doesn't exist, otherwise it belongs to someone else. Only failed
+    writes pay for this lookup.
+    """
+    exists = (await session.exec(select(Item.id).where(Item.id == id))).first()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    raise HTTPException(status_code=400, detail="Not enough permissions")
+
+
+async def not_written_errors(
+    session: AsyncSession,
+    rows: list[tuple[int, uuid.UUID]],
+    written: list[Item],
+    owner_id: uuid.UUID | None,
+) -> list[BulkRowError]:
+    """
+    Errors for the rows of a bulk update or delete whose item was not
+    written, saying whether it doesn't exist or belongs to someone else.
+    """
+    written_ids = {item.id for item in written}
+    missing = [(index, id) for index, id in rows if id not in written_ids]
+    if not missing:
+        return []
+    existing: set[uuid.UUID] = set()
+    if owner_id is not None:
+        existing_statement = select(Item.id).where(
+            col(Item.id).in_([id for _, id in missing])
+        )
+        existing = set((await session.exec(existing_statement)).all())
+    return [
+        BulkRowError(
+            index=index,
+            id=id,
+            detail="Not enough permissions" if id in existing else "Item not found",
+        )
+        for index, id in missing
+    ]
+
+
+def without_duplicates(
+    batch: list[tuple[int, ItemBulkUpdate]] | list[tuple[int, ItemBulkDelete]],
+    first_index: dict[uuid.UUID, int],
+) -> tuple[list[tuple[int, uuid.UUID]], list[BulkRowError]]:
+    """
+    The (index, id) of the rows of the batch, leaving out and reporting the
+    ones whose id was already in an earlier row. `first_index` is shared by
+    the batches of a request.
+    """
+    rows = []
+    errors = []
+    for index, row in batch:
+        if first_index.setdefault(row.id, index) != index:
+            errors.append(
+                BulkRowError(index=index, id=row.id, detail="Duplicate item id")
+            )
+        else:
+            rows.append((index, row.id))
+    return rows, errors
+
+
+# The /bulk routes come before the /{id} ones, which would match "bulk" too
+
+
+@router.post(
+    "/bulk",
+    response_model=ItemsBulkPublic,
+    openapi_extra=bulk.request_body(ItemCreate),
+)
+async def create_items(
+    request: Request, session: AsyncSessionDep, current_user: CurrentPrincipal
+) -> Any:
+    """
+    Create items from a JSON array of items, or from NDJSON (one item per
+    line) with Content-Type application/x-ndjson.
+
+    Items are validated and written in batches, one transaction each. An item
+    that is invalid or can't be written is reported in `errors` with its
+    index, and the others are still created.
+    """
+
+    async def write(
+        batch: list[tuple[int, ItemCreate]],
+    ) -> tuple[list[Item], list[BulkRowError]]:
+        items = await crud.create_items_async(
+            session=session,
+            items_in=[item_in for _, item_in in batch],
+            owner_id=current_user.id,
+            use_copy=len(batch) >= settings.ITEM_BULK_COPY_MIN_ROWS,
+        )
+        return items, []
+
+    items, errors = await bulk.apply(
+        request,
+        session,
+        ItemCreate,
+        write,
+        batch_size=settings.ITEM_BULK_BATCH_SIZE,
+        max_rows=settings.ITEM_BULK_MAX_ROWS,
+    )
+    data = [ItemPublic.model_validate(item) for item in items]
+    return ItemsBulkPublic(data=data, errors=errors)
+
+
+@router.patch(
+    "/bulk",
+    response_model=ItemsBulkPublic,
+    openapi_extra=bulk.request_body(ItemBulkUpdate),
+)
+async def update_items(
+    request: Request, session: AsyncSessionDep, current_user: CurrentPrincipal
+) -> Any:
+    """
+    Update items from a JSON array, or NDJSON, of the item `id` and the
+    fields to change.
+
+    Written in batches like POST /items/bulk. Items that don't exist, that
+    belong to another user (unless a superuser) or that appear twice are
+    reported in `errors`.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    first_index: dict[uuid.UUID, int] = {}
+
+    async def write(
+        batch: list[tuple[int, ItemBulkUpdate]],
+    ) -> tuple[list[Item], list[BulkRowError]]:
+        rows, errors = without_duplicates(batch, first_index)
+        unique = {index for index, _ in rows}
+        items = await crud.update_items_async(
+            session=session,
+            items_in=[item_in for index, item_in in batch if index in unique],
+            owner_id=owner_id,
+        )
+        errors += await not_written_errors(session, rows, items, owner_id)
+        return items, errors
+
+    items, errors = await bulk.apply(
+        request,
+        session,
+        ItemBulkUpdate,
+        write,
+        batch_size=settings.ITEM_BULK_BATCH_SIZE,
+        max_rows=settings.ITEM_BULK_MAX_ROWS,
+    )
+    data = [ItemPublic.model_validate(item) for item in items]
+    return ItemsBulkPublic(data=data, errors=errors)
+
+
+@router.delete(
+    "/bulk",
+    response_model=ItemsBulkPublic,
+    openapi_extra=bulk.request_body(ItemBulkDelete),
+)
+async def delete_items(
+    request: Request, session: AsyncSessionDep, current_user: CurrentPrincipal
+) -> Any:
+    """
+    Delete items from a JSON array, or NDJSON, of `{"id": ...}` rows.
+
+    Written in batches like POST /items/bulk, and the deleted items are
+    returned. Items that don't exist, that belong to another user (unless a
+    superuser) or that appear twice are reported in `errors`.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    first_index: dict[uuid.UUID, int] = {}
+
+    async def write(
+        batch: list[tuple[int, ItemBulkDelete]],
+    ) -> tuple[list[Item], list[BulkRowError]]:
+        rows, errors = without_duplicates(batch, first_index)
+        items = await crud.delete_items_async(
+            session=session, ids=[id for _, id in rows], owner_id=owner_id
+        )
+        errors += await not_written_errors(session, rows, items, owner_id)
+        return items, errors
+
+    items, errors = await bulk.apply(
+        request,
+        session,
+        ItemBulkDelete,
+        write,
+        batch_size=settings.ITEM_BULK_BATCH_SIZE,
+        max_rows=settings.ITEM_BULK_MAX_ROWS,
+    )
+    data = [ItemPublic.model_validate(item) for item in items]
+    return ItemsBulkPublic(data=data, errors=errors)
 
 
 @router.put("/{id}", response_model=ItemPublic)
-def update_item(
+async def update_item(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: CurrentPrincipal,
     id: uuid.UUID,
     item_in: ItemUpdate,
 ) -> Any:
     """
     Update an item.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
+    owner_id = None if current_user.is_superuser else current_user.id
     update_dict = item_in.model_dump(exclude_unset=True)
-    item.sqlmodel_update(update_dict)
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+    if not update_dict:
+        item = await session.get(Item, id)
+        if item and (owner_id is None or item.owner_id == owner_id):
+            return item
+        await raise_not_writable(session, id)
+    item = await crud.update_item_async(
+        session=session, id=id, update_dict=update_dict, owner_id=owner_id
+    )
+    if not item:
+        await raise_not_writable(session, id)
     return item
 
 
 @router.delete("/{id}")
-def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_item(
+    session: AsyncSessionDep, current_user: CurrentPrincipal, id: uuid.UUID
 ) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    owner_id = None if current_user.is_superuser else current_user.id
+    deleted = await crud.delete_items_async(
+        session=session, ids=[id], owner_id=owner_id
+    )
+    if not deleted:
+        await raise_not_writable(session, id)
+    await session.commit()
     return Message(message="Item deleted successfully")
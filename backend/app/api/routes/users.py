@@ -1,18 +1,34 @@
 import uuid
-from typing import Any
+from typing import Any, Literal
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import ClauseElement, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import col, delete, func, select
+from starlette.concurrency import run_in_threadpool
 
 from app import crud
 from app.api.deps import (
+    AsyncSessionDep,
     CurrentUser,
-    SessionDep,
     get_current_active_superuser,
 )
+from app.api.pagination import (
+    check_pagination,
+    decode_cursor,
+    encode_cursor,
+    estimated_row_count_statement,
+    usable_estimate,
+)
+from app.core.auth_cache import (
+    invalidate_principal_async,
+    invalidate_principal_returning,
+)
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.pipeline import run_pipelined
+from app.core.security import password_hasher
 from app.models import (
+    CountStrategy,
     Item,
     Message,
     UpdatePassword,
@@ -34,40 +50,77 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_users(
+    session: AsyncSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_strategy: Literal["exact", "estimate", "none"] = "exact",
+) -> Any:
     """
-    Retrieve users.
+    Retrieve users, ordered by email.
+
+    For the next page pass the `next_cursor` of this one as `cursor`.
+    `count_strategy` picks how `count` is computed; the response's
+    `count_strategy` says which one was used.
     """
+    check_pagination(skip, cursor)
+    conditions = []
+    if cursor:
+        last_key = decode_cursor(cursor, "user", (str, uuid.UUID))
+        conditions.append(tuple_(User.email, User.id) > tuple_(*last_key))
+    order_by = (col(User.email), col(User.id))
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    page_statement = (
+        select(User).where(*conditions).order_by(*order_by).offset(skip).limit(limit)
+    )
+    exact_count_statement = select(func.count()).select_from(User)
+    statements: list[ClauseElement] = [page_statement]
+    if count_strategy == "estimate":
+        statements.append(estimated_row_count_statement("user"))
+    elif count_strategy == "exact":
+        statements.append(exact_count_statement)
+    # The page and its count are independent: one round trip for both
+    page, *counted = await run_pipelined(session, statements)
+    users = page.models(UserPublic)
+    count = counted[0].scalar() if counted else None
+    strategy: CountStrategy = count_strategy
+    if count_strategy == "estimate":
+        count = usable_estimate(count)
+        if count is None:
+            strategy = "exact"
+            count = (await session.exec(exact_count_statement)).one()
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    next_cursor = None
+    if users and len(users) == limit:
+        next_cursor = encode_cursor("user", (users[-1].email, users[-1].id))
 
-    return UsersPublic(data=users, count=count)
+    return UsersPublic(
+        data=users, count=count, count_strategy=strategy, next_cursor=next_cursor
+    )
 
 
 @router.post(
     "/", dependencies=[Depends(get_current_active_superuser)], response_model=UserPublic
 )
-def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
+async def create_user(*, session: AsyncSessionDep, user_in: UserCreate) -> Any:
     """
     Create new user.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
 
-    user = crud.create_user(session=session, user_create=user_in)
+    user = await crud.create_user_async(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
-        send_email(
+        await run_in_threadpool(
+            send_email,
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
@@ -76,15 +129,17 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
 
 
 @router.patch("/me", response_model=UserPublic)
-def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+async def update_user_me(
+    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: CurrentUser
 ) -> Any:
     """
     Update own user.
     """
 
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
@@ -92,33 +147,36 @@ def update_user_me(
     user_data = user_in.model_dump(exclude_unset=True)
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await invalidate_principal_async(session, current_user.id)
+    await session.commit()
+    await session.refresh(current_user)
     return current_user
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
-    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
+async def update_password_me(
+    *, session: AsyncSessionDep, body: UpdatePassword, current_user: CurrentUser
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not await password_hasher.verify(
+        body.current_password, current_user.hashed_password
+    ):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
+    hashed_password = await password_hasher.hash(body.new_password)
     current_user.hashed_password = hashed_password
     session.add(current_user)
-    session.commit()
+    await session.commit()
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(current_user: CurrentUser) -> Any:
     """
     Get current user.
     """
@@ -126,7 +184,7 @@ def read_user_me(current_user: CurrentUser) -> Any:
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+async def delete_user_me(session: AsyncSessionDep, current_user: CurrentUser) -> Any:
     """
     Delete own user.
     """
@@ -134,35 +192,36 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    session.delete(current_user)
-    session.commit()
+    await session.delete(current_user)
+    await invalidate_principal_async(session, current_user.id)
+    await session.commit()
     return Message(message="User deleted successfully")
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserRegister) -> Any:
+async def register_user(session: AsyncSessionDep, user_in: UserRegister) -> Any:
     """
     Create new user without the need to be logged in.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
     user_create = UserCreate.model_validate(user_in)
-    user = crud.create_user(session=session, user_create=user_create)
+    user = await crud.create_user_async(session=session, user_create=user_create)
     return user
 
 
 @router.get("/{user_id}", response_model=UserPublic)
-def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+async def read_user_by_id(
+    user_id: uuid.UUID, session: AsyncSessionDep, current_user: CurrentUser
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if user == current_user:
         return user
     if not current_user.is_superuser:
@@ -178,49 +237,58 @@ def read_user_by_id(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserPublic,
 )
-def update_user(
+async def update_user(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     user_id: uuid.UUID,
     user_in: UserUpdate,
 ) -> Any:
     """
     Update a user.
     """
-
-    db_user = session.get(User, user_id)
+    # One UPDATE ... RETURNING, with the unique index on email catching a
+    # taken one instead of looking it up first
+    try:
+        db_user = await crud.update_user_async(
+            session=session, user_id=user_id, user_in=user_in
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status_code=409, detail="User with this email already exists"
+        )
     if not db_user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
-    if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
-        if existing_user and existing_user.id != user_id:
-            raise HTTPException(
-                status_code=409, detail="User with this email already exists"
-            )
-
-    db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
     return db_user
 
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
-def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+async def delete_user(
+    session: AsyncSessionDep, current_user: CurrentUser, user_id: uuid.UUID
 ) -> Message:
     """
     Delete a user.
     """
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user:
+    if user_id == current_user.id:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
+    # Sent together; if there is no such user, deleting its items did nothing
+    # and the transaction is rolled back anyway
+    _, deleted = await run_pipelined(
+        session,
+        [
+            delete(Item).where(col(Item.owner_id) == user_id),
+            delete(User)
+            .where(col(User.id) == user_id)
+            .returning(
+                col(User.id), invalidate_principal_returning(user_id, col(User.id))
+            ),
+        ],
+    )
+    if not deleted.rows:
+        raise HTTPException(status_code=404, detail="User not found")
+    await session.commit()
     return Message(message="User deleted successfully")
@@ -1,7 +1,15 @@
+import os
+from typing import Any
+
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core.auth_cache import principal_cache, token_cache
+from app.core.db import async_engine, engine
+from app.core.db_pool import pool_metrics
+from app.core.replicas import replica_router
+from app.core.security import password_hasher
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -26,6 +34,68 @@ def test_email(email_to: EmailStr) -> Message:
     return Message(message="Test email sent")
 
 
+@router.get(
+    "/password-hashing/metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def password_hashing_metrics() -> dict[str, Any]:
+    """
+    Queue depth and timings of the password hashing pool.
+    """
+    return password_hasher.metrics()
+
+
+@router.get(
+    "/principal-cache/stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def principal_cache_stats() -> dict[str, Any]:
+    """
+    Hit rate and size of this worker's authenticated-principal cache.
+    """
+    return principal_cache.stats()
+
+
+@router.get(
+    "/token-cache/stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def token_cache_stats() -> dict[str, Any]:
+    """
+    Hit rate and size of this worker's verified-token cache.
+    """
+    return token_cache.stats()
+
+
+@router.get(
+    "/db-pool/metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_pool_metrics() -> dict[str, Any]:
+    """
+    Live state and checkout waits of this worker's database connection pools.
+    """
+    return {
+        "pid": os.getpid(),
+        "sync": pool_metrics(engine),
+        "async": pool_metrics(async_engine.sync_engine),
+        "replicas": [
+            pool_metrics(replica.sync_engine) for replica in replica_router.engines
+        ],
+    }
+
+
+@router.get(
+    "/db-replicas/stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_replica_stats() -> dict[str, Any]:
+    """
+    Health and replication lag of the read replicas, as seen by this worker.
+    """
+    return replica_router.stats()
+
+
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
@@ -0,0 +1,137 @@
+"""
+Rows/s of creating items one POST at a time vs POST /items/bulk by batch size.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.bulk_items [--rows 20000] [--batch-sizes 10,100,1000,5000] [--single-rows 1000]
+
+Creates --single-rows items with one POST /items/ each, then --rows items with
+a single NDJSON POST /items/bulk per batch size in --batch-sizes, once writing
+each batch with multi-row INSERT ... RETURNING and once with COPY (by setting
+ITEM_BULK_COPY_MIN_ROWS). Requests go through the ASGI app in process with
+authentication overridden, so the numbers are the route and the database's.
+Needs the database from the .env settings, migrated to head.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, delete
+
+from app.api.deps import get_current_principal
+from app.api.routes import items
+from app.core.auth_cache import Principal
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.models import Item, User
+from app.tests.utils.utils import random_email, random_lower_string
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+app = FastAPI()
+app.include_router(items.router)
+
+
+def seed_user() -> uuid.UUID:
+    with Session(engine) as session:
+        user = User(email=random_email(), hashed_password=random_lower_string())
+        session.add(user)
+        session.commit()
+        return user.id
+
+
+def cleanup(owner_id: uuid.UUID, user: bool = False) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == owner_id))  # type: ignore
+        if user:
+            session.exec(delete(User).where(User.id == owner_id))  # type: ignore
+        session.commit()
+
+
+def item(n: int) -> dict[str, str]:
+    return {"title": f"item {n}", "description": f"description of item {n}"}
+
+
+async def single(client: httpx.AsyncClient, rows: int) -> float:
+    start = time.perf_counter()
+    for n in range(rows):
+        response = await client.post("/items/", json=item(n))
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def bulk(client: httpx.AsyncClient, rows: int) -> float:
+    body = "\n".join(json.dumps(item(n)) for n in range(rows)).encode()
+    start = time.perf_counter()
+    response = await client.post(
+        "/items/bulk",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+        timeout=None,
+    )
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    errors = response.json()["errors"]
+    if errors:
+        raise RuntimeError(f"{len(errors)} rows failed, e.g. {errors[0]}")
+    return elapsed
+
+
+async def run(
+    owner_id: uuid.UUID, rows: int, batch_sizes: list[int], single_rows: int
+) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # Warm up the pool
+        await bulk(client, 10)
+        cleanup(owner_id)
+        if single_rows:
+            elapsed = await single(client, single_rows)
+            logger.info(
+                f"  single POSTs            {single_rows / elapsed:10.0f} rows/s "
+                f"({single_rows} rows in {elapsed:.2f} s)"
+            )
+            cleanup(owner_id)
+        for batch_size in batch_sizes:
+            settings.ITEM_BULK_BATCH_SIZE = batch_size
+            for mode, copy_min_rows in (("insert", rows + 1), ("copy", 0)):
+                settings.ITEM_BULK_COPY_MIN_ROWS = copy_min_rows
+                elapsed = await bulk(client, rows)
+                logger.info(
+                    f"  bulk, batch {batch_size:>6} {mode:<6} {rows / elapsed:10.0f} rows/s "
+                    f"({rows} rows in {elapsed:.2f} s)"
+                )
+                cleanup(owner_id)
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-sizes", default="10,100,1000,5000")
+    parser.add_argument("--single-rows", type=int, default=1000)
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    owner_id = seed_user()
+    app.dependency_overrides[get_current_principal] = lambda: Principal(
+        id=owner_id, is_active=True, is_superuser=False
+    )
+    settings.ITEM_BULK_MAX_ROWS = max(settings.ITEM_BULK_MAX_ROWS, args.rows)
+    logger.info(f"{args.rows} items per bulk request")
+    try:
+        asyncio.run(run(owner_id, args.rows, batch_sizes, args.single_rows))
+    finally:
+        cleanup(owner_id, user=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Micro-benchmark for the near-duplicate image hash index.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.hamming_index [--size 1000000] [--queries 1000]
+
+Fills a HammingIndex with random 64-bit hashes and reports the mean and p95
+query time for several distances, next to a full vectorised popcount scan.
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from app.core.imagehash import HammingIndex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    index = HammingIndex()
+    start = time.perf_counter()
+    for i in range(args.size):
+        index.add(str(i), rnd.getrandbits(64))
+    logger.info(
+        f"built index of {args.size} hashes in {time.perf_counter() - start:.1f} s"
+    )
+
+    queries = [rnd.getrandbits(64) for _ in range(args.queries)]
+    for distance in (0, 4, 7):
+        for name, query in (("probe", index._probe), ("scan", index._scan)):
+            timings = []
+            for value in queries[: args.queries if name == "probe" else 50]:
+                start = time.perf_counter()
+                query(value, distance)
+                timings.append(time.perf_counter() - start)
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            logger.info(
+                f"  distance {distance}  {name:<6} mean {statistics.mean(timings) * 1000:8.3f} ms"
+                f"  p95 {p95 * 1000:8.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
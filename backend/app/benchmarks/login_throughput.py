@@ -0,0 +1,88 @@
+"""
+Benchmark for password verification throughput during a login burst.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.login_throughput [--logins 64] [--max-processes N]
+
+Runs a burst of concurrent bcrypt verifications (the CPU-bound part of
+/login/access-token) through PasswordHasher with 0 processes (the anyio
+threadpool, as before) and with 1..N processes, and reports logins per
+second. While each burst runs, a trivial sync call is pushed through the
+threadpool every 10 ms to show how long other sync endpoints wait.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.security import PasswordHasher, get_password_hash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def probe_threadpool(stop: asyncio.Event) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run_burst(processes: int, logins: int, hashed: str) -> None:
+    # The threadpool case is only bounded by anyio's 40 threads
+    hasher = PasswordHasher(
+        processes=processes, max_concurrency=processes if processes else 40
+    )
+    try:
+        # Warm up the pool so process start-up is not measured
+        await hasher.verify("password", hashed)
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_threadpool(stop))
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(hasher.verify("password", hashed) for _ in range(logins))
+        )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        latencies = await probe
+    finally:
+        hasher.shutdown()
+    assert all(results)
+    p95 = (
+        statistics.quantiles(latencies, n=20)[-1]
+        if len(latencies) > 1
+        else latencies[0]
+    )
+    label = f"{processes} processes" if processes else "threadpool"
+    logger.info(
+        f"  {label:<13} {logins / elapsed:7.1f} logins/s"
+        f"  sync call p95 {p95 * 1000:8.2f} ms  max queued {hasher.metrics()['max_queued']:.0f}"
+    )
+
+
+async def run(logins: int, max_processes: int) -> None:
+    hashed = get_password_hash("password")
+    logger.info(f"{logins} concurrent logins, {os.cpu_count()} CPUs")
+    for processes in range(0, max_processes + 1):
+        await run_burst(processes, logins, hashed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.max_processes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Latency of a deep page of GET /items/ with skip (offset) vs cursor (keyset).
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.pagination [--page 1000] [--limit 100] [--runs 50] [--count-strategy exact]
+
+Seeds a user owning (page + 1) * limit items, then requests page --page of
+their items through the async read_items route, once with
+skip=page*limit and once with the cursor of the row just before that page.
+Authentication is overridden. Reports the route's median and p99 latency
+in each mode, counting with --count-strategy, then the execution time of the
+page query alone from EXPLAIN ANALYZE.
+Needs the database from the .env settings, migrated to head.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from typing import Any, cast
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlmodel import Session, delete
+
+from app.api.deps import get_current_principal
+from app.api.pagination import encode_cursor
+from app.api.routes import items
+from app.core.auth_cache import Principal
+from app.core.db import async_engine, engine
+from app.models import Item, User
+from app.tests.utils.utils import random_email, random_lower_string
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+app = FastAPI()
+app.include_router(items.router)
+
+
+def seed(item_count: int) -> uuid.UUID:
+    with Session(engine) as session:
+        user = User(email=random_email(), hashed_password=random_lower_string())
+        session.add(user)
+        session.flush()
+        session.execute(
+            text(
+                "INSERT INTO item (id, title, owner_id) "
+                "SELECT gen_random_uuid(), 'item ' || n, :owner_id "
+                "FROM generate_series(1, :count) AS n"
+            ),
+            {"owner_id": user.id, "count": item_count},
+        )
+        session.commit()
+        session.execute(text("ANALYZE item"))
+        return user.id
+
+
+def id_before(owner_id: uuid.UUID, offset: int) -> uuid.UUID:
+    with Session(engine) as session:
+        last_id: uuid.UUID = session.execute(
+            text(
+                "SELECT id FROM item WHERE owner_id = :owner_id "
+                "ORDER BY id OFFSET :offset LIMIT 1"
+            ),
+            {"owner_id": owner_id, "offset": offset - 1},
+        ).scalar_one()
+    return last_id
+
+
+def cleanup(owner_id: uuid.UUID) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == owner_id))  # type: ignore
+        session.exec(delete(User).where(User.id == owner_id))  # type: ignore
+        session.commit()
+
+
+async def measure(params: dict[str, str | int], runs: int) -> list[float]:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            response = await client.get("/items/", params=params)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+    # The first run warms up the pool
+    return sorted(latencies[1:])
+
+
+async def explain(
+    owner_id: uuid.UUID, skip: int, last_id: uuid.UUID, limit: int
+) -> None:
+    async with async_engine.connect() as conn:
+        for label, condition in (
+            ("skip", f"ORDER BY id OFFSET {skip}"),
+            ("cursor", f"AND id > '{last_id}' ORDER BY id"),
+        ):
+            plan = await conn.execute(
+                text(
+                    "EXPLAIN (ANALYZE, FORMAT JSON) SELECT * FROM item "
+                    f"WHERE owner_id = :owner_id {condition} LIMIT {limit}"
+                ),
+                {"owner_id": owner_id},
+            )
+            (root,) = cast(list[dict[str, Any]], plan.scalar_one())
+            logger.info(
+                f"  query only, {label:<6} {root['Execution Time']:8.2f} ms "
+                f"({root['Plan']['Plans'][0]['Node Type']})"
+            )
+
+
+async def run(
+    owner_id: uuid.UUID, page: int, limit: int, runs: int, count_strategy: str
+) -> None:
+    skip = page * limit
+    last_id = id_before(owner_id, skip)
+    cursor = encode_cursor("item", (last_id,))
+    cases: list[tuple[str, dict[str, str | int]]] = [
+        ("skip", {"skip": skip, "limit": limit, "count_strategy": count_strategy}),
+        (
+            "cursor",
+            {"cursor": cursor, "limit": limit, "count_strategy": count_strategy},
+        ),
+    ]
+    for label, params in cases:
+        latencies = await measure(params, runs)
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        logger.info(f"  route, {label:<6} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms")
+    await explain(owner_id, skip, last_id, limit)
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument(
+        "--count-strategy",
+        choices=["exact", "counter", "estimate", "none"],
+        default="exact",
+    )
+    args = parser.parse_args()
+
+    item_count = (args.page + 1) * args.limit
+    owner_id = seed(item_count)
+    app.dependency_overrides[get_current_principal] = lambda: Principal(
+        id=owner_id, is_active=True, is_superuser=False
+    )
+    logger.info(
+        f"page {args.page} of {args.limit} items, {item_count} items in total, "
+        f"{args.count_strategy} count"
+    )
+    try:
+        asyncio.run(
+            run(owner_id, args.page, args.limit, args.runs, args.count_strategy)
+        )
+    finally:
+        cleanup(owner_id)
+
+
+if __name__ == "__main__":
+    main()
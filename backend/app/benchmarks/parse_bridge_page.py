@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for the camera page parser.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.parse_bridge_page [--iterations 500]
+
+Parses every saved fixture page with each available engine and reports the
+mean and p95 parse time per page, next to the original full-tree
+BeautifulSoup parse as a baseline.
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+from app.api.endpoints.sendai_livecamera_bs4.parser import PARSERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = (
+    Path(__file__).resolve().parents[1] / "tests" / "fixtures" / "sendai_livecamera_bs4"
+)
+FIXTURE_URL = "https://example.com/livecamera/bridge.html"
+
+
+def parse_full_tree(content: bytes, url: str) -> Any:  # noqa: ARG001
+    # Baseline: what scrape_bridge_data did before the parser engines existed
+    soup = BeautifulSoup(content.decode("shift_jis", errors="replace"), "html.parser")
+    return (
+        soup.find("td", class_="style1"),
+        soup.find("td", class_="style2"),
+        soup.find("div", class_="style3"),
+        soup.find_all("img"),
+    )
+
+
+def measure(
+    parse: Callable[[bytes, str], Any], content: bytes, iterations: int
+) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        parse(content, FIXTURE_URL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    engines: dict[str, Callable[[bytes, str], Any]] = {"baseline": parse_full_tree}
+    engines.update(PARSERS)
+
+    for fixture in sorted(FIXTURES_DIR.glob("*.html")):
+        content = fixture.read_bytes()
+        logger.info(f"{fixture.name} ({len(content)} bytes)")
+        for name, parse in engines.items():
+            timings = measure(parse, content, args.iterations)
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            logger.info(
+                f"  {name:<12} mean {statistics.mean(timings) * 1000:8.3f} ms"
+                f"  p95 {p95 * 1000:8.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
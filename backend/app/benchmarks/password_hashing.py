@@ -0,0 +1,149 @@
+"""
+Benchmark for password hash and verify latency per hashing policy.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.password_hashing [--target-ms 250] [--samples 5]
+        [--bcrypt-rounds 10-14] [--argon2-memory-kib 19456,65536,131072]
+        [--argon2-time-cost 1-4]
+
+Measures the median hash and verify time of every bcrypt rounds value and,
+when argon2-cffi is installed, every argon2id memory/time combination on this
+machine, then recommends the most expensive setting of each scheme whose
+verify time stays under the target. Verify is what a login pays; it runs in
+PasswordHasher's process pool, so login p95 under load also depends on
+PASSWORD_HASH_PROCESSES (see app.benchmarks.login_throughput).
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from collections.abc import Callable
+
+from passlib.hash import argon2
+
+from app.core.security import password_context
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PASSWORD = "correct horse battery staple"
+
+
+def parse_range(value: str) -> list[int]:
+    """`10-14` or `19456,65536` to a list of ints."""
+    if "-" in value:
+        low, high = value.split("-", 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(v) for v in value.split(",")]
+
+
+def median_ms(func: Callable[[], object], samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def measure(
+    label: str,
+    samples: int,
+    scheme: str,
+    bcrypt_rounds: int = 12,
+    argon2_memory_kib: int = 65536,
+    argon2_time_cost: int = 3,
+) -> float:
+    context = password_context(
+        scheme=scheme,
+        bcrypt_rounds=bcrypt_rounds,
+        argon2_memory_kib=argon2_memory_kib,
+        argon2_time_cost=argon2_time_cost,
+    )
+    hashed = context.hash(PASSWORD)
+    hash_ms = median_ms(lambda: context.hash(PASSWORD), samples)
+    verify_ms = median_ms(lambda: context.verify(PASSWORD, hashed), samples)
+    logger.info(f"  {label:<34} hash {hash_ms:8.1f} ms  verify {verify_ms:8.1f} ms")
+    return verify_ms
+
+
+def run(
+    target_ms: float,
+    samples: int,
+    bcrypt_rounds: list[int],
+    argon2_memory_kib: list[int],
+    argon2_time_cost: list[int],
+) -> None:
+    recommendations = []
+
+    logger.info("bcrypt")
+    best = None
+    for rounds in bcrypt_rounds:
+        verify_ms = measure(f"rounds={rounds}", samples, "bcrypt", bcrypt_rounds=rounds)
+        if verify_ms <= target_ms:
+            best = rounds
+        else:
+            # Cost doubles with every round
+            break
+    if best is not None:
+        recommendations.append(
+            f"PASSWORD_HASH_SCHEME=bcrypt PASSWORD_BCRYPT_ROUNDS={best}"
+        )
+
+    if not argon2.has_backend():
+        logger.info("argon2: skipped, install the `argon2` extra (argon2-cffi)")
+    else:
+        logger.info("argon2id")
+        best_argon2: tuple[int, int] | None = None
+        for memory_kib in argon2_memory_kib:
+            for time_cost in argon2_time_cost:
+                verify_ms = measure(
+                    f"memory_kib={memory_kib} time_cost={time_cost}",
+                    samples,
+                    "argon2",
+                    argon2_memory_kib=memory_kib,
+                    argon2_time_cost=time_cost,
+                )
+                if verify_ms > target_ms:
+                    break
+                # Prefer memory over passes: memory is what makes GPU attacks costly
+                if best_argon2 is None or (memory_kib, time_cost) > best_argon2:
+                    best_argon2 = (memory_kib, time_cost)
+        if best_argon2 is not None:
+            recommendations.append(
+                "PASSWORD_HASH_SCHEME=argon2"
+                f" PASSWORD_ARGON2_MEMORY_KIB={best_argon2[0]}"
+                f" PASSWORD_ARGON2_TIME_COST={best_argon2[1]}"
+            )
+
+    if not recommendations:
+        logger.info(f"No setting verifies within {target_ms} ms on this machine")
+        return
+    logger.info(f"Most expensive settings verifying within {target_ms} ms:")
+    for recommendation in recommendations:
+        logger.info(f"  {recommendation}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--bcrypt-rounds", type=parse_range, default="10-14")
+    parser.add_argument(
+        "--argon2-memory-kib", type=parse_range, default="19456,65536,131072"
+    )
+    parser.add_argument("--argon2-time-cost", type=parse_range, default="1-4")
+    args = parser.parse_args()
+    run(
+        args.target_ms,
+        args.samples,
+        args.bcrypt_rounds,
+        args.argon2_memory_kib,
+        args.argon2_time_cost,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Latency of multi-statement routes with DB_PIPELINE off and on, over a slow link.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.pipeline_latency [--delay-ms 5] [--runs 50]
+
+Starts a TCP proxy in front of the database from the .env settings that
+delays everything it forwards by --delay-ms in each direction, like a
+database in another zone, and points the app's engines at it. Then times,
+with psycopg pipeline mode off and on:
+
+- GET /items/?count_strategy=counter: the page and the item counter
+- GET /users/: the page and the count
+- DELETE /users/{id} of a user owning an item: deleting the items and the user
+
+Requests go through the ASGI app in process with authentication overridden.
+Reports the median and p99 latency of each.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class DelayProxy:
+    """TCP proxy delaying each chunk by `delay` seconds, in its own thread."""
+
+    def __init__(self, host: str, port: int, delay: float) -> None:
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+
+    def start(self) -> int:
+        """Start the proxy and return the local port it listens on."""
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, "127.0.0.1", 0), self.loop
+        ).result()
+        port: int = server.sockets[0].getsockname()[1]
+        return port
+
+    async def _handle(
+        self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter
+    ) -> None:
+        server_reader, server_writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer),
+            self._pipe(server_reader, client_writer),
+            return_exceptions=True,
+        )
+
+    async def _pipe(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Chunks are queued with the time they are due, so a burst is delayed
+        # once rather than once per chunk
+        queue: asyncio.Queue[tuple[float, bytes]] = asyncio.Queue()
+
+        async def forward() -> None:
+            while True:
+                due, data = await queue.get()
+                await asyncio.sleep(max(0.0, due - self.loop.time()))
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        task = asyncio.create_task(forward())
+        while data := await reader.read(65536):
+            queue.put_nowait((self.loop.time() + self.delay, data))
+        queue.put_nowait((self.loop.time() + self.delay, b""))
+        await task
+
+
+async def measure(
+    request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    client: httpx.AsyncClient,
+    runs: int,
+) -> list[float]:
+    latencies = []
+    for run in range(runs + 1):
+        start = time.perf_counter()
+        response = await request(client, run)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    # The first run warms up the pool
+    return sorted(latencies[1:])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay-ms", type=float, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    from app.core.config import settings
+
+    # The engines are created on import of app.core.db, so that has to wait
+    # until they can be pointed at the proxy
+    proxy = DelayProxy(
+        settings.POSTGRES_SERVER, settings.POSTGRES_PORT, args.delay_ms / 1000
+    )
+    settings.POSTGRES_SERVER = "127.0.0.1"
+    settings.POSTGRES_PORT = proxy.start()
+
+    from fastapi import FastAPI
+    from sqlmodel import Session, col, delete
+
+    from app.api.deps import (
+        get_current_active_superuser,
+        get_current_principal,
+        get_current_user,
+    )
+    from app.api.routes import items, users
+    from app.core.auth_cache import Principal
+    from app.core.db import async_engine, engine
+    from app.models import Item, User
+    from app.tests.utils.utils import random_email, random_lower_string
+
+    app = FastAPI()
+    app.include_router(items.router)
+    app.include_router(users.router)
+
+    with Session(engine) as session:
+        owner = User(email=random_email(), hashed_password=random_lower_string())
+        # Deleted by the DELETE /users/{id} runs, with and without pipeline
+        doomed = [
+            User(email=random_email(), hashed_password=random_lower_string())
+            for _ in range(2 * (args.runs + 1))
+        ]
+        session.add_all([owner, *doomed])
+        session.flush()
+        session.add_all(
+            [Item(title=f"item {n}", owner_id=owner.id) for n in range(100)]
+            + [Item(title="doomed", owner_id=user.id) for user in doomed]
+        )
+        session.commit()
+        owner_id = owner.id
+        doomed_ids = [user.id for user in doomed]
+
+    superuser = User(
+        id=uuid.uuid4(),
+        email=random_email(),
+        hashed_password="",
+        is_superuser=True,
+    )
+    app.dependency_overrides[get_current_user] = lambda: superuser
+    app.dependency_overrides[get_current_active_superuser] = lambda: Principal(
+        id=superuser.id, is_active=True, is_superuser=True
+    )
+    # Lists the items of the owner
+    app.dependency_overrides[get_current_principal] = lambda: Principal(
+        id=owner_id, is_active=True, is_superuser=False
+    )
+
+    def read_items(client: httpx.AsyncClient, _: int) -> Awaitable[httpx.Response]:
+        return client.get("/items/", params={"count_strategy": "counter"})
+
+    def read_users(client: httpx.AsyncClient, _: int) -> Awaitable[httpx.Response]:
+        return client.get("/users/", params={"limit": 20})
+
+    def delete_user(client: httpx.AsyncClient, _: int) -> Awaitable[httpx.Response]:
+        return client.delete(f"/users/{doomed_ids.pop()}")
+
+    routes: list[tuple[str, Callable[[httpx.AsyncClient, int], Awaitable[Any]]]] = [
+        ("GET /items/", read_items),
+        ("GET /users/", read_users),
+        ("DELETE /users/{id}", delete_user),
+    ]
+
+    async def run() -> None:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            for label, request in routes:
+                for pipeline in (False, True):
+                    settings.DB_PIPELINE = pipeline
+                    latencies = await measure(request, client, args.runs)
+                    p50 = statistics.median(latencies) * 1000
+                    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+                    mode = "pipeline" if pipeline else "one by one"
+                    logger.info(
+                        f"  {label:<20} {mode:<10} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms"
+                    )
+        await async_engine.dispose()
+
+    logger.info(
+        f"{args.delay_ms} ms added each way, {2 * args.delay_ms} ms per round trip"
+    )
+    try:
+        asyncio.run(run())
+    finally:
+        with Session(engine) as session:
+            owners = [owner_id, *doomed_ids]
+            session.exec(delete(Item).where(col(Item.owner_id).in_(owners)))
+            session.exec(delete(User).where(col(User.id).in_(owners)))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for the per-request overhead of RateLimitMiddleware.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.ratelimit [--requests 200000] [--clients 1000]
+
+Calls the middleware directly with a no-op inner ASGI app and the in-process
+backend, and reports the time per request added on top of calling the inner
+app alone: for a path no rule matches, and for rules keyed by IP and by API
+key spread over --clients clients (the API key rule mostly rejects, so that
+case includes building 429 responses). The budget is 50 us per request.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import RateLimitRule
+from app.core.ratelimit import MemoryBackend, RateLimitMiddleware
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUDGET_US = 50
+
+RULES = [
+    RateLimitRule(
+        path="/login/access-token$", methods=["POST"], requests=10, per_seconds=60
+    ),
+    RateLimitRule(path="/ffmpeg/", requests=6, per_seconds=60, key="api_key"),
+    RateLimitRule(path="/items/", requests=10**9, per_seconds=1),
+]
+
+
+async def noop_app(scope: Scope, receive: Receive, send: Send) -> None:
+    pass
+
+
+async def noop_receive() -> Message:
+    return {"type": "http.request"}
+
+
+async def noop_send(message: Message) -> None:
+    pass
+
+
+def make_scope(path: str, method: str, client: int, api_key: bool) -> Scope:
+    headers = [(b"host", b"testserver"), (b"accept", b"*/*")]
+    if api_key:
+        headers.append((b"x-api-key", f"sk_{client:032d}".encode()))
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": headers,
+        "client": (f"10.0.{client // 256 % 256}.{client % 256}", 50000),
+    }
+
+
+async def measure(app: ASGIApp, scopes: list[Scope], requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % len(scopes)], noop_receive, noop_send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def run(requests: int, clients: int) -> None:
+    cases = {
+        "no matching rule": ("/api/v1/users/me", "GET", False),
+        "rule keyed by ip": ("/api/v1/items/", "GET", False),
+        "rule keyed by api key": ("/api/v1/ffmpeg/capture", "GET", True),
+    }
+    baseline_scopes = [make_scope("/api/v1/users/me", "GET", 0, False)]
+    baseline = await measure(noop_app, baseline_scopes, requests)
+    logger.info(
+        f"{requests} requests, {clients} clients, inner app alone {baseline:.2f} us"
+    )
+    for label, (path, method, api_key) in cases.items():
+        middleware = RateLimitMiddleware(
+            noop_app, RULES, MemoryBackend(max_keys=100_000), prefix="/api/v1"
+        )
+        scopes = [
+            make_scope(path, method, client, api_key) for client in range(clients)
+        ]
+        elapsed = await measure(middleware, scopes, requests)
+        overhead = elapsed - baseline
+        verdict = "ok" if overhead < BUDGET_US else "OVER BUDGET"
+        logger.info(f"  {label:<22} +{overhead:6.2f} us/request  {verdict}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.clients))
+
+
+if __name__ == "__main__":
+    main()
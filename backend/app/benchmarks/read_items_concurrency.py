@@ -0,0 +1,132 @@
+"""
+Throughput of GET /items/ under many concurrent clients, async vs sync.
+
+Usage (from ./backend/):
+
+    python -m app.benchmarks.read_items_concurrency [--clients 500] [--requests 5000] [--items 50]
+
+Seeds a user owning --items items, then sends --requests requests from
+--clients concurrent clients through httpx's ASGI transport, once to the
+async read_items route and once to a copy of the former sync implementation
+(run in the threadpool on the sync engine). Authentication is overridden so
+both only measure the database work. Reports requests/s and p50/p99 latency.
+Needs the database from the .env settings.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, delete, func, select
+
+from app.api.deps import get_current_principal
+from app.api.routes import items
+from app.core.auth_cache import Principal
+from app.core.db import async_engine, engine
+from app.models import Item, ItemPublic, ItemsPublic, User
+from app.tests.utils.utils import random_email, random_lower_string
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def read_items_sync(skip: int = 0, limit: int = 100) -> Any:
+    # Opens its own session: with 500 clients a sync SessionDep deadlocks, as
+    # the threads holding connections wait for a free thread to close them
+    owner_id = app.state.owner_id
+    with Session(engine) as session:
+        count_statement = (
+            select(func.count()).select_from(Item).where(Item.owner_id == owner_id)
+        )
+        count = session.exec(count_statement).one()
+        statement = (
+            select(Item).where(Item.owner_id == owner_id).offset(skip).limit(limit)
+        )
+        data = [ItemPublic.model_validate(item) for item in session.exec(statement)]
+        return ItemsPublic(data=data, count=count)
+
+
+app = FastAPI()
+app.include_router(items.router)
+app.add_api_route("/sync-items/", read_items_sync, response_model=ItemsPublic)
+
+
+def seed(item_count: int) -> uuid.UUID:
+    with Session(engine) as session:
+        user = User(email=random_email(), hashed_password=random_lower_string())
+        session.add(user)
+        session.flush()
+        for i in range(item_count):
+            session.add(Item(title=f"item {i}", owner_id=user.id))
+        session.commit()
+        return user.id
+
+
+def cleanup(owner_id: uuid.UUID) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == owner_id))  # type: ignore
+        session.exec(delete(User).where(User.id == owner_id))  # type: ignore
+        session.commit()
+
+
+async def measure(path: str, clients: int, requests: int) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    remaining = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def worker() -> None:
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, sorted(latencies)
+
+
+async def run(clients: int, requests: int) -> None:
+    for label, path in (("sync", "/sync-items/"), ("async", "/items/")):
+        # Warm up the pools first
+        await measure(path, clients, clients)
+        throughput, latencies = await measure(path, clients, requests)
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        logger.info(
+            f"  {label:<5} {throughput:8.0f} req/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms"
+        )
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=50)
+    args = parser.parse_args()
+
+    owner_id = seed(args.items)
+    app.state.owner_id = owner_id
+    app.dependency_overrides[get_current_principal] = lambda: Principal(
+        id=owner_id, is_active=True, is_superuser=False
+    )
+    logger.info(
+        f"{args.requests} requests from {args.clients} clients, {args.items} items"
+    )
+    try:
+        asyncio.run(run(args.clients, args.requests))
+    finally:
+        cleanup(owner_id)
+
+
+if __name__ == "__main__":
+    main()
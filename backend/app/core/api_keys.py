@@ -0,0 +1,223 @@
+"""
+Per-worker map of the API keys used by the endpoints under app/api/endpoints.
+
+Keys live hashed in the apikey table and are mirrored into a dict keyed by the
+hash, so authenticating a request is one SHA-256 and one dict lookup and never
+touches the database. A background thread pulls rows changed since the last
+refresh and writes the usage counted in this worker back to the table.
+
+Quotas are counted per worker: with N workers a key can use up to N times its
+requests_per_minute / bytes_per_day in the worst case.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.security import hash_api_key
+from app.models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+ALL_SCOPES = "*"
+# Rows committed slightly out of updated_at order are picked up by re-reading
+# this far behind the newest updated_at seen
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+@dataclass
+class ApiKeyUsage:
+    minute: int = 0
+    minute_requests: int = 0
+    day: int = 0
+    day_bytes: int = 0
+    # Not yet written back to the apikey row
+    pending_requests: int = 0
+    pending_bytes: int = 0
+    last_used_at: datetime | None = None
+
+
+@dataclass(eq=False)
+class ApiKeyRecord:
+    id: uuid.UUID | None
+    label: str
+    scopes: frozenset[str]
+    requests_per_minute: int | None = None
+    bytes_per_day: int | None = None
+    is_active: bool = True
+    usage: ApiKeyUsage = field(default_factory=ApiKeyUsage)
+
+    def allows(self, scope: str) -> bool:
+        return ALL_SCOPES in self.scopes or scope in self.scopes
+
+
+# Used in the local environment, where API keys are not checked
+LOCAL_API_KEY = ApiKeyRecord(id=None, label="local", scopes=frozenset({ALL_SCOPES}))
+# The shared SECRET_KEY, accepted while API_KEY_ALLOW_SECRET_KEY is set
+LEGACY_API_KEY = ApiKeyRecord(
+    id=None, label="secret-key", scopes=frozenset({ALL_SCOPES})
+)
+
+
+class ApiKeyStore:
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._by_hash: dict[str, ApiKeyRecord] = {}
+        self._hash_by_id: dict[uuid.UUID, str] = {}
+        self._watermark: datetime | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def lookup(self, key: str) -> ApiKeyRecord | None:
+        record = self._by_hash.get(hash_api_key(key))
+        if record is None or not record.is_active:
+            return None
+        return record
+
+    def admit(self, record: ApiKeyRecord, now: float | None = None) -> float | None:
+        """
+        Count a request against the key. Returns None if it is within the
+        key's quotas, otherwise the number of seconds until it may retry.
+        """
+        now = time.time() if now is None else now
+        minute, day = int(now // 60), int(now // 86400)
+        with self._lock:
+            usage = record.usage
+            if usage.minute != minute:
+                usage.minute, usage.minute_requests = minute, 0
+            if usage.day != day:
+                usage.day, usage.day_bytes = day, 0
+            if (
+                record.bytes_per_day is not None
+                and usage.day_bytes >= record.bytes_per_day
+            ):
+                return (day + 1) * 86400 - now
+            if (
+                record.requests_per_minute is not None
+                and usage.minute_requests >= record.requests_per_minute
+            ):
+                return (minute + 1) * 60 - now
+            usage.minute_requests += 1
+            usage.pending_requests += 1
+            usage.last_used_at = datetime.fromtimestamp(now, timezone.utc)
+        return None
+
+    def add_bytes(self, record: ApiKeyRecord, nbytes: int) -> None:
+        """Charge bytes served to (or uploaded by) the key's client."""
+        with self._lock:
+            record.usage.day_bytes += nbytes
+            record.usage.pending_bytes += nbytes
+
+    def refresh(self, session: Session) -> int:
+        """Apply apikey rows changed since the last refresh; returns their number."""
+        statement = select(ApiKey)
+        if self._watermark is not None:
+            statement = statement.where(
+                ApiKey.updated_at > self._watermark - REFRESH_OVERLAP
+            )
+        rows = session.exec(statement).all()
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+                if self._watermark is None or row.updated_at > self._watermark:
+                    self._watermark = row.updated_at
+        return len(rows)
+
+    def _apply(self, row: ApiKey) -> None:
+        old_hash = self._hash_by_id.get(row.id)
+        record = self._by_hash.get(old_hash) if old_hash else None
+        if record is None:
+            record = ApiKeyRecord(id=row.id, label=row.label, scopes=frozenset())
+        # Update in place so usage counted so far is kept
+        record.label = row.label
+        record.scopes = frozenset(row.scopes)
+        record.requests_per_minute = row.requests_per_minute
+        record.bytes_per_day = row.bytes_per_day
+        record.is_active = row.is_active
+        if old_hash != row.key_hash:
+            # Build a new dict so lookups never see it half-updated
+            by_hash = dict(self._by_hash)
+            if old_hash:
+                by_hash.pop(old_hash, None)
+            by_hash[row.key_hash] = record
+            self._by_hash = by_hash
+            self._hash_by_id[row.id] = row.key_hash
+
+    def flush_usage(self, session: Session) -> None:
+        """Add the usage counted since the last flush to the apikey rows."""
+        with self._lock:
+            pending = [
+                (record, record.usage.pending_requests, record.usage.pending_bytes)
+                for record in self._by_hash.values()
+                if record.usage.pending_requests or record.usage.pending_bytes
+            ]
+        for record, requests, nbytes in pending:
+            last_used_at = record.usage.last_used_at or datetime.now(timezone.utc)
+            session.execute(
+                update(ApiKey)
+                .where(ApiKey.id == record.id)  # type: ignore[arg-type]
+                .values(
+                    request_count=ApiKey.request_count + requests,
+                    byte_count=ApiKey.byte_count + nbytes,
+                    last_used_at=func.greatest(
+                        func.coalesce(ApiKey.last_used_at, last_used_at), last_used_at
+                    ),
+                )
+            )
+        session.commit()
+        with self._lock:
+            for record, requests, nbytes in pending:
+                record.usage.pending_requests -= requests
+                record.usage.pending_bytes -= nbytes
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            records = list(self._by_hash.values())
+        return {
+            "keys": len(records),
+            "active": sum(record.is_active for record in records),
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+        }
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="api-key-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            # Write back usage counted since the last flush
+            self._sync()
+
+    def _sync(self) -> None:
+        try:
+            with Session(engine) as session:
+                self.refresh(session)
+                self.flush_usage(session)
+        except SQLAlchemyError as e:
+            logger.warning(f"API key refresh failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._sync()
+            self._stop.wait(self.refresh_seconds)
+
+
+api_key_store = ApiKeyStore(refresh_seconds=settings.API_KEY_REFRESH_SECONDS)
@@ -0,0 +1,327 @@
+"""
+In-process cache of the authorization-relevant fields of authenticated users.
+
+Each worker keeps its own cache. Writes that change a user's id, is_active or
+is_superuser call invalidate_principal() inside their transaction; it sends a
+Postgres NOTIFY that is delivered on commit to every worker's listener.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import psycopg
+from sqlalchemy import ColumnElement, String, cast, func, text
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import TokenPayload
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "principal_invalidation"
+# Payload meaning "drop every cached principal"
+INVALIDATE_ALL = "*"
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of Principal keyed by the token's `sub`, with a TTL.
+
+    A miss reads the row and then put()s it, so an invalidation can land in
+    between and the put() would cache the row as it was before the write.
+    Callers take generation() before the read and pass it to put(), which
+    drops the entry if any invalidation happened since.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "stale_puts": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, sub: str) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[sub]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(sub)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, sub: str, principal: Principal, generation: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._stats["stale_puts"] += 1
+                return
+            self._entries[sub] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, sub: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if sub == INVALIDATE_ALL:
+                self._entries.clear()
+            else:
+                self._entries.pop(sub, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats: dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+)
+
+
+class Doorkeeper:
+    """
+    Small Bloom filter of token digests seen once.
+
+    A digest is only admitted to the TokenCache on its second sighting, so a
+    stream of one-off tokens cannot flush the cache. The filter is cleared
+    after `reset_after` insertions to keep its false-positive rate bounded.
+    """
+
+    HASHES = 3
+
+    def __init__(self, bits: int, reset_after: int) -> None:
+        self.bits = max(bits, 64)
+        self.reset_after = max(reset_after, 1)
+        self._filter = bytearray(self.bits // 8 + 1)
+        self._inserted = 0
+
+    def _positions(self, digest: bytes) -> list[int]:
+        # The digest is already uniformly distributed; slice it instead of rehashing
+        return [
+            int.from_bytes(digest[i * 4 : i * 4 + 4], "little") % self.bits
+            for i in range(self.HASHES)
+        ]
+
+    def seen(self, digest: bytes) -> bool:
+        """Record `digest`, returning whether it was (probably) seen before."""
+        positions = self._positions(digest)
+        if all(self._filter[p >> 3] & (1 << (p & 7)) for p in positions):
+            return True
+        for p in positions:
+            self._filter[p >> 3] |= 1 << (p & 7)
+        self._inserted += 1
+        if self._inserted >= self.reset_after:
+            self._filter = bytearray(len(self._filter))
+            self._inserted = 0
+        return False
+
+
+class TokenCache:
+    """
+    Bounded LRU from sha256(token) to its verified TokenPayload, valid until
+    the token's `exp`.
+
+    Only tokens that passed signature verification are stored, and only once
+    the Doorkeeper has seen them before, so sprayed random or one-off tokens
+    never take a slot. Failures are never cached.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[TokenPayload, float]] = OrderedDict()
+        self._doorkeeper = Doorkeeper(bits=max_entries * 16, reset_after=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "admitted": 0,
+            "deferred": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest: bytes) -> TokenPayload | None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[1] <= time.time():
+                del self._entries[digest]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(digest)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, digest: bytes, payload: TokenPayload, expires_at: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._doorkeeper.seen(digest):
+                self._stats["deferred"] += 1
+                return
+            self._entries[digest] = (payload, expires_at)
+            self._entries.move_to_end(digest)
+            self._stats["admitted"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._doorkeeper = Doorkeeper(
+                bits=self.max_entries * 16, reset_after=self.max_entries
+            )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats: dict[str, Any] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+token_cache = TokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES)
+
+
+def invalidate_principal(session: Session, user_id: uuid.UUID | str) -> None:
+    """
+    Drop the user's cached principal in this worker now and in every worker
+    once the session's transaction commits.
+    """
+    principal_cache.invalidate(str(user_id))
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": INVALIDATION_CHANNEL, "payload": str(user_id)},
+    )
+
+
+async def invalidate_principal_async(
+    session: AsyncSession, user_id: uuid.UUID | str
+) -> None:
+    principal_cache.invalidate(str(user_id))
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": INVALIDATION_CHANNEL, "payload": str(user_id)},
+    )
+
+
+def invalidate_principal_returning(
+    user_id: uuid.UUID | str,
+    id_column: ColumnElement[Any] | Mapped[Any],
+) -> ColumnElement[Any]:
+    """
+    Like invalidate_principal(), but the NOTIFY is a SQL expression for the
+    RETURNING clause of the write itself, on the row's `id_column`, so it
+    takes no statement of its own.
+    """
+    principal_cache.invalidate(str(user_id))
+    return func.pg_notify(INVALIDATION_CHANNEL, cast(id_column, String))
+
+
+class InvalidationListener:
+    """
+    Background thread that LISTENs for invalidations on a dedicated connection.
+
+    Notifications sent while the listener is disconnected are lost, so after
+    every (re)connect the whole cache is dropped.
+    """
+
+    def __init__(self, cache: PrincipalCache, conninfo: str) -> None:
+        self.cache = cache
+        self.conninfo = conninfo
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None and self.cache.enabled:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="principal-invalidation", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                    self.cache.invalidate(INVALIDATE_ALL)
+                    backoff = 1.0
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self.cache.invalidate(notify.payload)
+            except psycopg.Error as e:
+                logger.warning(f"Principal invalidation listener disconnected: {e}")
+                self.cache.invalidate(INVALIDATE_ALL)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+invalidation_listener = InvalidationListener(
+    principal_cache,
+    # psycopg takes a libpq URI, without SQLAlchemy's "+driver" suffix
+    str(settings.SQLALCHEMY_DATABASE_URI).replace(
+        "postgresql+psycopg", "postgresql", 1
+    ),
+)
@@ -4,6 +4,7 @@ from typing import Annotated, Any, Literal
 
 from pydantic import (
     AnyUrl,
+    BaseModel,
     BeforeValidator,
     EmailStr,
     HttpUrl,
@@ -24,6 +25,19 @@ def parse_cors(v: Any) -> list[str] | str:
     raise ValueError(v)
 
 
+class RateLimitRule(BaseModel):
+    """
+    Token bucket of `requests` tokens refilled over `per_seconds`, one bucket
+    per key, for requests whose path (after API_V1_STR) matches `path`.
+    """
+
+    path: str  # regular expression, matched from the start of the path
+    methods: list[str] = []  # empty matches every method
+    requests: int
+    per_seconds: float
+    key: Literal["api_key", "user", "ip"] = "ip"
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         # Use top level .env file (one level above ./backend/)
@@ -69,6 +83,30 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Connection pool of each engine (sync and async), per worker process.
+    # Checkout waits and pool events are shown by GET /utils/db-pool/metrics/.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # Reopen connections older than this; -1 keeps them indefinitely
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Reuse the most recently returned connection, so surplus ones go idle and
+    # get recycled instead of all staying warm
+    DB_POOL_USE_LIFO: bool = True
+    # Optional read replicas (SQLAlchemy or libpq URIs, comma separated). Reads
+    # in GET requests on the async routes go to a healthy replica, round robin;
+    # a replica lagging more than MAX_LAG is skipped. A user's reads stay on
+    # the primary for DB_READ_YOUR_WRITES_SECONDS after they write or log in.
+    POSTGRES_REPLICA_URIS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    DB_REPLICA_HEALTH_CHECK_SECONDS: float = 5
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10
+    DB_READ_YOUR_WRITES_SECONDS: float = 5
+    # Send the independent statements of a request together with psycopg's
+    # pipeline mode (app.core.pipeline), in one network round trip. Off runs
+    # them one at a time, e.g. behind a proxy without pipelining support.
+    DB_PIPELINE: bool = True
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -95,6 +133,103 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
 
+    # Password hashing policy. Stored hashes that don't match it (other scheme
+    # or cost) are rehashed on the next successful login. argon2 needs the
+    # `argon2` extra (argon2-cffi). See app/benchmarks/password_hashing.py.
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt"
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_MEMORY_KIB: int = 65536
+    PASSWORD_ARGON2_TIME_COST: int = 3
+
+    # bcrypt runs in its own process pool; 0 processes runs it in the threadpool.
+    # MAX_CONCURRENCY defaults to the number of processes.
+    PASSWORD_HASH_PROCESSES: int = 2
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 0
+
+    # Per-worker cache of authenticated users' id/is_active/is_superuser.
+    # Invalidated across workers via Postgres NOTIFY; a TTL of 0 disables it.
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10_000
+    # Per-worker cache of verified access tokens, valid until their `exp`.
+    # 0 disables it and every request verifies the JWT signature again.
+    TOKEN_CACHE_MAX_ENTRIES: int = 10_000
+
+    # API keys of the endpoints under app/api/endpoints are mirrored per worker
+    # and refreshed from the apikey table this often. The shared SECRET_KEY is
+    # still accepted as a key while API_KEY_ALLOW_SECRET_KEY is set.
+    API_KEY_REFRESH_SECONDS: float = 10
+    API_KEY_ALLOW_SECRET_KEY: bool = True
+
+    # Rate limiting middleware. The first rule matching a request applies;
+    # "memory" keeps buckets per worker, "postgres" shares them between workers.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "postgres"] = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMIT_RULES: list[RateLimitRule] = [
+        RateLimitRule(
+            path="/login/access-token$", methods=["POST"], requests=10, per_seconds=60
+        ),
+        RateLimitRule(path="/ffmpeg/", requests=6, per_seconds=60, key="api_key"),
+    ]
+
+    # Bulk item endpoints (/items/bulk): rows committed per transaction, and
+    # the batch size from which rows are written with COPY instead of
+    # multi-row INSERT ... RETURNING. See app/benchmarks/bulk_items.py.
+    ITEM_BULK_BATCH_SIZE: int = 1000
+    ITEM_BULK_COPY_MIN_ROWS: int = 100
+    ITEM_BULK_MAX_ROWS: int = 100_000
+
+    # sendai_livecamera_bs4: スクレイプ結果のキャッシュ
+    LIVECAMERA_SCRAPE_CACHE_TTL_SECONDS: float = 60
+    LIVECAMERA_SCRAPE_CACHE_STALE_SECONDS: float = 300
+    LIVECAMERA_SCRAPE_CACHE_MAX_ENTRIES: int = 1000
+    LIVECAMERA_SCRAPE_TIMEOUT_SECONDS: float = 10
+    # HTMLパーサー（autoの場合はselectolax > lxml > bs4の順で利用可能なものを使う）
+    LIVECAMERA_HTML_PARSER: Literal["auto", "selectolax", "lxml", "bs4"] = "auto"
+    # 画像プロキシ（/sendai_livecamera_bs4/image）
+    LIVECAMERA_IMAGE_TIMEOUT_SECONDS: float = 10
+    LIVECAMERA_IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    LIVECAMERA_IMAGE_CHUNK_SIZE: int = 64 * 1024
+    LIVECAMERA_IMAGE_MAX_CONNECTIONS: int = 20
+    # 画像キャッシュ（メモリLRU + ディスク）。DISK_DIRを空にするとディスク層を使わない
+    LIVECAMERA_IMAGE_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024
+    LIVECAMERA_IMAGE_CACHE_DISK_DIR: str = "./image_cache"
+    LIVECAMERA_IMAGE_CACHE_DISK_BYTES: int = 512 * 1024 * 1024
+    LIVECAMERA_IMAGE_CACHE_FRESH_SECONDS: float = 10
+    LIVECAMERA_IMAGE_CACHE_MAX_ENTRY_BYTES: int = 2 * 1024 * 1024
+    # MAX_ENTRY_BYTESを超えた画像のURLを覚えておき、キャッシュを介さずストリーミングする秒数
+    LIVECAMERA_IMAGE_CACHE_UNCACHEABLE_SECONDS: float = 300
+    # 外向きリクエストの制御（ホストごとのレート・同時実行数・サーキットブレーカー）
+    LIVECAMERA_OUTBOUND_RATE_PER_SECOND: float = 10
+    LIVECAMERA_OUTBOUND_BURST: int = 20
+    LIVECAMERA_OUTBOUND_MAX_INFLIGHT: int = 8
+    LIVECAMERA_OUTBOUND_FAILURE_THRESHOLD: int = 5
+    LIVECAMERA_OUTBOUND_RESET_SECONDS: float = 30
+    LIVECAMERA_OUTBOUND_ACQUIRE_TIMEOUT_SECONDS: float = 5
+    # 一括スクレイプ（/bridge/bulk）の同時実行数
+    LIVECAMERA_BULK_MAX_URLS: int = 100
+    LIVECAMERA_BULK_CONCURRENCY: int = 16
+    LIVECAMERA_BULK_PER_HOST_CONCURRENCY: int = 4
+    # カメラの定期取得（1ワーカーだけがポーリングし、結果はDIR配下で共有する）
+    LIVECAMERA_POLLER_ENABLED: bool = True
+    LIVECAMERA_POLLER_DIR: str = "./camera_poller"
+    LIVECAMERA_POLLER_INTERVAL_SECONDS: float = 300
+    LIVECAMERA_POLLER_JITTER: float = 0.1
+    LIVECAMERA_POLLER_URLS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    # ポーリングで取得した画像のアーカイブ（保持日数・合計サイズの上限）。DIRを空にすると保存しない
+    LIVECAMERA_ARCHIVE_DIR: str = "./camera_archive"
+    LIVECAMERA_ARCHIVE_RETENTION_DAYS: float = 30
+    LIVECAMERA_ARCHIVE_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+    LIVECAMERA_ARCHIVE_RETENTION_INTERVAL_SECONDS: float = 3600
+    # 前回保存した画像とのpHash距離がこれ以下なら保存しない（未設定の場合はバイト単位で同じ画像のみ省く）
+    LIVECAMERA_ARCHIVE_NEAR_DUPLICATE_DISTANCE: int | None = None
+    # 複数カメラのモザイク画像（タイルのデコードに使うプロセス数・キャッシュする枚数）
+    LIVECAMERA_MOSAIC_WORKERS: int = 2
+    LIVECAMERA_MOSAIC_MAX_TILES: int = 64
+    # 1枚のモザイクの総ピクセル数の上限（キャンバスはRGBで1ピクセル3バイト）
+    LIVECAMERA_MOSAIC_MAX_PIXELS: int = 16_000_000
+    LIVECAMERA_MOSAIC_CACHE_ENTRIES: int = 32
+
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "changethis":
             message = (
@@ -1,10 +1,39 @@
+from typing import Any
+
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
+from app.core.db_pool import (
+    InstrumentedAsyncAdaptedQueuePool,
+    InstrumentedQueuePool,
+    instrument,
+)
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+pool_options: dict[str, Any] = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+}
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedQueuePool,
+    **pool_options,
+)
+# Used by the async routes; the sync engine remains for scripts and sync routes.
+# postgresql+psycopg selects psycopg's async driver for an async engine.
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    **pool_options,
+)
+instrument(engine)
+instrument(async_engine.sync_engine)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -0,0 +1,133 @@
+"""
+Connection pools that measure how long each checkout waits for a connection,
+and count pool events, so GET /utils/db-pool/metrics/ can show why requests
+hit "QueuePool limit ... reached" timeouts.
+
+Counters are per worker process and survive Engine.dispose(), which recreates
+the pool.
+"""
+
+import logging
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, float] = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "max_wait_ms": 0.0,
+            "max_checked_out": 0,
+            "connects": 0,
+            "invalidations": 0,
+            "soft_invalidations": 0,
+        }
+
+    def count(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._metrics[key] += value
+
+    def checkout(self, wait_seconds: float, checked_out: int) -> None:
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_seconds_total"] += wait_seconds
+            self._metrics["max_wait_ms"] = max(
+                self._metrics["max_wait_ms"], round(wait_seconds * 1000, 2)
+            )
+            self._metrics["max_checked_out"] = max(
+                self._metrics["max_checked_out"], checked_out
+            )
+
+    def snapshot(self, pool: QueuePool) -> dict[str, Any]:
+        with self._lock:
+            metrics: dict[str, Any] = dict(self._metrics)
+        checkouts = metrics["checkouts"] or 1
+        metrics["avg_wait_ms"] = round(
+            metrics["wait_seconds_total"] / checkouts * 1000, 3
+        )
+        metrics["pool_size"] = pool.size()
+        metrics["max_overflow"] = pool._max_overflow
+        metrics["checked_in"] = pool.checkedin()
+        metrics["checked_out"] = pool.checkedout()
+        # QueuePool.overflow() counts from -pool_size
+        metrics["overflow"] = max(0, pool.overflow())
+        return metrics
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records the time spent waiting in _do_get()."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.count("timeouts")
+            self.metrics.count("wait_seconds_total", time.perf_counter() - start)
+            logger.warning(f"Database pool checkout timed out: {self.status()}")
+            raise
+        self.metrics.checkout(time.perf_counter() - start, self.checkedout())
+        return record
+
+    def recreate(self) -> QueuePool:
+        pool = super().recreate()
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """The same for AsyncEngine, whose queue is waited on from a greenlet."""
+
+
+def instrument(engine: Engine) -> None:
+    """
+    Count connects and invalidations of `engine`'s pool, which must be an
+    InstrumentedQueuePool (for an AsyncEngine pass its sync_engine). The
+    listeners are kept when the pool is recreated.
+    """
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        raise TypeError(f"{type(pool).__name__} is not instrumented")
+    metrics = pool.metrics
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection: Any, record: ConnectionPoolEntry) -> None:  # noqa: ARG001
+        metrics.count("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(
+        dbapi_connection: Any,  # noqa: ARG001
+        record: ConnectionPoolEntry,  # noqa: ARG001
+        exception: BaseException | None,
+    ) -> None:
+        metrics.count("invalidations")
+        logger.info(f"Database connection invalidated: {exception!r}")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(
+        dbapi_connection: Any,  # noqa: ARG001
+        record: ConnectionPoolEntry,  # noqa: ARG001
+        exception: BaseException | None,  # noqa: ARG001
+    ) -> None:
+        metrics.count("soft_invalidations")
+
+
+def pool_metrics(engine: Engine) -> dict[str, Any]:
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"status": pool.status()}
+    return pool.metrics.snapshot(pool)
@@ -0,0 +1,229 @@
+"""
+Perceptual image hashes and a Hamming-distance index for near-duplicate lookup.
+
+dHash and pHash are 64-bit integers computed with NumPy from a small grayscale
+thumbnail, so they survive JPEG re-encoding and small overlays that change
+every byte of the file.
+"""
+
+import io
+import itertools
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+# Multi-index hashing: a 64-bit hash is split into 4 16-bit chunks. Two hashes
+# within distance k share a chunk within distance k // 4 (pigeonhole), so the
+# index only probes buckets near the query's chunks.
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Beyond this per-chunk radius the probe count explodes; scan instead
+MAX_PROBE_RADIUS = 1
+
+_DCT_SIZE = 32
+_DCT_KEEP = 8
+
+
+def _dct_matrix(n: int) -> Any:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+_BIT_WEIGHTS = np.left_shift(
+    np.uint64(1), np.arange(HASH_BITS - 1, -1, -1, dtype=np.uint64)
+)
+
+_popcount: Callable[[Any], Any]
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:  # NumPy < 2.0
+    _BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount_bytes(values: Any) -> Any:
+        as_bytes = values.view(np.uint8).reshape(-1, 8)
+        return _BYTE_POPCOUNT[as_bytes].sum(axis=1)
+
+    _popcount = _popcount_bytes
+
+
+def _bits_to_int(bits: Any) -> int:
+    return int(np.sum(_BIT_WEIGHTS[bits.ravel()], dtype=np.uint64))
+
+
+def _grayscale(image: Image.Image, size: tuple[int, int]) -> Any:
+    thumbnail = image.convert("L").resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(thumbnail, dtype=np.float64)
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: sign of the horizontal gradient of a 9x8 thumbnail."""
+    pixels = _grayscale(image, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """DCT hash: low-frequency DCT coefficients of a 32x32 thumbnail vs their median."""
+    pixels = _grayscale(image, (_DCT_SIZE, _DCT_SIZE))
+    coefficients = (_DCT @ pixels @ _DCT.T)[:_DCT_KEEP, :_DCT_KEEP]
+    # The DC term only reflects overall brightness
+    median = np.median(coefficients.ravel()[1:])
+    return _bits_to_int(coefficients > median)
+
+
+@dataclass(frozen=True)
+class ImageHashes:
+    dhash: int
+    phash: int
+
+    def to_dict(self) -> dict[str, str]:
+        return {"dhash": f"{self.dhash:016x}", "phash": f"{self.phash:016x}"}
+
+
+def compute_hashes(data: bytes) -> ImageHashes | None:
+    """Hash encoded image bytes; None if Pillow cannot decode them."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+            image.load()
+            return ImageHashes(dhash=dhash(image), phash=phash(image))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _neighbours(chunk: int, radius: int) -> list[int]:
+    values = [chunk]
+    for r in range(1, radius + 1):
+        for positions in itertools.combinations(range(CHUNK_BITS), r):
+            flipped = chunk
+            for position in positions:
+                flipped ^= 1 << position
+            values.append(flipped)
+    return values
+
+
+class HammingIndex:
+    """
+    Maps keys to 64-bit hashes and finds all keys within a Hamming distance.
+
+    Small radii are answered by multi-index hashing (exact-match buckets on
+    16-bit chunks); larger radii fall back to a vectorised popcount scan over
+    all hashes. Removed keys leave tombstones, which are dropped by rebuilding
+    the index once they outnumber the live keys. Thread-safe.
+    """
+
+    # Fewer tombstones than this are never worth a rebuild
+    COMPACT_MIN_TOMBSTONES = 1024
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset(1024)
+
+    def _reset(self, capacity: int) -> None:
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._keys: list[str | None] = []
+        self._ids: dict[str, int] = {}
+        self._tables: list[dict[int, list[int]]] = [{} for _ in range(CHUNKS)]
+        self._tombstones = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._ids
+
+    def get(self, key: str) -> int | None:
+        with self._lock:
+            i = self._ids.get(key)
+            return None if i is None else int(self._hashes[i])
+
+    def items(self) -> list[tuple[str, int]]:
+        """(key, hash) of every key, in insertion order."""
+        with self._lock:
+            return [(key, int(self._hashes[i])) for key, i in self._ids.items()]
+
+    def add(self, key: str, value: int) -> None:
+        with self._lock:
+            self._remove(key)
+            self._insert(key, value)
+
+    def _insert(self, key: str, value: int) -> None:
+        i = len(self._keys)
+        if i == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[i] = value
+        self._keys.append(key)
+        self._ids[key] = i
+        for c, table in enumerate(self._tables):
+            table.setdefault((value >> (c * CHUNK_BITS)) & CHUNK_MASK, []).append(i)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key: str) -> bool:
+        # Tombstone: bucket entries are skipped once the key slot is cleared
+        i = self._ids.pop(key, None)
+        if i is None:
+            return False
+        self._keys[i] = None
+        self._tombstones += 1
+        if self._tombstones >= self.COMPACT_MIN_TOMBSTONES and self._tombstones > len(
+            self._ids
+        ):
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        live = [(key, int(self._hashes[i])) for key, i in self._ids.items()]
+        self._reset(max(1024, 2 * len(live)))
+        for key, value in live:
+            self._insert(key, value)
+
+    def query(self, value: int, distance: int) -> list[tuple[str, int]]:
+        """Return (key, distance) pairs within `distance` of `value`, nearest first."""
+        with self._lock:
+            if distance // CHUNKS <= MAX_PROBE_RADIUS:
+                matches = self._probe(value, distance)
+            else:
+                matches = self._scan(value, distance)
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def _probe(self, value: int, distance: int) -> list[tuple[str, int]]:
+        radius = distance // CHUNKS
+        buckets = []
+        for c, table in enumerate(self._tables):
+            chunk = (value >> (c * CHUNK_BITS)) & CHUNK_MASK
+            for neighbour in _neighbours(chunk, radius):
+                bucket = table.get(neighbour)
+                if bucket:
+                    buckets.append(bucket)
+        candidates = np.unique(
+            np.fromiter(itertools.chain.from_iterable(buckets), dtype=np.int64)
+        )
+        return self._verify(candidates, value, distance)
+
+    def _verify(self, ids: Any, value: int, distance: int) -> list[tuple[str, int]]:
+        distances = _popcount(self._hashes[ids] ^ np.uint64(value))
+        within = np.flatnonzero(distances <= distance)
+        return [
+            (key, int(distances[i]))
+            for i in within
+            if (key := self._keys[ids[i]]) is not None
+        ]
+
+    def _scan(self, value: int, distance: int) -> list[tuple[str, int]]:
+        return self._verify(np.arange(len(self._keys)), value, distance)
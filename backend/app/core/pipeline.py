@@ -0,0 +1,107 @@
+"""
+Independent statements in one network round trip, with psycopg's pipeline mode.
+
+SQLAlchemy waits for the result of each statement before sending the next.
+run_pipelined() compiles the statements with the session's dialect and sends
+them all on its connection, inside its transaction, before reading any
+result. The statements must not depend on each other's results, and if one
+fails the rest of the transaction is aborted. psycopg waits for the BEGIN
+that opens a transaction on its own, so N statements take two round trips
+instead of N + 1 at the start of a transaction, and one instead of N after.
+
+In a RoutingSession the statements go where the first one would, so a GET
+request's SELECTs can still read from a replica.
+"""
+
+import contextlib
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, TypeVar, cast
+
+import psycopg
+from pydantic import BaseModel
+from sqlalchemy import ClauseElement
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@dataclass
+class PipelineResult:
+    columns: list[str]
+    rows: list[tuple[Any, ...]]
+
+    def scalar(self) -> Any:
+        """The first column of the first row, None if there is no row."""
+        return self.rows[0][0] if self.rows else None
+
+    def models(self, model: type[ModelT]) -> list[ModelT]:
+        return [
+            model.model_validate(dict(zip(self.columns, row, strict=True)))
+            for row in self.rows
+        ]
+
+
+async def run_pipelined(
+    session: AsyncSession, statements: Sequence[ClauseElement]
+) -> list[PipelineResult]:
+    """
+    Run the statements on the session's connection, in a single round trip
+    unless DB_PIPELINE is off, and return their results in order. Database
+    errors are raised as SQLAlchemy's DBAPIError subclasses, as by
+    session.exec().
+    """
+    connection = await session.connection(
+        bind_arguments={"clause": statements[0]} if statements else None
+    )
+    dialect = connection.dialect
+    queries = []
+    for statement in statements:
+        # SQL statements compile to a SQLCompiler, which has the binds
+        compiled = cast(
+            SQLCompiler,
+            statement.compile(
+                dialect=dialect, compile_kwargs={"render_postcompile": True}
+            ),
+        )
+        params = dict(compiled.construct_params() or {})
+        for name, value in params.items():
+            bind = compiled.binds.get(name)
+            processor = bind.type.bind_processor(dialect) if bind is not None else None
+            if processor is not None:
+                params[name] = processor(value)
+        queries.append((compiled.string, params))
+
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+    assert driver_connection is not None
+    use_pipeline = settings.DB_PIPELINE and psycopg.Pipeline.is_supported()
+    cursors = []
+    try:
+        # Leaving the pipeline sends it and waits for every result
+        async with (
+            driver_connection.pipeline() if use_pipeline else contextlib.nullcontext()
+        ):
+            for query in queries:
+                cursor = driver_connection.cursor()
+                await cursor.execute(*query)
+                cursors.append(cursor)
+        results = []
+        for cursor in cursors:
+            if cursor.description is None:
+                results.append(PipelineResult(columns=[], rows=[]))
+                continue
+            columns = [column.name for column in cursor.description]
+            results.append(
+                PipelineResult(columns=columns, rows=await cursor.fetchall())
+            )
+        return results
+    except psycopg.Error as e:
+        # Which statement failed is in the error itself
+        raise DBAPIError.instance(None, None, e, psycopg.Error, dialect=dialect) from e
+    finally:
+        for cursor in cursors:
+            await cursor.close()
@@ -0,0 +1,238 @@
+"""
+Token-bucket rate limiting as ASGI middleware.
+
+Requests are matched against settings.RATE_LIMIT_RULES. Each matching request
+takes a token from the bucket of its (rule, key), where the key is the
+client's API key, user id or IP. Unmatched requests only pay for the rule
+lookup. The buckets live either in this worker's memory or in an UNLOGGED
+Postgres table shared by all workers.
+"""
+
+import hashlib
+import logging
+import math
+import random
+import re
+import time
+from typing import Protocol, cast
+
+from fastapi import HTTPException
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import RateLimitRule, settings
+from app.core.db import engine
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitBackend(Protocol):
+    async def acquire(self, key: str, capacity: int, rate: float) -> float | None:
+        """
+        Take a token from the bucket `key`. Returns None if one was available,
+        otherwise the number of seconds until there is one.
+        """
+        ...
+
+
+class MemoryBackend:
+    """Buckets in a dict, for a single worker. Only used from the event loop."""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at, capacity, rate]
+        self._buckets: dict[str, list[float]] = {}
+
+    async def acquire(self, key: str, capacity: int, rate: float) -> float | None:
+        return self.acquire_nowait(key, capacity, rate)
+
+    def acquire_nowait(self, key: str, capacity: int, rate: float) -> float | None:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            self._buckets[key] = [capacity - 1, now, capacity, rate]
+            return None
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return None
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def clear(self) -> None:
+        self._buckets = {}
+
+    def _evict(self, now: float) -> None:
+        # Buckets that have refilled are the same as missing ones
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]
+        }
+        if len(self._buckets) >= self.max_keys:
+            # Still full (many clients at once): drop the older half
+            keys = list(self._buckets)
+            for key in keys[: len(keys) // 2]:
+                del self._buckets[key]
+
+
+class PostgresBackend:
+    """
+    Buckets in the rate_limit_bucket table, shared by all workers.
+
+    Refill and take happen in one upsert, so concurrent workers serialize on
+    the bucket's row lock and never both take the last token. If the database
+    is unavailable requests are let through.
+    """
+
+    ACQUIRE = text(
+        """
+        INSERT INTO rate_limit_bucket AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :capacity - 1, true, now())
+        ON CONFLICT (key) DO UPDATE SET (tokens, allowed, updated_at) = (
+            SELECT
+                CASE WHEN r.tokens >= 1 THEN r.tokens - 1 ELSE r.tokens END,
+                r.tokens >= 1,
+                now()
+            FROM (
+                SELECT LEAST(
+                    :capacity,
+                    b.tokens + :rate * GREATEST(0, EXTRACT(EPOCH FROM now() - b.updated_at))
+                ) AS tokens
+            ) AS r
+        )
+        RETURNING tokens, allowed
+        """
+    )
+    PURGE = text(
+        "DELETE FROM rate_limit_bucket WHERE updated_at < now() - make_interval(secs => :age)"
+    )
+    # Purge refilled buckets on about one in this many acquires
+    PURGE_EVERY = 1000
+
+    def __init__(self, engine: Engine, max_window_seconds: float) -> None:
+        self.engine = engine
+        self.max_window_seconds = max_window_seconds
+
+    async def acquire(self, key: str, capacity: int, rate: float) -> float | None:
+        return await run_in_threadpool(self.acquire_sync, key, capacity, rate)
+
+    def acquire_sync(self, key: str, capacity: int, rate: float) -> float | None:
+        try:
+            with self.engine.begin() as conn:
+                tokens, allowed = cast(
+                    tuple[float, bool],
+                    conn.execute(
+                        self.ACQUIRE, {"key": key, "capacity": capacity, "rate": rate}
+                    ).one(),
+                )
+                if random.randrange(self.PURGE_EVERY) == 0:
+                    conn.execute(self.PURGE, {"age": self.max_window_seconds})
+        except SQLAlchemyError as e:
+            logger.warning(f"Rate limit check failed, letting the request through: {e}")
+            return None
+        if allowed:
+            return None
+        return (1 - float(tokens)) / rate
+
+
+def _header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return str(value.decode("latin-1"))
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: list[RateLimitRule],
+        backend: RateLimitBackend,
+        prefix: str = "",
+    ) -> None:
+        self.app = app
+        self.backend = backend
+        self.prefix = prefix
+        self.rules = [
+            (
+                index,
+                re.compile(rule.path),
+                frozenset(method.upper() for method in rule.methods),
+                rule,
+            )
+            for index, rule in enumerate(rules)
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.rules:
+            await self.app(scope, receive, send)
+            return
+        path: str = scope["path"]
+        if not path.startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        path = path[len(self.prefix) :]
+        matched = next(
+            (
+                (index, rule)
+                for index, pattern, methods, rule in self.rules
+                if (not methods or scope["method"] in methods) and pattern.match(path)
+            ),
+            None,
+        )
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        index, rule = matched
+        key = f"{index}:{self._client_key(rule, scope)}"
+        retry_after = await self.backend.acquire(
+            key, rule.requests, rule.requests / rule.per_seconds
+        )
+        if retry_after is None:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _client_key(rule: RateLimitRule, scope: Scope) -> str:
+        if rule.key == "api_key":
+            api_key = _header(scope, b"x-api-key")
+            if api_key:
+                # Keep raw keys out of memory dumps and the shared table
+                return "k:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        elif rule.key == "user":
+            authorization = _header(scope, b"authorization")
+            if authorization and authorization[:7].lower() == "bearer ":
+                # Imported here: app.api depends on app.core, not the reverse
+                from app.api.deps import decode_token
+
+                try:
+                    return f"u:{decode_token(authorization[7:]).sub}"
+                except HTTPException:
+                    pass
+        client = scope.get("client")
+        return f"ip:{client[0] if client else ''}"
+
+
+def create_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresBackend(
+            engine,
+            max_window_seconds=max(
+                (rule.per_seconds for rule in settings.RATE_LIMIT_RULES), default=0
+            ),
+        )
+    return MemoryBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
@@ -0,0 +1,268 @@
+"""
+Routing of reads in GET requests to read replicas.
+
+Sessions from app.api.deps.get_async_db are RoutingSessions. In a GET or HEAD
+request their SELECTs go to a healthy replica, chosen round robin, unless:
+
+- no replica is configured or healthy (health is checked in the background,
+  including replication lag),
+- the session has already written something,
+- the requesting user wrote within DB_READ_YOUR_WRITES_SECONDS, in any
+  worker, so they read their own writes.
+
+Other requests use the primary only. Writes by an authenticated user send a
+Postgres NOTIFY with their id on commit, which every worker's listener turns
+into a stay-on-primary deadline for that user.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from typing import Any
+
+import psycopg
+from sqlalchemy import Engine, Select, event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import pool_options
+from app.core.db_pool import InstrumentedAsyncAdaptedQueuePool, instrument
+
+logger = logging.getLogger(__name__)
+
+STICKY_CHANNEL = "replica_sticky"
+
+LAG = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+def _async_uri(uri: str) -> str:
+    if uri.startswith("postgresql://"):
+        return "postgresql+psycopg://" + uri[len("postgresql://") :]
+    return uri
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        uris: list[str],
+        primary_conninfo: str,
+        health_check_seconds: float,
+        max_lag_seconds: float,
+        sticky_seconds: float,
+    ) -> None:
+        self.engines: list[AsyncEngine] = []
+        for uri in uris:
+            engine = create_async_engine(
+                _async_uri(uri),
+                poolclass=InstrumentedAsyncAdaptedQueuePool,
+                **pool_options,
+            )
+            instrument(engine.sync_engine)
+            self.engines.append(engine)
+        self.primary_conninfo = primary_conninfo
+        self.health_check_seconds = health_check_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.sticky_seconds = sticky_seconds
+        # Replicas are unused until their first successful check
+        self._healthy = [False] * len(self.engines)
+        self._lag: list[float | None] = [None] * len(self.engines)
+        self._counter = itertools.count()
+        # user id -> time.monotonic() until which their reads use the primary
+        self._sticky: dict[str, float] = {}
+        # Writes in other workers are unknown while not listening
+        self._listening = False
+        self._tasks: list[asyncio.Task[None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self, user_id: str | None) -> Engine | None:
+        """The sync engine of the replica to read from, or None for the primary."""
+        if not self._listening:
+            return None
+        if user_id is not None and self.is_sticky(user_id):
+            return None
+        healthy = [
+            engine for engine, ok in zip(self.engines, self._healthy, strict=True) if ok
+        ]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].sync_engine
+
+    def stick(self, user_id: str) -> None:
+        now = time.monotonic()
+        if len(self._sticky) >= 10_000:
+            self._sticky = {
+                key: until for key, until in self._sticky.items() if until > now
+            }
+        self._sticky[user_id] = now + self.sticky_seconds
+
+    def is_sticky(self, user_id: str) -> bool:
+        until = self._sticky.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def mark_down(self, engine: Engine) -> None:
+        for index, replica in enumerate(self.engines):
+            if replica.sync_engine is engine and self._healthy[index]:
+                logger.warning(
+                    f"Read replica {index} failed, using it again after a health check"
+                )
+                self._healthy[index] = False
+
+    async def check(self) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                lag = await asyncio.wait_for(
+                    self._replication_lag(engine), self.health_check_seconds
+                )
+            except (SQLAlchemyError, OSError, asyncio.TimeoutError) as e:
+                if self._healthy[index]:
+                    logger.warning(f"Read replica {index} is unavailable: {e}")
+                self._healthy[index] = False
+                self._lag[index] = None
+                continue
+            healthy = lag <= self.max_lag_seconds
+            if healthy != self._healthy[index]:
+                logger.info(f"Read replica {index} healthy={healthy} (lag {lag:.1f}s)")
+            self._healthy[index] = healthy
+            self._lag[index] = lag
+
+    @staticmethod
+    async def _replication_lag(engine: AsyncEngine) -> float:
+        async with engine.connect() as conn:
+            return float((await conn.execute(LAG)).scalar_one())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "listening": self._listening,
+            "sticky_users": sum(
+                1 for until in self._sticky.values() if until > time.monotonic()
+            ),
+            "replicas": [
+                {"healthy": healthy, "lag_seconds": lag}
+                for healthy, lag in zip(self._healthy, self._lag, strict=True)
+            ],
+        }
+
+    async def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        await self.check()
+        self._tasks = [
+            asyncio.create_task(self._check_forever()),
+            asyncio.create_task(self._listen_forever()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._listening = False
+        # Pooled async connections are bound to the current event loop
+        for engine in self.engines:
+            await engine.dispose()
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_seconds)
+            await self.check()
+
+    async def _listen_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.primary_conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {STICKY_CHANNEL}")
+                    self._listening = True
+                    backoff = 1.0
+                    async for notify in conn.notifies():
+                        self.stick(notify.payload)
+            except psycopg.Error as e:
+                logger.warning(f"Replica stickiness listener disconnected: {e}")
+            finally:
+                self._listening = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+replica_router = ReplicaRouter(
+    [str(uri) for uri in settings.POSTGRES_REPLICA_URIS],
+    # psycopg takes a libpq URI, without SQLAlchemy's "+driver" suffix
+    str(settings.SQLALCHEMY_DATABASE_URI).replace(
+        "postgresql+psycopg", "postgresql", 1
+    ),
+    health_check_seconds=settings.DB_REPLICA_HEALTH_CHECK_SECONDS,
+    max_lag_seconds=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    sticky_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to a replica while info["read_only"] is set.
+
+    info["user_id"] is the authenticated user, for read-your-writes. The first
+    write (flush or non-SELECT statement) moves the session to the primary
+    for good.
+    """
+
+    router = replica_router
+
+    def get_bind(
+        self,
+        mapper: Any = None,
+        *,
+        clause: Any = None,
+        **kw: Any,
+    ) -> Any:
+        info = self.info
+        if info.get("read_only") and kw.get("bind") is None:
+            if self._flushing or not isinstance(clause, Select):
+                info["read_only"] = False
+            else:
+                if "replica" not in info:
+                    info["replica"] = self.router.pick(info.get("user_id"))
+                if info["replica"] is not None:
+                    return info["replica"]
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@event.listens_for(RoutingSession, "before_commit")
+def _notify_write(session: Session) -> None:
+    router = session.router  # type: ignore[attr-defined]
+    user_id = session.info.get("user_id")
+    if user_id is None or session.info.get("read_only") or not router.enabled:
+        return
+    router.stick(user_id)
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": STICKY_CHANNEL, "payload": user_id},
+    )
+
+
+async def stick_to_primary(session: AsyncSession, user_id: uuid.UUID | str) -> None:
+    """
+    Keep the user's reads on the primary for a while, in every worker, without
+    a write of their own (e.g. just after logging in).
+    """
+    if not replica_router.enabled:
+        return
+    session.info["user_id"] = str(user_id)
+    await session.commit()
@@ -1,12 +1,53 @@
+import asyncio
+import hashlib
+import multiprocessing
+import secrets
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import jwt
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def password_context(
+    scheme: str,
+    bcrypt_rounds: int,
+    argon2_memory_kib: int,
+    argon2_time_cost: int,
+) -> CryptContext:
+    """
+    CryptContext that hashes with `scheme` at exactly the given cost and flags
+    any other hash (other scheme, lower or higher cost) as needing an update.
+    Both schemes stay verifiable so the policy can be switched either way.
+    """
+    return CryptContext(
+        schemes=["bcrypt", "argon2"],
+        default=scheme,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__memory_cost=argon2_memory_kib,
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+    )
+
+
+pwd_context = password_context(
+    scheme=settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    argon2_memory_kib=settings.PASSWORD_ARGON2_MEMORY_KIB,
+    argon2_time_cost=settings.PASSWORD_ARGON2_TIME_COST,
+)
 
 
 ALGORITHM = "HS256"
@@ -25,3 +66,154 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verify the password and, if the stored hash doesn't match the current
+    hashing policy, also return a new hash of it to store.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+API_KEY_PREFIX = "sk_"
+
+
+def generate_api_key() -> str:
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def hash_api_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class PasswordHasher:
+    """
+    Runs password hashing in a dedicated process pool.
+
+    bcrypt is ~200 ms of CPU per call; running it in the anyio threadpool
+    holds a threadpool slot and contends for the GIL, so a login burst stalls
+    every sync endpoint. Here at most `max_concurrency` calls run at once and
+    the rest wait on a semaphore, whose queue depth is reported by metrics().
+    With `processes=0` the calls run in the threadpool instead.
+    """
+
+    def __init__(self, processes: int, max_concurrency: int) -> None:
+        self.processes = processes
+        self.max_concurrency = max_concurrency
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        # asyncio primitives are bound to an event loop
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+        self._metrics: dict[str, float] = {
+            "queued": 0,
+            "running": 0,
+            "max_queued": 0,
+            "completed": 0,
+            "errors": 0,
+            "wait_seconds_total": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: the parent may already run threads (pollers, pools)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(
+                    self.max_concurrency
+                )
+            return semaphore
+
+    def _count(self, key: str, value: float) -> None:
+        with self._lock:
+            self._metrics[key] += value
+            if key == "queued":
+                self._metrics["max_queued"] = max(
+                    self._metrics["max_queued"], self._metrics["queued"]
+                )
+
+    async def _run(self, func: Any, *args: str) -> Any:
+        enqueued = time.perf_counter()
+        self._count("queued", 1)
+        dequeued = False
+        try:
+            async with self._get_semaphore():
+                started = time.perf_counter()
+                self._count("queued", -1)
+                dequeued = True
+                self._count("wait_seconds_total", started - enqueued)
+                self._count("running", 1)
+                try:
+                    if self.processes > 0:
+                        loop = asyncio.get_running_loop()
+                        return await loop.run_in_executor(self._get_pool(), func, *args)
+                    return await run_in_threadpool(func, *args)
+                except Exception:
+                    self._count("errors", 1)
+                    raise
+                finally:
+                    self._count("running", -1)
+                    self._count("completed", 1)
+                    self._count("run_seconds_total", time.perf_counter() - started)
+        finally:
+            # Cancelled while still waiting for a slot
+            if not dequeued:
+                self._count("queued", -1)
+
+    async def hash(self, password: str) -> str:
+        result: str = await self._run(get_password_hash, password)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        result: bool = await self._run(verify_password, plain_password, hashed_password)
+        return result
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        result: tuple[bool, str | None] = await self._run(
+            verify_and_update_password, plain_password, hashed_password
+        )
+        return result
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            metrics: dict[str, Any] = dict(self._metrics)
+        completed = metrics["completed"] or 1
+        metrics["avg_wait_ms"] = round(
+            metrics["wait_seconds_total"] / completed * 1000, 2
+        )
+        metrics["avg_run_ms"] = round(
+            metrics["run_seconds_total"] / completed * 1000, 2
+        )
+        metrics["processes"] = self.processes
+        metrics["max_concurrency"] = self.max_concurrency
+        return metrics
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+password_hasher = PasswordHasher(
+    processes=settings.PASSWORD_HASH_PROCESSES,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY
+    or max(settings.PASSWORD_HASH_PROCESSES, 1),
+)
@@ -1,15 +1,51 @@
 import uuid
+from collections.abc import Sequence
+from datetime import datetime, timezone
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import (
+    Boolean,
+    ColumnClause,
+    Uuid,
+    any_,
+    bindparam,
+    case,
+    column,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import Session, col, delete, insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.auth_cache import invalidate_principal_returning
+from app.core.security import (
+    generate_api_key,
+    get_password_hash,
+    hash_api_key,
+    password_hasher,
+    verify_and_update_password,
+)
+from app.models import (
+    ApiKey,
+    ApiKeyCreate,
+    ApiKeyUpdate,
+    Item,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemUpdate,
+    User,
+    UserCreate,
+    UserUpdate,
+)
 
 
-def create_user(*, session: Session, user_create: UserCreate) -> User:
+def create_user(
+    *, session: Session, user_create: UserCreate, hashed_password: str | None = None
+) -> User:
+    if hashed_password is None:
+        hashed_password = get_password_hash(user_create.password)
     db_obj = User.model_validate(
-        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+        user_create, update={"hashed_password": hashed_password}
     )
     session.add(db_obj)
     session.commit()
@@ -17,20 +53,62 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     return db_obj
 
 
+async def create_user_async(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await password_hasher.hash(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+def _update_user_statement(user_id: uuid.UUID, user_data: dict[str, Any]) -> Any:
+    """
+    UPDATE ... RETURNING of the user's row, also telling every worker to drop
+    their cached principal. Rows loaded in the session get the new values.
+    """
+    return (
+        update(User)
+        .where(col(User.id) == user_id)
+        .values(user_data)
+        .returning(User, invalidate_principal_returning(user_id, col(User.id)))
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
-    extra_data = {}
     if "password" in user_data:
-        password = user_data["password"]
-        hashed_password = get_password_hash(password)
-        extra_data["hashed_password"] = hashed_password
-    db_user.sqlmodel_update(user_data, update=extra_data)
-    session.add(db_user)
+        user_data["hashed_password"] = get_password_hash(user_data.pop("password"))
+    if not user_data:
+        return db_user
+    session.exec(_update_user_statement(db_user.id, user_data))
     session.commit()
-    session.refresh(db_user)
     return db_user
 
 
+async def update_user_async(
+    *, session: AsyncSession, user_id: uuid.UUID, user_in: UserUpdate
+) -> User | None:
+    """
+    Update the user in a single statement, or return None if there is no
+    such user. A taken email raises IntegrityError.
+    """
+    user_data = user_in.model_dump(exclude_unset=True)
+    if "password" in user_data:
+        user_data["hashed_password"] = await password_hasher.hash(
+            user_data.pop("password")
+        )
+    if not user_data:
+        return await session.get(User, user_id)
+    result = await session.exec(_update_user_statement(user_id, user_data))
+    row = result.first()
+    await session.commit()
+    return row[0] if row else None
+
+
 def get_user_by_email(*, session: Session, email: str) -> User | None:
     statement = select(User).where(User.email == email)
     session_user = session.exec(statement).first()
@@ -41,8 +119,40 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     db_user = get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    verified, new_hash = verify_and_update_password(password, db_user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        # Stored hash predates the current hashing policy
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        session.commit()
+        session.refresh(db_user)
+    return db_user
+
+
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    verified, new_hash = await password_hasher.verify_and_update(
+        password, db_user.hashed_password
+    )
+    if not verified:
+        return None
+    if new_hash:
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        await session.commit()
+        await session.refresh(db_user)
     return db_user
 
 
@@ -52,3 +162,182 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+async def create_item_async(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    session.add(db_item)
+    await session.commit()
+    await session.refresh(db_item)
+    return db_item
+
+
+async def create_items_async(
+    *,
+    session: AsyncSession,
+    items_in: Sequence[ItemCreate],
+    owner_id: uuid.UUID,
+    use_copy: bool = False,
+) -> list[Item]:
+    """
+    Insert the items with multi-row INSERT ... RETURNING statements (one per
+    1000 rows), or with COPY if `use_copy`. Doesn't commit.
+    """
+    db_items = [
+        Item.model_validate(item_in, update={"owner_id": owner_id})
+        for item_in in items_in
+    ]
+    if not db_items:
+        return []
+    if use_copy:
+        # The ids are generated here, so nothing has to be returned
+        connection = await (await session.connection()).get_raw_connection()
+        driver_connection = connection.driver_connection
+        assert driver_connection is not None
+        async with driver_connection.cursor() as cursor:
+            async with cursor.copy(
+                "COPY item (id, title, description, owner_id) FROM STDIN"
+            ) as copy:
+                for item in db_items:
+                    await copy.write_row(
+                        (item.id, item.title, item.description, item.owner_id)
+                    )
+        return db_items
+    # Returning just the ids: the rows are known, and mapping them back to ORM
+    # objects would cost more than the INSERT
+    table = Item.__table__  # type: ignore[attr-defined]
+    result = await session.exec(
+        insert(table).returning(table.c.id),
+        params=[item.model_dump() for item in db_items],
+    )
+    inserted: set[uuid.UUID] = set(result.scalars().all())
+    return [item for item in db_items if item.id in inserted]
+
+
+async def update_item_async(
+    *,
+    session: AsyncSession,
+    id: uuid.UUID,
+    update_dict: dict[str, Any],
+    owner_id: uuid.UUID | None,
+) -> Item | None:
+    """
+    Update the item in one UPDATE ... RETURNING, if owned by `owner_id` (any
+    item if None). None if no such item.
+    """
+    statement = (
+        update(Item)
+        .where(col(Item.id) == id)
+        .values(update_dict)
+        .returning(Item)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    item = (await session.exec(statement)).scalars().first()
+    if item:
+        await session.commit()
+    return item
+
+
+# Rows per statement of update_items_async, keeping its bind parameters well
+# under Postgres' limit of 65535
+_UPDATE_CHUNK_ROWS = 1000
+
+
+async def update_items_async(
+    *,
+    session: AsyncSession,
+    items_in: Sequence[ItemBulkUpdate],
+    owner_id: uuid.UUID | None,
+) -> list[Item]:
+    """
+    Apply each update to the item with its id, if owned by `owner_id` (any
+    item if None), with one UPDATE ... FROM (VALUES ...) RETURNING per 1000
+    rows. Returns the updated items; ids that match no such item are left
+    out. Doesn't commit.
+    """
+    fields = list(ItemUpdate.model_fields)
+    table = Item.__table__  # type: ignore[attr-defined]
+    # Each field is a pair of columns: whether the row sets it, and the value
+    columns: list[ColumnClause[Any]] = [column("id", Uuid)]
+    for name in fields:
+        columns += [column(f"set_{name}", Boolean), column(name, table.c[name].type)]
+    updated: list[Item] = []
+    for start in range(0, len(items_in), _UPDATE_CHUNK_ROWS):
+        rows = []
+        for item_in in items_in[start : start + _UPDATE_CHUNK_ROWS]:
+            update_dict = item_in.model_dump(exclude_unset=True)
+            row: list[Any] = [item_in.id]
+            for name in fields:
+                row += [name in update_dict, update_dict.get(name)]
+            rows.append(tuple(row))
+        new = values(*columns, name="new").data(rows)
+        statement = (
+            update(Item)
+            .where(col(Item.id) == new.c.id)
+            .values(
+                {
+                    name: case((new.c[f"set_{name}"], new.c[name]), else_=table.c[name])
+                    for name in fields
+                }
+            )
+            .returning(Item)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        if owner_id is not None:
+            statement = statement.where(col(Item.owner_id) == owner_id)
+        updated += (await session.exec(statement)).scalars().all()
+    return updated
+
+
+async def delete_items_async(
+    *, session: AsyncSession, ids: Sequence[uuid.UUID], owner_id: uuid.UUID | None
+) -> list[Item]:
+    """
+    Delete the items with these ids, if owned by `owner_id` (any item if
+    None), in one statement. Returns the deleted items. Doesn't commit.
+    """
+    statement = (
+        delete(Item)
+        .where(col(Item.id) == any_(bindparam("ids", list(ids), type_=ARRAY(Uuid))))
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    return list((await session.exec(statement)).scalars().all())
+
+
+def create_api_key(*, session: Session, api_key_in: ApiKeyCreate) -> tuple[ApiKey, str]:
+    """Returns the new row and the key itself, which is not stored."""
+    key = generate_api_key()
+    now = datetime.now(timezone.utc)
+    db_obj = ApiKey.model_validate(
+        api_key_in,
+        update={
+            "prefix": key[:12],
+            "key_hash": hash_api_key(key),
+            "created_at": now,
+            "updated_at": now,
+        },
+    )
+    session.add(db_obj)
+    session.commit()
+    session.refresh(db_obj)
+    return db_obj, key
+
+
+def update_api_key(
+    *, session: Session, db_api_key: ApiKey, api_key_in: ApiKeyUpdate
+) -> ApiKey:
+    api_key_data = api_key_in.model_dump(exclude_unset=True)
+    db_api_key.sqlmodel_update(
+        api_key_data, update={"updated_at": datetime.now(timezone.utc)}
+    )
+    session.add(db_api_key)
+    session.commit()
+    session.refresh(db_api_key)
+    return db_api_key
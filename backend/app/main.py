@@ -1,10 +1,19 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.core.api_keys import api_key_store
+from app.core.auth_cache import invalidation_listener
 from app.core.config import settings
+from app.core.db import async_engine
+from app.core.ratelimit import RateLimitMiddleware, create_backend
+from app.core.replicas import replica_router
+from app.core.security import password_hasher
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,12 +23,39 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:  # noqa: ARG001
+    invalidation_listener.start()
+    api_key_store.start()
+    await replica_router.start()
+    yield
+    await replica_router.stop()
+    api_key_store.stop()
+    invalidation_listener.stop()
+    password_hasher.shutdown()
+    # Pooled async connections are bound to this event loop
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
 
+rate_limit_backend = create_backend()
+
+# Added before CORS so that 429 responses still get CORS headers
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=settings.RATE_LIMIT_RULES,
+        backend=rate_limit_backend,
+        prefix=settings.API_V1_STR,
+    )
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
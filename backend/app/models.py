@@ -1,8 +1,18 @@
 import uuid
+from datetime import datetime
+from typing import Any, Literal
 
 from pydantic import EmailStr
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index
 from sqlmodel import Field, Relationship, SQLModel
 
+# How list endpoints count the rows matching the listing:
+# - "exact": COUNT(*) over the filtered rows, in the page query when possible
+# - "counter": from a counter table maintained by triggers (items only)
+# - "estimate": the planner's row estimate of the table (unfiltered listings)
+# - "none": not counted
+CountStrategy = Literal["exact", "counter", "estimate", "none"]
+
 
 # Shared properties
 class UserBase(SQLModel):
@@ -53,7 +63,12 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None with the "none" count strategy
+    count: int | None
+    # How `count` was obtained; see CountStrategy
+    count_strategy: CountStrategy = "exact"
+    # Pass as `cursor` to get the next page; None on the last page
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -74,6 +89,9 @@ class ItemUpdate(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    # Listing a user's items pages through this index (keyset pagination)
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
@@ -89,7 +107,36 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    # None with the "none" count strategy
+    count: int | None
+    # How `count` was obtained; see CountStrategy
+    count_strategy: CountStrategy = "exact"
+    # Pass as `cursor` to get the next page; None on the last page
+    next_cursor: str | None = None
+
+
+# A row of PATCH /items/bulk: the item to update and the fields to change
+class ItemBulkUpdate(ItemUpdate):
+    id: uuid.UUID
+
+
+# A row of DELETE /items/bulk
+class ItemBulkDelete(SQLModel):
+    id: uuid.UUID
+
+
+# A row of a bulk request that was not applied
+class BulkRowError(SQLModel):
+    # Position of the row in the request, from 0
+    index: int
+    id: uuid.UUID | None = None
+    detail: Any
+
+
+class ItemsBulkPublic(SQLModel):
+    # The items created, updated or deleted
+    data: list[ItemPublic]
+    errors: list[BulkRowError]
 
 
 # Generic message
@@ -111,3 +158,85 @@ class TokenPayload(SQLModel):
 class NewPassword(SQLModel):
     token: str
     new_password: str = Field(min_length=8, max_length=40)
+
+
+# Shared properties
+class ApiKeyBase(SQLModel):
+    label: str = Field(min_length=1, max_length=255)
+    # Endpoint groups the key may call ("tempsave", "ffmpeg", ...), "*" for all
+    scopes: list[str] = Field(default_factory=list)
+    requests_per_minute: int | None = Field(default=None, ge=1)
+    bytes_per_day: int | None = Field(default=None, ge=1, sa_type=BigInteger)
+    is_active: bool = True
+
+
+# Properties to receive on API key creation
+class ApiKeyCreate(ApiKeyBase):
+    pass
+
+
+# Properties to receive on API key update, all are optional
+class ApiKeyUpdate(SQLModel):
+    label: str | None = Field(default=None, min_length=1, max_length=255)
+    scopes: list[str] | None = None
+    requests_per_minute: int | None = Field(default=None, ge=1)
+    bytes_per_day: int | None = Field(default=None, ge=1)
+    is_active: bool | None = None
+
+
+# Database model. Only a SHA-256 of the key is stored; keys are random and
+# high-entropy, so a fast hash is enough and keeps lookups cheap.
+class ApiKey(ApiKeyBase, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    scopes: list[str] = Field(
+        default_factory=list, sa_column=Column(JSON, nullable=False)
+    )
+    prefix: str = Field(max_length=16)
+    key_hash: str = Field(unique=True, index=True, max_length=64)
+    created_at: datetime = Field(sa_type=DateTime(timezone=True))
+    # Bumped on every change; workers refresh their key map incrementally by it
+    updated_at: datetime = Field(sa_type=DateTime(timezone=True), index=True)
+    request_count: int = Field(default=0, sa_type=BigInteger)
+    byte_count: int = Field(default=0, sa_type=BigInteger)
+    last_used_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+
+
+# Properties to return via API, the key itself is never returned again
+class ApiKeyPublic(ApiKeyBase):
+    id: uuid.UUID
+    prefix: str
+    created_at: datetime
+    updated_at: datetime
+    request_count: int
+    byte_count: int
+    last_used_at: datetime | None
+
+
+# Returned once, on creation
+class ApiKeyCreated(ApiKeyPublic):
+    key: str
+
+
+class ApiKeysPublic(SQLModel):
+    data: list[ApiKeyPublic]
+    count: int
+
+
+# Number of items per owner, kept up to date by statement triggers on item
+# (see migration d41b7a9e2f63). Read by the "counter" count strategy.
+class ItemCount(SQLModel, table=True):
+    __tablename__ = "item_count"
+
+    owner_id: uuid.UUID = Field(primary_key=True)
+    count: int = Field(default=0, sa_type=BigInteger)
+
+
+# Token buckets shared between workers by the "postgres" rate limit backend
+class RateLimitBucket(SQLModel, table=True):
+    __tablename__ = "rate_limit_bucket"
+
+    key: str = Field(primary_key=True, max_length=255)
+    tokens: float
+    # Whether the last request took a token
+    allowed: bool
+    updated_at: datetime = Field(sa_type=DateTime(timezone=True))
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.api.endpoints.sendai_livecamera_bs4.archive import ImageArchive
+
+DAY = 24 * 60 * 60
+# 2024-01-01T00:00:00Z
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def make_archive(tmp_path: Path, **kwargs: float) -> ImageArchive:
+    options: dict[str, Any] = {"retention_days": 30, "max_bytes": 1024 * 1024}
+    options.update(kwargs)
+    archive = ImageArchive(tmp_path / "archive", **options)
+    archive.setup()
+    return archive
+
+
+def test_append_skips_unchanged_image(tmp_path: Path) -> None:
+    archive = make_archive(tmp_path)
+    assert archive.append("cam", b"frame-1", BASE) is not None
+    assert archive.append("cam", b"frame-1", BASE + 60) is None
+    assert archive.append("cam", b"frame-2", BASE + 120) is not None
+    # 再起動後も直前のフレームを覚えている
+    assert make_archive(tmp_path).append("cam", b"frame-2", BASE + 180) is None
+
+
+def test_nearest_and_range_across_days(tmp_path: Path) -> None:
+    archive = make_archive(tmp_path)
+    for i in range(10):
+        # 6時間おき: 2日と半日ぶん
+        archive.append("cam", f"frame-{i}".encode(), BASE + i * 6 * 60 * 60)
+
+    record = archive.nearest("cam", BASE + 13 * 60 * 60)
+    assert record is not None
+    assert record.timestamp == BASE + 12 * 60 * 60
+    assert archive.read("cam", record) == b"frame-2"
+
+    # 日付の境目をまたいで前日の最後のフレームが最も近い
+    record = archive.nearest("cam", BASE + DAY - 60)
+    assert record is not None
+    assert archive.read("cam", record) == b"frame-4"
+
+    records = archive.between("cam", BASE + 10 * 60 * 60, BASE + 30 * 60 * 60)
+    assert [archive.read("cam", r) for r in records] == [
+        b"frame-2",
+        b"frame-3",
+        b"frame-4",
+        b"frame-5",
+    ]
+    assert len(archive.between("cam", BASE, BASE + 3 * DAY, limit=3)) == 3
+    assert archive.nearest("other", BASE) is None
+
+
+def test_retention_by_age_and_size(tmp_path: Path) -> None:
+    archive = make_archive(tmp_path, retention_days=2, max_bytes=300)
+    for day in range(5):
+        archive.append("cam", bytes([day]) * 100, BASE + day * DAY)
+
+    assert archive.apply_retention(now=BASE + 4 * DAY) == 3
+    records = archive.between("cam", BASE, BASE + 5 * DAY)
+    # 古い日が年齢で消え、残りもサイズ上限に収まるまで古い順に消える
+    assert [r.timestamp for r in records] == [BASE + 3 * DAY, BASE + 4 * DAY]
+    assert archive.stats()["total_bytes"] <= 300
+
+
+def test_rejects_path_like_camera_id(tmp_path: Path) -> None:
+    archive = make_archive(tmp_path)
+    with pytest.raises(ValueError):
+        archive.nearest("..", BASE)
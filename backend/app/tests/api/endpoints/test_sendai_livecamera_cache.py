@@ -0,0 +1,66 @@
+import time
+
+from app.api.endpoints.sendai_livecamera_bs4.cache import ScrapeCache
+
+
+def wait_for_revalidation(cache: ScrapeCache) -> None:
+    deadline = time.monotonic() + 5
+    while cache.stats()["inflight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_fresh_hit(fixture_server: str) -> None:
+    cache = ScrapeCache(ttl_seconds=60, stale_seconds=60)
+    url = f"{fixture_server}/bridge_hirosebashi.html"
+    first = cache.get(url)
+    assert first["success"]
+    assert first["bridge_info"]["name"] == "広瀬橋"
+    assert cache.get(url) is first
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["parses"]) == (1, 1, 1)
+
+
+def test_stale_hit_is_revalidated_with_not_modified(fixture_server: str) -> None:
+    cache = ScrapeCache(ttl_seconds=0, stale_seconds=60)
+    url = f"{fixture_server}/bridge_hirosebashi.html"
+    first = cache.get(url)
+    # 古い結果をすぐに返し、裏でIf-Modified-Sinceを送って再検証する
+    assert cache.get(url) is first
+    wait_for_revalidation(cache)
+
+    stats = cache.stats()
+    assert stats["stale_hits"] == 1
+    assert stats["revalidations"] == 1
+    assert stats["not_modified"] == 1
+    assert stats["parses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_entries_are_bounded_lru(fixture_server: str) -> None:
+    cache = ScrapeCache(ttl_seconds=60, stale_seconds=60, max_entries=2)
+    first, second, third = (
+        f"{fixture_server}/bridge_hirosebashi.html?camera={n}" for n in range(3)
+    )
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)
+    cache.get(third)
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
+    # 最近使われていないsecondが追い出されている
+    cache.get(first)
+    cache.get(second)
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 4
+
+
+def test_expired_entries_are_purged(fixture_server: str) -> None:
+    cache = ScrapeCache(ttl_seconds=0, stale_seconds=0)
+    cache.get(f"{fixture_server}/bridge_hirosebashi.html?camera=0")
+    cache.get(f"{fixture_server}/bridge_hirosebashi.html?camera=1")
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["expired"] == 1
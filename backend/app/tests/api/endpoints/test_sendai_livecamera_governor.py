@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+import requests
+
+from app.api.endpoints.sendai_livecamera_bs4 import main
+from app.api.endpoints.sendai_livecamera_bs4.governor import (
+    CircuitOpenError,
+    OutboundGovernor,
+    OutboundRejectedError,
+)
+from app.core.api_keys import LOCAL_API_KEY
+
+
+def make_governor(**kwargs: float) -> OutboundGovernor:
+    options = {
+        "rate_per_second": 100.0,
+        "burst": 10,
+        "max_inflight": 2,
+        "failure_threshold": 2,
+        "reset_seconds": 0.2,
+        "acquire_timeout": 0.05,
+    }
+    options.update(kwargs)
+    return OutboundGovernor(**options)  # type: ignore[arg-type]
+
+
+def fail_upstream(governor: OutboundGovernor, url: str) -> None:
+    with pytest.raises(requests.ConnectionError):
+        with governor.request(url):
+            raise requests.ConnectionError("connection refused")
+
+
+def test_max_inflight_per_host() -> None:
+    governor = make_governor()
+    hosts = [governor.acquire("http://camera.example/a.jpg") for _ in range(2)]
+    with pytest.raises(OutboundRejectedError):
+        governor.acquire("http://camera.example/b.jpg")
+    # 別ホストは影響を受けない
+    governor.release(governor.acquire("http://other.example/a.jpg"), failed=False)
+    for host in hosts:
+        governor.release(host, failed=False)
+    assert governor.stats()["camera.example"]["rejected_rate"] == 1
+
+
+def test_circuit_opens_after_consecutive_failures_and_recovers() -> None:
+    governor = make_governor()
+    url = "http://camera.example/page.html"
+    fail_upstream(governor, url)
+    fail_upstream(governor, url)
+    assert governor.stats()["camera.example"]["circuit"] == "open"
+
+    with pytest.raises(CircuitOpenError):
+        governor.acquire(url)
+
+    time.sleep(0.25)
+    with governor.request(url):
+        pass
+    assert governor.stats()["camera.example"]["circuit"] == "closed"
+
+
+def test_client_errors_do_not_open_circuit() -> None:
+    governor = make_governor(failure_threshold=1)
+    response = requests.Response()
+    response.status_code = 404
+    with pytest.raises(requests.HTTPError):
+        with governor.request("http://camera.example/missing.jpg"):
+            response.raise_for_status()
+    assert governor.stats()["camera.example"]["circuit"] == "closed"
+
+
+class FailingStream(httpx.AsyncByteStream):
+    """1チャンク目を返した後に読み取りエラーになる上流"""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield b"\xff\xd8" * 1024
+        raise httpx.ReadError("connection reset")
+
+
+@pytest.mark.parametrize(
+    ("stream", "max_bytes", "error"),
+    [
+        (FailingStream(), 1 << 20, httpx.ReadError),
+        (httpx.ByteStream(b"\x00" * 4096), 1024, RuntimeError),
+    ],
+)
+def test_stream_upstream_closes_and_releases_on_failure(
+    stream: httpx.AsyncByteStream,
+    max_bytes: int,
+    error: type[Exception],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    governor = make_governor(max_inflight=1)
+    monkeypatch.setattr(main, "governor", governor)
+    url = "http://camera.example/live.jpg"
+
+    async def run() -> None:
+        host = await governor.acquire_async(url)
+        upstream = httpx.Response(200, stream=stream)
+        with pytest.raises(error):
+            async for _ in main._stream_upstream(
+                upstream, host, max_bytes, LOCAL_API_KEY
+            ):
+                pass
+
+        assert upstream.is_closed
+
+    asyncio.run(run())
+    assert governor.stats()["camera.example"]["inflight"] == 0
+    # 枠が戻っていれば次のリクエストも通る
+    governor.release(governor.acquire(url), failed=False)
+
+
+@pytest.mark.parametrize("error", [asyncio.CancelledError, ValueError])
+def test_unfinished_probe_does_not_close_circuit(error: type[BaseException]) -> None:
+    governor = make_governor(failure_threshold=1)
+    url = "http://camera.example/page.html"
+    fail_upstream(governor, url)
+    time.sleep(0.25)
+
+    # 試行リクエストが結果の分からないまま終わっても、ブレーカーは閉じない
+    with pytest.raises(error):
+        with governor.request(url):
+            raise error()
+    assert governor.stats()["camera.example"]["circuit"] == "open"
+
+    # 次のリクエストがすぐに試行になり、成功すれば閉じる
+    with governor.request(url):
+        pass
+    assert governor.stats()["camera.example"]["circuit"] == "closed"
@@ -0,0 +1,151 @@
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.api.endpoints.sendai_livecamera_bs4 import imagecache
+from app.api.endpoints.sendai_livecamera_bs4.governor import OutboundGovernor
+from app.api.endpoints.sendai_livecamera_bs4.imagecache import CachedImage, ImageCache
+
+BASE_URL = "http://camera.example"
+
+
+class Upstream:
+    """画像ごとの大きさを決めておき、受けたGETを数える上流"""
+
+    def __init__(self, sizes: dict[str, int]) -> None:
+        self.sizes = sizes
+        self.requests: Counter[str] = Counter()
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests[request.url.path] += 1
+        etag = f'"{request.url.path}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        content = b"\xff" * self.sizes[request.url.path]
+        return httpx.Response(
+            200, content=content, headers={"ETag": etag, "Content-Type": "image/jpeg"}
+        )
+
+
+@pytest.fixture(autouse=True)
+def outbound_governor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        imagecache,
+        "governor",
+        OutboundGovernor(
+            rate_per_second=1000,
+            burst=1000,
+            max_inflight=100,
+            failure_threshold=5,
+            reset_seconds=1,
+            acquire_timeout=1,
+        ),
+    )
+
+
+def make_cache(disk_dir: Path | None, **kwargs: float) -> ImageCache:
+    options = {
+        "max_memory_bytes": 1000,
+        "max_disk_bytes": 10_000,
+        "fresh_seconds": 60.0,
+        "max_entry_bytes": 1000,
+    }
+    options.update(kwargs)
+    return ImageCache(disk_dir=disk_dir, **options)  # type: ignore[arg-type]
+
+
+def get_all(
+    cache: ImageCache, upstream: Upstream, *paths: str
+) -> list[CachedImage | None]:
+    async def run() -> list[CachedImage | None]:
+        transport = httpx.MockTransport(upstream.handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [await cache.get(f"{BASE_URL}{path}", client) for path in paths]
+
+    return asyncio.run(run())
+
+
+def test_memory_hit() -> None:
+    upstream = Upstream({"/a.jpg": 100})
+    cache = make_cache(None)
+    first, second = get_all(cache, upstream, "/a.jpg", "/a.jpg")
+    assert first is not None and first.content == b"\xff" * 100
+    assert second is first
+    assert upstream.requests["/a.jpg"] == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_stale_entry_is_revalidated() -> None:
+    upstream = Upstream({"/a.jpg": 100})
+    cache = make_cache(None, fresh_seconds=0)
+    first, second = get_all(cache, upstream, "/a.jpg", "/a.jpg")
+    assert second is not None and second.content == first.content  # type: ignore[union-attr]
+    assert upstream.requests["/a.jpg"] == 2
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_evicted_entry_is_served_from_disk(tmp_path: Path) -> None:
+    upstream = Upstream({"/a.jpg": 600, "/b.jpg": 600})
+    cache = make_cache(tmp_path)
+    get_all(cache, upstream, "/a.jpg", "/b.jpg")
+    # メモリに収まらないaはディスクに退避されている
+    assert cache.stats()["memory_entries"] == 1
+    assert cache.stats()["disk_entries"] == 1
+
+    (cached,) = get_all(cache, upstream, "/a.jpg")
+    assert cached is not None and cached.size == 600
+    assert upstream.requests["/a.jpg"] == 1
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_entries_are_shared_between_workers(tmp_path: Path) -> None:
+    upstream = Upstream({"/a.jpg": 600, "/b.jpg": 600})
+    writer = make_cache(tmp_path)
+    reader = make_cache(tmp_path)
+    get_all(writer, upstream, "/a.jpg", "/b.jpg")
+
+    (cached,) = get_all(reader, upstream, "/a.jpg")
+    assert cached is not None
+    assert upstream.requests["/a.jpg"] == 1
+    assert reader.stats()["disk_hits"] == 1
+
+
+def test_disk_size_limit_counts_all_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ImageCache, "DISK_SCAN_INTERVAL_SECONDS", 0)
+    upstream = Upstream({f"/{n}.jpg": 600 for n in range(6)})
+    first = make_cache(tmp_path, max_disk_bytes=2000)
+    second = make_cache(tmp_path, max_disk_bytes=2000)
+    # それぞれ2件ずつディスクに退避する（合計2400バイト）
+    get_all(first, upstream, "/0.jpg", "/1.jpg", "/2.jpg")
+    get_all(second, upstream, "/3.jpg", "/4.jpg", "/5.jpg")
+
+    files = list(tmp_path.glob("*.bin"))
+    assert sum(path.stat().st_size for path in files) <= 2000
+    assert second.stats()["disk_evictions"] >= 1
+    assert second.stats()["disk_bytes"] <= 2000
+
+
+def test_oversize_image_is_fetched_once(tmp_path: Path) -> None:
+    upstream = Upstream({"/big.jpg": 5000})
+    cache = make_cache(tmp_path)
+    assert get_all(cache, upstream, "/big.jpg", "/big.jpg") == [None, None]
+    # 2回目は上流に取りに行かず、呼び出し側のストリーミングに任せる
+    assert upstream.requests["/big.jpg"] == 1
+    assert cache.stats()["uncacheable"] == 1
+    assert cache.stats()["uncacheable_skips"] == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_oversize_image_is_retried_after_uncacheable_seconds() -> None:
+    upstream = Upstream({"/big.jpg": 5000})
+    cache = make_cache(None, uncacheable_seconds=0)
+    get_all(cache, upstream, "/big.jpg")
+    upstream.sizes["/big.jpg"] = 100
+    (cached,) = get_all(cache, upstream, "/big.jpg")
+    assert cached is not None and cached.size == 100
+    assert cache.stats()["uncacheable_urls"] == 0
@@ -0,0 +1,209 @@
+import io
+import struct
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+from app.api.endpoints.sendai_livecamera_bs4 import imageprobe
+from app.api.endpoints.sendai_livecamera_bs4.governor import OutboundGovernor
+from app.api.endpoints.sendai_livecamera_bs4.imageprobe import (
+    parse_jpeg_dimensions,
+    probe_image,
+)
+
+FIXTURES_DIR = Path(__file__).parents[2] / "fixtures" / "sendai_livecamera_bs4"
+URL = "http://camera.example/live.jpg"
+
+
+def segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def jpeg(width: int, height: int, sof_marker: int = 0xC0) -> bytes:
+    """APP0・DQT・SOF・SOSだけの最小限のJPEG"""
+    return (
+        b"\xff\xd8"
+        + segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+        + segment(0xDB, b"\x00" + bytes(64))
+        + segment(
+            sof_marker, struct.pack(">BHHB", 8, height, width, 1) + b"\x01\x11\x00"
+        )
+        + segment(0xDA, b"\x01\x01\x00\x00\x3f\x00")
+        + b"\x00" * 32
+        + b"\xff\xd9"
+    )
+
+
+@pytest.mark.parametrize("sof_marker", [0xC0, 0xC2])
+def test_parse_jpeg_dimensions(sof_marker: int) -> None:
+    assert parse_jpeg_dimensions(jpeg(640, 480, sof_marker)) == (640, 480)
+
+
+def test_parse_jpeg_dimensions_of_fixture() -> None:
+    data = (FIXTURES_DIR / "images" / "hirosebashi.jpg").read_bytes()
+    assert parse_jpeg_dimensions(data[: imageprobe.PROBE_RANGE_BYTES]) is not None
+
+
+def test_parse_jpeg_dimensions_skips_fill_bytes() -> None:
+    data = jpeg(320, 240)
+    assert parse_jpeg_dimensions(data[:2] + b"\xff\xff" + data[2:]) == (320, 240)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\x89PNG\r\n\x1a\n" + bytes(32),
+        # SOFの寸法の途中で切れている
+        jpeg(640, 480)[:95],
+        # 長さフィールドの途中で切れている
+        jpeg(640, 480)[:5],
+        # SOFがないままSOSになる
+        b"\xff\xd8"
+        + segment(0xE0, b"JFIF\x00")
+        + segment(0xDA, b"\x00" * 6)
+        + b"\xff\xd9",
+        # DHT(C4)はSOFとみなさない
+        b"\xff\xd8" + segment(0xC4, b"\x00" * 17) + b"\xff\xd9",
+        # 不正な長さ
+        b"\xff\xd8\xff\xe0\x00\x01",
+    ],
+)
+def test_parse_jpeg_dimensions_invalid(data: bytes) -> None:
+    assert parse_jpeg_dimensions(data) is None
+
+
+Handler = Callable[[requests.PreparedRequest], tuple[int, dict[str, str], bytes] | None]
+
+
+class MockAdapter(HTTPAdapter):
+    """handlerの戻り値 (ステータス, ヘッダ, 本体) を返し、Noneなら接続エラーにする"""
+
+    def __init__(self, handler: Handler) -> None:
+        super().__init__()
+        self.handler = handler
+        self.methods: list[str] = []
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, **kwargs: Any
+    ) -> requests.Response:
+        self.methods.append(str(request.method))
+        result = self.handler(request)
+        if result is None:
+            raise requests.ConnectionError("connection reset")
+        status, headers, body = result
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=status,
+            preload_content=False,
+            request_method=request.method,
+        )
+        return self.build_response(request, raw)
+
+
+@pytest.fixture(autouse=True)
+def outbound_governor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        imageprobe,
+        "governor",
+        OutboundGovernor(
+            rate_per_second=1000,
+            burst=1000,
+            max_inflight=10,
+            failure_threshold=100,
+            reset_seconds=1,
+            acquire_timeout=1,
+        ),
+    )
+
+
+def probe(handler: Handler) -> tuple[dict[str, Any], MockAdapter]:
+    adapter = MockAdapter(handler)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    return probe_image(URL, session), adapter
+
+
+IMAGE = jpeg(640, 480) + bytes(imageprobe.PROBE_RANGE_BYTES * 2)
+HEAD_HEADERS = {
+    "Content-Length": str(len(IMAGE)),
+    "Content-Type": "image/jpeg",
+    "ETag": '"v1"',
+    "Last-Modified": "Mon, 19 Oct 2026 00:00:00 GMT",
+}
+
+
+def test_probe_image_with_head_and_range() -> None:
+    def handler(request: requests.PreparedRequest) -> tuple[int, dict[str, str], bytes]:
+        if request.method == "HEAD":
+            return 200, HEAD_HEADERS, b""
+        assert request.headers["Range"] == f"bytes=0-{imageprobe.PROBE_RANGE_BYTES - 1}"
+        body = IMAGE[: imageprobe.PROBE_RANGE_BYTES]
+        return 206, {"Content-Range": f"bytes 0-{len(body) - 1}/{len(IMAGE)}"}, body
+
+    metadata, adapter = probe(handler)
+    assert adapter.methods == ["HEAD", "GET"]
+    assert metadata["size"] == len(IMAGE)
+    assert metadata["etag"] == '"v1"'
+    assert (metadata["width"], metadata["height"]) == (640, 480)
+
+
+def test_probe_image_without_head_support() -> None:
+    def handler(request: requests.PreparedRequest) -> tuple[int, dict[str, str], bytes]:
+        if request.method == "HEAD":
+            return 405, {}, b""
+        body = IMAGE[: imageprobe.PROBE_RANGE_BYTES]
+        return (
+            206,
+            {"Content-Range": f"bytes 0-{len(body) - 1}/{len(IMAGE)}", "ETag": '"v2"'},
+            body,
+        )
+
+    metadata, _ = probe(handler)
+    assert metadata["size"] == len(IMAGE)
+    assert metadata["etag"] == '"v2"'
+    assert metadata["width"] == 640
+
+
+def test_probe_image_without_range_support() -> None:
+    def handler(request: requests.PreparedRequest) -> tuple[int, dict[str, str], bytes]:
+        if request.method == "HEAD":
+            return 405, {}, b""
+        return 200, {"Content-Length": str(len(IMAGE))}, IMAGE
+
+    metadata, _ = probe(handler)
+    assert metadata["size"] == len(IMAGE)
+    assert metadata["height"] == 480
+
+
+@pytest.mark.parametrize("range_response", [None, (500, {}, b"")])
+def test_probe_image_falls_back_to_head_when_range_fails(
+    range_response: tuple[int, dict[str, str], bytes] | None,
+) -> None:
+    def handler(
+        request: requests.PreparedRequest,
+    ) -> tuple[int, dict[str, str], bytes] | None:
+        if request.method == "HEAD":
+            return 200, HEAD_HEADERS, b""
+        return range_response
+
+    metadata, _ = probe(handler)
+    assert metadata["size"] == len(IMAGE)
+    assert metadata["etag"] == '"v1"'
+    assert metadata["width"] is None and metadata["height"] is None
+
+
+def test_probe_image_raises_when_head_and_range_fail() -> None:
+    def handler(
+        request: requests.PreparedRequest,
+    ) -> tuple[int, dict[str, str], bytes] | None:
+        return None if request.method == "GET" else (404, {}, b"")
+
+    with pytest.raises(requests.ConnectionError):
+        probe(handler)
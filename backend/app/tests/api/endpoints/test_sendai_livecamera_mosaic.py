@@ -0,0 +1,69 @@
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.api.endpoints.sendai_livecamera_bs4.mosaic import (
+    MISSING_TILE_COLOR,
+    MosaicRenderer,
+    MosaicSpec,
+    compose,
+    decode_tile,
+)
+
+
+def make_jpeg(color: tuple[int, int, int], size: tuple[int, int] = (640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def test_decode_tile_fits_tile_size() -> None:
+    tile = decode_tile(make_jpeg((200, 0, 0), size=(1280, 480)), 64, 36)
+    assert tile is not None
+    assert tile.shape == (36, 64, 3)
+    assert abs(int(tile[0, 0, 0]) - 200) < 8
+    assert decode_tile(b"not an image", 64, 36) is None
+
+
+def test_compose_places_tiles_row_major() -> None:
+    spec = MosaicSpec(columns=2, tile_width=4, tile_height=3)
+    tiles = [np.full((3, 4, 3), value, dtype=np.uint8) for value in (10, 20, 30)]
+    canvas = compose([*tiles, None], spec)
+    assert canvas.shape == (6, 8, 3)
+    assert canvas[0, 0, 0] == 10
+    assert canvas[0, 4, 0] == 20
+    assert canvas[3, 0, 0] == 30
+    assert tuple(canvas[5, 7]) == MISSING_TILE_COLOR
+
+
+def test_spec_pixels_counts_empty_cells() -> None:
+    spec = MosaicSpec(columns=3, tile_width=320, tile_height=180)
+    # 4枚なら2行3列のキャンバスになる
+    assert spec.pixels(4) == 2 * 3 * 320 * 180
+    canvas = compose([None] * 4, spec)
+    assert spec.pixels(4) == canvas.shape[0] * canvas.shape[1]
+
+
+def test_render_is_cached_by_source_tags() -> None:
+    asyncio.run(_render_is_cached_by_source_tags())
+
+
+async def _render_is_cached_by_source_tags() -> None:
+    renderer = MosaicRenderer(max_workers=1, max_cached=4)
+    spec = MosaicSpec(columns=2, tile_width=32, tile_height=18)
+    try:
+        sources = [(make_jpeg((0, 0, 255)), "a"), (None, "-")]
+        first = await renderer.render(sources, spec)
+        second = await renderer.render(sources, spec)
+        assert second is first
+        assert first.missing == [1]
+        assert Image.open(io.BytesIO(first.content)).size == (64, 18)
+        changed = await renderer.render(
+            [(make_jpeg((0, 255, 0)), "b"), (None, "-")], spec
+        )
+        assert changed.etag != first.etag
+        assert renderer.stats()["renders"] == 2
+    finally:
+        renderer.shutdown()
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+
+from app.api.endpoints.sendai_livecamera_bs4.parser import (
+    PARSERS,
+    parse_bridge_page,
+    resolve_engine,
+)
+
+FIXTURES_DIR = Path(__file__).parents[2] / "fixtures" / "sendai_livecamera_bs4"
+PAGE_URL = "https://example.com/livecamera/bridge.html"
+
+
+@pytest.mark.parametrize("engine", sorted(PARSERS))
+def test_parse_bridge_page(engine: str) -> None:
+    content = (FIXTURES_DIR / "bridge_hirosebashi.html").read_bytes()
+    page = parse_bridge_page(content, PAGE_URL, engine=engine)
+    assert page == {
+        "name": "広瀬橋",
+        "capture_date": "3/26 12:30",
+        "location": "仙台市太白区 広瀬川",
+        "image_urls": ["https://example.com/livecamera/images/hirosebashi.jpg"],
+    }
+
+
+@pytest.mark.parametrize("engine", sorted(PARSERS))
+def test_parse_bridge_page_absolute_image_path(engine: str) -> None:
+    content = (FIXTURES_DIR / "bridge_nagamachi.html").read_bytes()
+    page = parse_bridge_page(content, PAGE_URL, engine=engine)
+    assert page["name"] == "長町大橋"
+    assert page["image_urls"] == [
+        "https://example.com/livecamera/images/nagamachi.JPEG"
+    ]
+
+
+def test_resolve_engine() -> None:
+    assert resolve_engine("auto") in PARSERS
+    assert resolve_engine("bs4") == "bs4"
+    with pytest.raises(ValueError):
+        resolve_engine("unknown")
@@ -0,0 +1,105 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from app.api.endpoints.sendai_livecamera_bs4.main import CameraRegister
+from app.api.endpoints.sendai_livecamera_bs4.poller import CameraPoller
+
+FIXTURES_DIR = Path(__file__).parents[2] / "fixtures" / "sendai_livecamera_bs4"
+
+
+def make_poller(directory: Path) -> CameraPoller:
+    poller = CameraPoller(directory)
+    poller.setup()
+    return poller
+
+
+def test_poll_camera(fixture_server: str, tmp_path: Path) -> None:
+    poller = make_poller(tmp_path)
+    camera = poller.registry.register(
+        f"{fixture_server}/bridge_hirosebashi.html",
+        interval_seconds=60,
+        camera_id="hirose",
+    )
+
+    snapshot = asyncio.run(poller.poll_camera(camera))
+
+    assert snapshot is not None
+    assert snapshot.bridge_info["name"] == "広瀬橋"
+    assert snapshot.image == (FIXTURES_DIR / "images" / "hirosebashi.jpg").read_bytes()
+    assert snapshot.images[0]["width"] == 64
+    assert "content" not in snapshot.images[0]
+    assert poller.store.get("hirose") is snapshot
+
+
+def test_only_one_leader_and_followers_read_snapshots(
+    fixture_server: str, tmp_path: Path
+) -> None:
+    leader = make_poller(tmp_path)
+    follower = make_poller(tmp_path)
+    assert leader.try_acquire_leadership()
+    assert not follower.try_acquire_leadership()
+
+    follower.registry.register(
+        f"{fixture_server}/bridge_hirosebashi.html",
+        interval_seconds=60,
+        camera_id="hirose",
+    )
+    asyncio.run(leader.poll_due())
+    assert follower.store.get("hirose") is None
+
+    follower.store.sync_from_disk()
+    snapshot = follower.store.get("hirose")
+    assert snapshot is not None
+    assert snapshot.bridge_info["location"] == "仙台市太白区 広瀬川"
+    assert snapshot.image == leader.store.get("hirose").image  # type: ignore[union-attr]
+
+    leader.release_leadership()
+    assert follower.try_acquire_leadership()
+    follower.release_leadership()
+
+
+def test_unregistered_camera_snapshot_is_removed(
+    fixture_server: str, tmp_path: Path
+) -> None:
+    poller = make_poller(tmp_path)
+    poller.registry.register(
+        f"{fixture_server}/bridge_hirosebashi.html",
+        interval_seconds=60,
+        camera_id="hirose",
+    )
+    asyncio.run(poller.poll_due())
+    assert poller.store.get("hirose") is not None
+
+    assert poller.registry.unregister("hirose")
+    asyncio.run(poller.poll_due())
+    assert poller.store.get("hirose") is None
+    assert not poller.registry.unregister("hirose")
+
+
+@pytest.mark.parametrize(
+    "camera_id", ["../cameras", "a/b", "..", "", "x" * 65, "広瀬橋"]
+)
+def test_register_rejects_unsafe_camera_id(camera_id: str, tmp_path: Path) -> None:
+    poller = make_poller(tmp_path)
+    with pytest.raises(ValidationError):
+        CameraRegister(url="http://camera.example/page.html", id=camera_id)
+    with pytest.raises(ValueError):
+        poller.registry.register("http://camera.example/page.html", 60, camera_id)
+    assert poller.registry.load() == {}
+
+
+@pytest.mark.parametrize("interval_seconds", [0, -60, 9.9])
+def test_register_rejects_short_interval(
+    interval_seconds: float, tmp_path: Path
+) -> None:
+    poller = make_poller(tmp_path)
+    with pytest.raises(ValidationError):
+        CameraRegister(
+            url="http://camera.example/page.html", interval_seconds=interval_seconds
+        )
+    with pytest.raises(ValueError):
+        poller.registry.register("http://camera.example/page.html", interval_seconds)
+    assert poller.registry.load() == {}
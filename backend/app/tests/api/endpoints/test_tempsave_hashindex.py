@@ -0,0 +1,208 @@
+import asyncio
+import io
+import random
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageDraw
+
+from app.api.endpoints.tempsave import hashindex
+from app.api.endpoints.tempsave import main as tempsave
+from app.api.endpoints.tempsave.hashindex import StoredImageIndex
+from app.core.api_keys import ApiKeyRecord, api_key_store
+from app.core.imagehash import HammingIndex, compute_hashes
+
+
+def make_jpeg(seed: int, overlay: str = "", quality: int = 90) -> bytes:
+    rng = np.random.default_rng(seed)
+    pixels = (rng.random((24, 32, 3)) * 255).astype("uint8")
+    image = Image.fromarray(pixels).resize((640, 480), Image.Resampling.BICUBIC)
+    if overlay:
+        ImageDraw.Draw(image).text((5, 5), overlay, fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_hamming_index_probe_matches_scan() -> None:
+    rnd = random.Random(0)
+    index = HammingIndex()
+    values = {str(i): rnd.getrandbits(64) for i in range(5000)}
+    for key, value in values.items():
+        index.add(key, value)
+    # 既知のハッシュから数ビットだけ変えたもの
+    base = values["42"]
+    near = {key: base ^ ((1 << bits) - 1) for bits, key in enumerate("abcdefgh")}
+    for key, value in near.items():
+        index.add(key, value)
+
+    for distance in (0, 3, 7, 12):
+        expected = sorted(
+            (key, (value ^ base).bit_count())
+            for key, value in [*values.items(), *near.items()]
+            if (value ^ base).bit_count() <= distance
+        )
+        assert sorted(index.query(base, distance)) == expected
+
+    index.remove("a")
+    assert "a" not in [key for key, _ in index.query(base, 12)]
+
+
+def test_near_duplicate_survives_reencode_and_overlay() -> None:
+    original = compute_hashes(make_jpeg(1))
+    reencoded = compute_hashes(make_jpeg(1, overlay="2024-01-01 12:00:00", quality=50))
+    other = compute_hashes(make_jpeg(2))
+    assert original and reencoded and other
+    assert (original.phash ^ reencoded.phash).bit_count() <= 6
+    assert (original.phash ^ other.phash).bit_count() > 16
+    assert compute_hashes(b"not an image") is None
+
+
+def test_stored_image_index_is_shared_through_log(tmp_path: Path) -> None:
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    (files_dir / "existing.jpg").write_bytes(make_jpeg(1))
+    (files_dir / "notes.txt").write_text("hello")
+    log_path = tmp_path / "hashes.log"
+
+    # 既存のファイルはログがない場合に取り込まれる
+    writer = StoredImageIndex(log_path, files_dir)
+    reader = StoredImageIndex(log_path, files_dir)
+    hashes = compute_hashes(make_jpeg(1, overlay="overlay"))
+    assert hashes is not None
+    assert [name for name, _ in writer.find(hashes, 6)] == ["existing.jpg"]
+
+    # 別ワーカーで追加・削除されたものも見える
+    writer.add("copy.jpg", hashes)
+    assert {name for name, _ in reader.find(hashes, 6)} == {"existing.jpg", "copy.jpg"}
+    writer.remove("existing.jpg")
+    assert [name for name, _ in reader.find(hashes, 6)] == ["copy.jpg"]
+    assert reader.get("notes.txt") is None
+
+
+def test_hamming_index_compacts_tombstones() -> None:
+    rnd = random.Random(1)
+    index = HammingIndex()
+    values = {str(i): rnd.getrandbits(64) for i in range(2000)}
+    # 上書きと削除を繰り返しても、tombstoneは溜まり続けない
+    for _ in range(3):
+        for key, value in values.items():
+            index.add(key, value)
+    for key in list(values)[:1500]:
+        index.remove(key)
+        del values[key]
+    assert len(index._keys) < 2 * HammingIndex.COMPACT_MIN_TOMBSTONES + len(values)
+    assert len(index) == len(values)
+    assert dict(index.items()) == values
+
+    base = values["1999"]
+    expected = sorted(
+        (key, (value ^ base).bit_count())
+        for key, value in values.items()
+        if (value ^ base).bit_count() <= 12
+    )
+    assert sorted(index.query(base, 12)) == expected
+
+
+def test_stored_image_index_escapes_filenames(tmp_path: Path) -> None:
+    log_path = tmp_path / "hashes.log"
+    hashes = compute_hashes(make_jpeg(1))
+    assert hashes is not None
+    writer = StoredImageIndex(log_path, tmp_path)
+    writer.add("a\tb\nc.jpg", hashes)
+    writer.add("d e.jpg", hashes)
+    writer.remove("d e.jpg")
+
+    reader = StoredImageIndex(log_path, tmp_path)
+    assert reader.get("a\tb\nc.jpg") == hashes
+    assert reader.get("d e.jpg") is None
+    assert len(log_path.read_text().splitlines()) == 3
+
+
+def test_stored_image_index_reads_legacy_log(tmp_path: Path) -> None:
+    log_path = tmp_path / "hashes.log"
+    log_path.write_text("+old.jpg\t00000000000000ff\t0000000000000f0f\n-gone.jpg\n")
+    index = StoredImageIndex(log_path, tmp_path)
+    hashes = index.get("old.jpg")
+    assert hashes is not None
+    assert (hashes.dhash, hashes.phash) == (0xFF, 0xF0F)
+
+
+def test_stored_image_index_compacts_log(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(hashindex, "COMPACT_MIN_LINES", 20)
+    log_path = tmp_path / "hashes.log"
+    hashes = compute_hashes(make_jpeg(1))
+    assert hashes is not None
+    writer = StoredImageIndex(log_path, tmp_path)
+    reader = StoredImageIndex(log_path, tmp_path)
+    writer.add("kept.jpg", hashes)
+    reader.sync()
+
+    for n in range(30):
+        writer.add(f"{n}.jpg", hashes)
+        writer.remove(f"{n}.jpg")
+    # 書き直し後のログは登録件数ぶん＋書き直し後の追記だけ
+    assert len(log_path.read_text().splitlines()) < 20
+
+    # 書き直し前の位置まで読んでいたワーカーも、読み直して同じ内容になる
+    writer.add("new.jpg", hashes)
+    assert {name for name, _ in reader.find(hashes, 0)} == {"kept.jpg", "new.jpg"}
+    assert reader.get("0.jpg") is None
+
+
+class FakeRequest:
+    def url_for(self, name: str, **params: str) -> str:
+        return f"http://testserver/{params['filename']}"
+
+
+@pytest.fixture
+def temp_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    files_dir = tmp_path / "temp_uploads"
+    files_dir.mkdir()
+    monkeypatch.setattr(tempsave, "TEMP_DIR", files_dir)
+    monkeypatch.setattr(tempsave, "UPLOAD_TMP_DIR", files_dir / ".partial")
+    monkeypatch.setattr(
+        tempsave, "image_index", StoredImageIndex(tmp_path / "hashes.log", files_dir)
+    )
+    monkeypatch.setattr(api_key_store, "add_bytes", lambda *args: None)
+    return files_dir
+
+
+def upload(filename: str, data: bytes, dedupe: str = "off") -> dict[str, Any]:
+    file = UploadFile(io.BytesIO(data), filename=filename, size=len(data))
+    api_key = ApiKeyRecord.__new__(ApiKeyRecord)
+    return asyncio.run(
+        tempsave.upload_file(file, FakeRequest(), dedupe, api_key)  # type: ignore[arg-type]
+    )
+
+
+def test_upload_reject_keeps_existing_file(temp_dir: Path) -> None:
+    original = make_jpeg(1)
+    upload("a.jpg", original)
+    upload("b.jpg", make_jpeg(2))
+
+    # 同名で再アップロードした画像が重複として拒否されても、既存のファイルは残る
+    with pytest.raises(HTTPException) as exc_info:
+        upload("a.jpg", make_jpeg(2, quality=50), dedupe="reject")
+    assert exc_info.value.status_code == 409
+    assert (temp_dir / "a.jpg").read_bytes() == original
+    assert list((temp_dir / ".partial").iterdir()) == []
+
+
+def test_upload_alias_is_not_overwritten(temp_dir: Path) -> None:
+    original = make_jpeg(1)
+    upload("a.jpg", original)
+    assert (
+        upload("b.jpg", make_jpeg(1, quality=50), dedupe="alias")["alias_of"] == "a.jpg"
+    )
+    assert (temp_dir / "b.jpg").read_bytes() == original
+
+    # エイリアスを上書きしても、リンク元の内容は変わらない
+    upload("b.jpg", b"replaced")
+    assert (temp_dir / "a.jpg").read_bytes() == original
+    assert (temp_dir / "b.jpg").read_bytes() == b"replaced"
@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def create_api_key(
+    client: TestClient, superuser_token_headers: dict[str, str], **data: object
+) -> dict[str, object]:
+    r = client.post(
+        f"{settings.API_V1_STR}/api-keys/",
+        headers=superuser_token_headers,
+        json={"label": "test client", **data},
+    )
+    assert r.status_code == 200
+    created: dict[str, object] = r.json()
+    return created
+
+
+def test_create_api_key_returns_key_once(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    created = create_api_key(client, superuser_token_headers, scopes=["hello"])
+    assert str(created["key"]).startswith(str(created["prefix"]))
+    r = client.get(
+        f"{settings.API_V1_STR}/api-keys/{created['id']}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert "key" not in r.json()
+    assert "key_hash" not in r.json()
+
+
+def test_create_api_key_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/api-keys/",
+        headers=normal_user_token_headers,
+        json={"label": "test client"},
+    )
+    assert r.status_code == 403
+
+
+def test_api_key_scopes_and_revocation(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    created = create_api_key(client, superuser_token_headers, scopes=["hello"])
+    headers = {"X-API-Key": str(created["key"])}
+    with patch("app.core.config.settings.ENVIRONMENT", "staging"):
+        r = client.get(f"{settings.API_V1_STR}/hello/", headers=headers)
+        assert r.status_code == 200
+        r = client.post(f"{settings.API_V1_STR}/tempsave/cleanup", headers=headers)
+        assert r.status_code == 403
+
+        r = client.delete(
+            f"{settings.API_V1_STR}/api-keys/{created['id']}",
+            headers=superuser_token_headers,
+        )
+        assert r.status_code == 200
+        r = client.get(f"{settings.API_V1_STR}/hello/", headers=headers)
+        assert r.status_code == 403
+
+
+def test_api_key_request_quota(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    created = create_api_key(
+        client, superuser_token_headers, scopes=["*"], requests_per_minute=2
+    )
+    headers = {"X-API-Key": str(created["key"])}
+    with (
+        patch("app.core.config.settings.ENVIRONMENT", "staging"),
+        patch("app.core.api_keys.time.time", return_value=1_800_000_030.0),
+    ):
+        statuses = [
+            client.get(f"{settings.API_V1_STR}/hello/", headers=headers).status_code
+            for _ in range(2)
+        ]
+        r = client.get(f"{settings.API_V1_STR}/hello/", headers=headers)
+    assert statuses == [200, 200]
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "30"
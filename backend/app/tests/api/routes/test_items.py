@@ -1,6 +1,9 @@
+import json
 import uuid
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlmodel import Session
 
 from app.core.config import settings
@@ -97,6 +100,27 @@ def test_update_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_update_item_partial(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    item = client.post(
+        url,
+        headers=normal_user_token_headers,
+        json={"title": "Foo", "description": "Bar"},
+    ).json()
+    response = client.put(
+        f"{url}{item['id']}", headers=normal_user_token_headers, json={"title": "Baz"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {**item, "title": "Baz"}
+    response = client.put(
+        f"{url}{item['id']}", headers=normal_user_token_headers, json={}
+    )
+    assert response.status_code == 200
+    assert response.json() == {**item, "title": "Baz"}
+
+
 def test_update_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -162,3 +186,267 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_read_items_with_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        create_random_item(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"limit": 1000},
+    )
+    everything = r.json()
+    ids: list[str] = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert r.status_code == 200
+        page = r.json()
+        assert page["count"] == everything["count"]
+        ids += [item["id"] for item in page["data"]]
+        if page["next_cursor"] is None:
+            break
+        params = {"limit": 2, "cursor": page["next_cursor"]}
+    assert ids == [item["id"] for item in everything["data"]]
+    assert ids == sorted(ids)
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    for params in ({"cursor": "not-a-cursor"}, {"cursor": "WyJ1c2VyIiwiYSIsImIiXQ"}):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid cursor"
+
+
+def test_read_items_count_strategies(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    def read(count_strategy: str, **params: str | int) -> dict[str, object]:
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params={"count_strategy": count_strategy, **params},
+        )
+        assert r.status_code == 200
+        content: dict[str, object] = r.json()
+        return content
+
+    created = [
+        client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": f"counted {i}"},
+        ).json()
+        for i in range(3)
+    ]
+    exact = read("exact", limit=1)
+    assert exact["count_strategy"] == "exact"
+    counter = read("counter")
+    assert counter["count_strategy"] == "counter"
+    assert counter["count"] == exact["count"]
+    # Estimates only apply to the unfiltered superuser listing
+    assert read("estimate") == counter
+    none = read("none")
+    assert none["count"] is None
+    assert none["count_strategy"] == "none"
+    # Past the last page the window has no row to carry the count
+    assert read("exact", skip=10_000)["count"] == exact["count"]
+
+    client.delete(
+        f"{settings.API_V1_STR}/items/{created[0]['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert read("counter")["count"] == exact["count"] - 1  # type: ignore[operator]
+
+
+def test_read_items_estimated_count(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    db.execute(text("ANALYZE item"))
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"count_strategy": "estimate"},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["count_strategy"] == "estimate"
+    assert content["count"] >= 1
+
+
+def test_create_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    rows = [
+        {"title": "bulk 0"},
+        {"title": ""},
+        {"title": "bulk 2", "description": "second"},
+        # Valid, but rejected by Postgres
+        {"title": "bulk \x00"},
+        {"title": "bulk 4"},
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=rows,
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert [item["title"] for item in content["data"]] == ["bulk 0", "bulk 2", "bulk 4"]
+    assert content["data"][1]["description"] == "second"
+    assert [error["index"] for error in content["errors"]] == [1, 3]
+    assert content["errors"][0]["detail"][0]["loc"] == ["title"]
+    assert "NUL" in content["errors"][1]["detail"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/items/{content['data'][0]['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 200
+
+
+def test_create_items_bulk_ndjson(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Batches of 2, written with COPY
+    monkeypatch.setattr(settings, "ITEM_BULK_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "ITEM_BULK_COPY_MIN_ROWS", 2)
+    monkeypatch.setattr(settings, "ITEM_BULK_MAX_ROWS", 6)
+    lines = [json.dumps({"title": f"ndjson {i}"}) for i in range(7)]
+    lines[1] = "{not json"
+    # Fails the COPY of its batch, whose other row is then inserted alone
+    lines[4] = json.dumps({"title": "ndjson \x00"})
+    body = "\n".join(lines[:3]) + "\n\n" + "\n".join(lines[3:])
+
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers={**normal_user_token_headers, "Content-Type": "application/x-ndjson"},
+        content=body.encode(),
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert [item["title"] for item in content["data"]] == [
+        "ndjson 0",
+        "ndjson 2",
+        "ndjson 3",
+        "ndjson 5",
+    ]
+    assert content["errors"] == [
+        {"index": 1, "id": None, "detail": "Invalid JSON"},
+        {"index": 4, "id": None, "detail": content["errors"][1]["detail"]},
+        {"index": 6, "id": None, "detail": "Too many rows, at most 6"},
+    ]
+    ids = [item["id"] for item in content["data"]]
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"limit": 10_000},
+    )
+    assert set(ids) <= {item["id"] for item in r.json()["data"]}
+
+
+def test_create_items_bulk_invalid_body(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "ITEM_BULK_MAX_ROWS", 2)
+    url = f"{settings.API_V1_STR}/items/bulk"
+    r = client.post(url, headers=normal_user_token_headers, json={"title": "Foo"})
+    assert r.status_code == 400
+    r = client.post(url, headers=normal_user_token_headers, content=b"[")
+    assert r.status_code == 400
+    r = client.post(url, headers=normal_user_token_headers, json=[{"title": "a"}] * 3)
+    assert r.status_code == 413
+
+
+def test_update_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    own = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=[{"title": "before 0", "description": "kept"}, {"title": "before 1"}],
+    ).json()["data"]
+    other = create_random_item(db)
+    missing = uuid.uuid4()
+    rows = [
+        {"id": own[0]["id"], "title": "after 0"},
+        {"id": own[1]["id"], "description": "added"},
+        {"id": str(other.id), "title": "stolen"},
+        {"id": str(missing), "title": "nothing"},
+        {"id": own[0]["id"], "title": "again"},
+        {"title": "no id"},
+    ]
+    r = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=rows,
+    )
+    assert r.status_code == 200
+    content = r.json()
+    updated = {item["id"]: item for item in content["data"]}
+    assert updated[own[0]["id"]]["title"] == "after 0"
+    assert updated[own[0]["id"]]["description"] == "kept"
+    assert updated[own[1]["id"]]["title"] == "before 1"
+    assert updated[own[1]["id"]]["description"] == "added"
+    assert len(updated) == 2
+    errors = {error["index"]: error for error in content["errors"]}
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert errors[2]["detail"] == "Not enough permissions"
+    assert errors[3]["detail"] == "Item not found"
+    assert errors[4]["detail"] == "Duplicate item id"
+    db.refresh(other)
+    assert other.title != "stolen"
+
+
+def test_delete_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    own = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=[{"title": "doomed 0"}, {"title": "doomed 1"}],
+    ).json()["data"]
+    other = create_random_item(db)
+    r = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=[
+            {"id": own[0]["id"]},
+            {"id": str(other.id)},
+            {"id": own[1]["id"]},
+            {"id": own[1]["id"]},
+            {"id": str(uuid.uuid4())},
+        ],
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert {item["id"] for item in content["data"]} == {own[0]["id"], own[1]["id"]}
+    assert [(error["index"], error["detail"]) for error in content["errors"]] == [
+        (1, "Not enough permissions"),
+        (3, "Duplicate item id"),
+        (4, "Item not found"),
+    ]
+    r = client.get(
+        f"{settings.API_V1_STR}/items/{own[0]['id']}",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 404
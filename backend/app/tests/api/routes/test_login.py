@@ -3,6 +3,7 @@ from unittest.mock import patch
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.core.auth_cache import token_cache
 from app.core.config import settings
 from app.core.security import verify_password
 from app.crud import create_user
@@ -45,6 +46,32 @@ def test_use_access_token(
     assert "email" in result
 
 
+def test_repeated_access_token_is_served_from_cache(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    token_cache.clear()
+    hits = token_cache.stats()["hits"]
+    for _ in range(3):
+        r = client.post(
+            f"{settings.API_V1_STR}/login/test-token",
+            headers=superuser_token_headers,
+        )
+        assert r.status_code == 200
+    # First use is deferred by the doorkeeper, the second admits, the third hits
+    assert token_cache.stats()["hits"] == hits + 1
+
+
+def test_invalid_access_token_is_not_cached(client: TestClient) -> None:
+    entries = token_cache.stats()["entries"]
+    for _ in range(3):
+        r = client.post(
+            f"{settings.API_V1_STR}/login/test-token",
+            headers={"Authorization": "Bearer not-a-token"},
+        )
+        assert r.status_code == 403
+    assert token_cache.stats()["entries"] == entries
+
+
 def test_recovery_password(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_db_pool_metrics(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool/metrics/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    metrics = r.json()
+    assert metrics["sync"]["pool_size"] == settings.DB_POOL_SIZE
+    assert metrics["async"]["checkouts"] > 0
+
+
+def test_db_pool_metrics_requires_superuser(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool/metrics/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
@@ -6,8 +6,9 @@ from sqlmodel import Session, delete
 
 from app.core.config import settings
 from app.core.db import engine, init_db
-from app.main import app
-from app.models import Item, User
+from app.core.ratelimit import MemoryBackend
+from app.main import app, rate_limit_backend
+from app.models import ApiKey, Item, User
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -21,9 +22,18 @@ def db() -> Generator[Session, None, None]:
         session.execute(statement)
         statement = delete(User)
         session.execute(statement)
+        statement = delete(ApiKey)
+        session.execute(statement)
         session.commit()
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limits() -> None:
+    # Tests log in far more often than the login rate limit allows
+    if isinstance(rate_limit_backend, MemoryBackend):
+        rate_limit_backend.clear()
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -0,0 +1,33 @@
+import uuid
+
+from app.core.auth_cache import INVALIDATE_ALL, Principal, PrincipalCache
+
+
+def make_principal(is_active: bool = True) -> Principal:
+    return Principal(id=uuid.uuid4(), is_active=is_active, is_superuser=False)
+
+
+def test_put_after_invalidation_is_dropped() -> None:
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    principal = make_principal()
+    sub = str(principal.id)
+
+    # A miss reads the row, then the user is deactivated before the put
+    assert cache.get(sub) is None
+    generation = cache.generation()
+    cache.invalidate(sub)
+    cache.put(sub, principal, generation)
+    assert cache.get(sub) is None
+    assert cache.stats()["stale_puts"] == 1
+
+    cache.put(sub, principal, cache.generation())
+    assert cache.get(sub) == principal
+
+
+def test_invalidate_all_drops_entries() -> None:
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    principals = [make_principal() for _ in range(3)]
+    for principal in principals:
+        cache.put(str(principal.id), principal, cache.generation())
+    cache.invalidate(INVALIDATE_ALL)
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import Engine, create_engine, exc, text
+
+from app.core.db_pool import InstrumentedQueuePool, instrument, pool_metrics
+
+
+def make_engine() -> Engine:
+    engine = create_engine(
+        "sqlite://",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    instrument(engine)
+    return engine
+
+
+def test_checkouts_and_timeouts_are_counted() -> None:
+    engine = make_engine()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        metrics = pool_metrics(engine)
+        assert metrics["checked_out"] == 1
+        assert metrics["connects"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    metrics = pool_metrics(engine)
+    assert metrics["checkouts"] == 1
+    assert metrics["timeouts"] == 1
+    assert metrics["checked_out"] == 0
+    assert metrics["checked_in"] == 1
+    assert metrics["max_checked_out"] == 1
+
+
+def test_metrics_survive_dispose() -> None:
+    engine = make_engine()
+    with engine.connect() as conn:
+        conn.invalidate()
+    engine.dispose()
+    with engine.connect():
+        pass
+
+    metrics = pool_metrics(engine)
+    assert metrics["checkouts"] == 2
+    assert metrics["invalidations"] == 1
+    assert metrics["connects"] == 2
@@ -0,0 +1,67 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, delete, func, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.pipeline import run_pipelined
+from app.models import Item, ItemPublic, User
+
+
+@pytest.mark.parametrize("pipeline", [True, False])
+def test_run_pipelined(pipeline: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "DB_PIPELINE", pipeline)
+
+    async def run() -> None:
+        async with AsyncSession(async_engine) as session:
+            owner_id = (await session.exec(select(User.id).limit(1))).one()
+            ids = [uuid.uuid4(), uuid.uuid4()]
+            inserted, page, count, deleted = await run_pipelined(
+                session,
+                [
+                    insert(Item).values(
+                        [
+                            {"id": id, "title": "pipelined", "owner_id": owner_id}
+                            for id in ids
+                        ]
+                    ),
+                    select(Item).where(col(Item.id).in_(ids)).order_by(col(Item.id)),
+                    select(func.count()).select_from(Item).where(col(Item.id).in_(ids)),
+                    delete(Item).where(col(Item.id) == ids[0]).returning(col(Item.id)),
+                ],
+            )
+            assert inserted.rows == []
+            assert [item.id for item in page.models(ItemPublic)] == sorted(ids)
+            assert count.scalar() == 2
+            assert deleted.rows == [(ids[0],)]
+            # Same transaction as the session's own statements
+            remaining = await session.exec(select(Item.id).where(col(Item.id).in_(ids)))
+            assert remaining.all() == [ids[1]]
+            await session.rollback()
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_run_pipelined_error() -> None:
+    async def run() -> None:
+        async with AsyncSession(async_engine) as session:
+            with pytest.raises(IntegrityError):
+                await run_pipelined(
+                    session,
+                    [
+                        text("SELECT 1"),
+                        insert(Item).values(title="orphan", owner_id=uuid.uuid4()),
+                    ],
+                )
+            await session.rollback()
+            (result,) = await run_pipelined(session, [text("SELECT 1")])
+            assert result.scalar() == 1
+        await async_engine.dispose()
+
+    asyncio.run(run())
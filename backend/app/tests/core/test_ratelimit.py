@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import RateLimitRule
+from app.core.ratelimit import MemoryBackend, RateLimitMiddleware
+
+
+def make_client(rules: list[RateLimitRule]) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/v1/{path:path}")
+    @app.post("/api/v1/{path:path}")
+    def endpoint() -> dict[str, bool]:
+        return {"ok": True}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=rules,
+        backend=MemoryBackend(max_keys=100),
+        prefix="/api/v1",
+    )
+    return TestClient(app)
+
+
+def test_rule_limits_matching_requests() -> None:
+    client = make_client(
+        [RateLimitRule(path="/login/", methods=["POST"], requests=2, per_seconds=60)]
+    )
+    statuses = [client.post("/api/v1/login/access-token").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    r = client.post("/api/v1/login/access-token")
+    assert r.headers["Retry-After"] == "30"
+    # Other methods and paths are not limited
+    assert client.get("/api/v1/login/access-token").status_code == 200
+    assert client.post("/api/v1/items/").status_code == 200
+
+
+def test_buckets_are_per_api_key() -> None:
+    client = make_client(
+        [RateLimitRule(path="/ffmpeg/", requests=1, per_seconds=60, key="api_key")]
+    )
+    assert client.get("/api/v1/ffmpeg/x", headers={"X-API-Key": "a"}).status_code == 200
+    assert client.get("/api/v1/ffmpeg/x", headers={"X-API-Key": "a"}).status_code == 429
+    assert client.get("/api/v1/ffmpeg/x", headers={"X-API-Key": "b"}).status_code == 200
+
+
+def test_memory_backend_refills() -> None:
+    backend = MemoryBackend(max_keys=10)
+    with patch("app.core.ratelimit.time.monotonic", return_value=100.0):
+        assert backend.acquire_nowait("k", 2, 1.0) is None
+        assert backend.acquire_nowait("k", 2, 1.0) is None
+        assert backend.acquire_nowait("k", 2, 1.0) == 1.0
+    with patch("app.core.ratelimit.time.monotonic", return_value=101.5):
+        assert backend.acquire_nowait("k", 2, 1.0) is None
+        assert backend.acquire_nowait("k", 2, 1.0) == 0.5
+
+
+def test_memory_backend_is_bounded() -> None:
+    backend = MemoryBackend(max_keys=10)
+    for i in range(100):
+        backend.acquire_nowait(f"k{i}", 5, 0.001)
+    assert len(backend._buckets) <= 10
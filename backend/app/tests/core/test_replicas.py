@@ -0,0 +1,117 @@
+import asyncio
+import uuid
+
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.replicas import ReplicaRouter, RoutingSession
+from app.models import User
+
+PRIMARY_CONNINFO = str(settings.SQLALCHEMY_DATABASE_URI).replace(
+    "postgresql+psycopg", "postgresql", 1
+)
+
+
+def make_router(*uris: str) -> ReplicaRouter:
+    return ReplicaRouter(
+        list(uris),
+        PRIMARY_CONNINFO,
+        health_check_seconds=1,
+        max_lag_seconds=10,
+        sticky_seconds=60,
+    )
+
+
+def make_session(router: ReplicaRouter, user_id: str | None = None) -> AsyncSession:
+    class Session(RoutingSession):
+        pass
+
+    Session.router = router
+    session = AsyncSession(async_engine, sync_session_class=Session)
+    session.info["read_only"] = True
+    session.info["user_id"] = user_id
+    return session
+
+
+async def wait_until_listening(*routers: ReplicaRouter) -> None:
+    for _ in range(50):
+        if all(router.stats()["listening"] for router in routers):
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("listener did not connect")
+
+
+def bind_of_select(session: AsyncSession) -> object:
+    return session.sync_session.get_bind(clause=select(User))
+
+
+def test_reads_go_to_replica_until_session_writes() -> None:
+    # The primary doubles as the replica: only the routing is under test
+    router = make_router(str(settings.SQLALCHEMY_DATABASE_URI))
+    replica = router.engines[0].sync_engine
+
+    async def run() -> None:
+        await router.start()
+        try:
+            await wait_until_listening(router)
+            session = make_session(router)
+            assert bind_of_select(session) is replica
+            await session.exec(select(User).limit(1))
+            session.sync_session.get_bind(clause=delete(User))
+            assert bind_of_select(session) is async_engine.sync_engine
+            await session.close()
+        finally:
+            await router.stop()
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_user_sticks_to_primary_after_write_in_every_worker() -> None:
+    router = make_router(str(settings.SQLALCHEMY_DATABASE_URI))
+    other_worker = make_router(str(settings.SQLALCHEMY_DATABASE_URI))
+    user_id = str(uuid.uuid4())
+
+    async def run() -> None:
+        await router.start()
+        await other_worker.start()
+        try:
+            await wait_until_listening(router, other_worker)
+            writer = make_session(router, user_id)
+            writer.info["read_only"] = False
+            await writer.commit()
+            await writer.close()
+            assert bind_of_select(make_session(router, user_id)) is (
+                async_engine.sync_engine
+            )
+            assert bind_of_select(make_session(router)) is router.engines[0].sync_engine
+            for _ in range(50):
+                if other_worker.is_sticky(user_id):
+                    break
+                await asyncio.sleep(0.05)
+            assert other_worker.is_sticky(user_id)
+        finally:
+            await router.stop()
+            await other_worker.stop()
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_unavailable_replica_is_not_used() -> None:
+    router = make_router("postgresql+psycopg://nobody:x@127.0.0.1:1/none")
+
+    async def run() -> None:
+        await router.start()
+        try:
+            assert router.stats()["replicas"] == [
+                {"healthy": False, "lag_seconds": None}
+            ]
+            assert bind_of_select(make_session(router)) is async_engine.sync_engine
+        finally:
+            await router.stop()
+            await async_engine.dispose()
+
+    asyncio.run(run())
@@ -1,8 +1,12 @@
+import asyncio
+
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
-from app.core.security import verify_password
+from app.core.db import async_engine
+from app.core.security import password_context, pwd_context, verify_password
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -26,6 +30,44 @@ def test_authenticate_user(db: Session) -> None:
     assert user.email == authenticated_user.email
 
 
+def test_authenticate_rehashes_outdated_hash(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    outdated_hash = password_context(
+        scheme="bcrypt", bcrypt_rounds=4, argon2_memory_kib=65536, argon2_time_cost=3
+    ).hash(password)
+    crud.create_user(session=db, user_create=user_in, hashed_password=outdated_hash)
+    authenticated_user = crud.authenticate(session=db, email=email, password=password)
+    assert authenticated_user
+    assert authenticated_user.hashed_password != outdated_hash
+    assert not pwd_context.needs_update(authenticated_user.hashed_password)
+    assert verify_password(password, authenticated_user.hashed_password)
+
+
+def test_authenticate_user_async() -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+
+    async def run() -> None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            user = await crud.create_user_async(session=session, user_create=user_in)
+            assert verify_password(password, user.hashed_password)
+            authenticated_user = await crud.authenticate_async(
+                session=session, email=email, password=password
+            )
+            assert authenticated_user
+            assert user.email == authenticated_user.email
+            wrong_password = await crud.authenticate_async(
+                session=session, email=email, password="incorrect"
+            )
+            assert wrong_password is None
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
 def test_not_authenticate_user(db: Session) -> None:
     email = random_email()
     password = random_lower_string()